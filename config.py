@@ -27,7 +27,7 @@ class Config:
     
     # File Upload
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
-    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'geojson', 'json'}
+    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'parquet', 'pq', 'feather', 'arrow', 'geojson', 'json'}
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
@@ -51,6 +51,48 @@ class Config:
     # Tool configs
     CELL_SITE_MIN_SAMPLES = int(os.getenv('CELL_SITE_MIN_SAMPLES', 30))
     CELL_SITE_BIN_SIZE = int(os.getenv('CELL_SITE_BIN_SIZE', 5))
+    # Rows per chunk for streamed (out-of-core) ingestion; 0 loads the whole file in memory
+    CELL_SITE_CHUNKSIZE = int(os.getenv('CELL_SITE_CHUNKSIZE', 0))
+    CELL_SITE_SPILL_DIR = os.getenv('CELL_SITE_SPILL_DIR')
+    # Default format for result tables: csv, parquet or feather
+    CELL_SITE_OUTPUT_FORMAT = os.getenv('CELL_SITE_OUTPUT_FORMAT', 'csv')
+    # Processes for per-sector solves; 1 runs serially, -1 uses every core
+    CELL_SITE_WORKERS = int(os.getenv('CELL_SITE_WORKERS', 1))
+    # Metres per TA step overrides, e.g. "lte=78.07,nr=39.03" (defaults per technology otherwise)
+    CELL_SITE_TA_FACTORS = os.getenv('CELL_SITE_TA_FACTORS', '')
+    # Grid cell (m) for per-sector sample pre-aggregation before solving; 0 processes every raw sample
+    CELL_SITE_GRID_M = float(os.getenv('CELL_SITE_GRID_M', 0))
+    # Fast mode: stratified per-sector sample cap for the solvers; 0 solves on every sample
+    CELL_SITE_MAX_SAMPLES_PER_SECTOR = int(os.getenv('CELL_SITE_MAX_SAMPLES_PER_SECTOR', 0))
+    # In-memory ML bundle cache (per process) and bundles to load at startup (comma-separated paths)
+    CELL_SITE_MODEL_CACHE_MB = int(os.getenv('CELL_SITE_MODEL_CACHE_MB', 2048))
+    CELL_SITE_PRELOAD_MODELS = os.getenv('CELL_SITE_PRELOAD_MODELS', '')
+    # Serve ML bundles from their memory-mapped .serve.joblib sidecars: tree pages shared across workers,
+    # but predicted by the NumPy FlatForest, which is slower than sklearn (off: every worker unpickles the forest)
+    CELL_SITE_MMAP_MODELS = os.getenv('CELL_SITE_MMAP_MODELS', 'false').lower() == 'true'
+    # Training validation: auto | kfold | subsample | oob | none, and the CV row budget
+    CELL_SITE_CV_MODE = os.getenv('CELL_SITE_CV_MODE', 'auto')
+    CELL_SITE_CV_MAX_ROWS = int(os.getenv('CELL_SITE_CV_MAX_ROWS', 50000))
+    # Background jobs: uploads return a job id unless CELL_SITE_ASYNC=false (or form async=false).
+    # Runner threads per app process (0 = only dedicated `python -m tools.cell_site.jobs` runners);
+    # queue in Redis with REDIS_URL, else this SQLite file (default: OUTPUT_FOLDER/cellsite_jobs.sqlite3)
+    CELL_SITE_ASYNC = os.getenv('CELL_SITE_ASYNC', 'true').lower() == 'true'
+    CELL_SITE_JOB_WORKERS = int(os.getenv('CELL_SITE_JOB_WORKERS', 1))
+    CELL_SITE_JOB_DB = os.getenv('CELL_SITE_JOB_DB')
+    # Result cache of finished runs keyed by upload bytes + parameters: total output size, entry age
+    # (0 disables), and its index directory (default: OUTPUT_FOLDER/cellsite_cache)
+    CELL_SITE_CACHE_MB = int(os.getenv('CELL_SITE_CACHE_MB', 2048))
+    CELL_SITE_CACHE_TTL_H = float(os.getenv('CELL_SITE_CACHE_TTL_H', 72))
+    CELL_SITE_CACHE_DIR = os.getenv('CELL_SITE_CACHE_DIR')
+    # Also delete a run's output directory when its cache entry expires or is evicted (off: outputs and their
+    # /download links outlive the cache entry; clean OUTPUT_FOLDER separately)
+    CELL_SITE_CACHE_DELETE_OUTPUTS = os.getenv('CELL_SITE_CACHE_DELETE_OUTPUTS', 'false').lower() == 'true'
+    # Standardized inputs (Parquet, keyed by file content) reused across runs and by the upload's input_id:
+    # total size (0 disables) and directory (default: OUTPUT_FOLDER/cellsite_inputs)
+    CELL_SITE_INPUT_CACHE_MB = float(os.getenv('CELL_SITE_INPUT_CACHE_MB', 4096))
+    CELL_SITE_INPUT_CACHE_DIR = os.getenv('CELL_SITE_INPUT_CACHE_DIR')
+    # Most configurations one /sweep request may run
+    CELL_SITE_SWEEP_MAX_CONFIGS = int(os.getenv('CELL_SITE_SWEEP_MAX_CONFIGS', 50))
     
     @staticmethod
     def init_app():
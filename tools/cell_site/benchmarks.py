@@ -0,0 +1,748 @@
+"""
+Micro-benchmarks for the cell-site pipeline hot paths.
+
+Usage:
+    python -m tools.cell_site.benchmarks geodesy --rows 20000
+    python -m tools.cell_site.benchmarks standardize --rows 1000000
+    python -m tools.cell_site.benchmarks parallel --rows 2000000
+    python -m tools.cell_site.benchmarks ta --rows 200000
+    python -m tools.cell_site.benchmarks solver --rows 200000
+    python -m tools.cell_site.benchmarks serve_memory --rows 100000 [--model distance_model.joblib]
+    python -m tools.cell_site.benchmarks mmap_predict --rows 200000 [--model distance_model.joblib]
+    python -m tools.cell_site.benchmarks encode --rows 1000000
+    python -m tools.cell_site.benchmarks soft_spacing --rows 20000
+    python -m tools.cell_site.benchmarks azimuth --rows 2000000
+    python -m tools.cell_site.benchmarks site_merge --rows 30000
+    python -m tools.cell_site.benchmarks guards --rows 1000000
+    python -m tools.cell_site.benchmarks grid --rows 1000000 [--model distance_model.joblib]
+    python -m tools.cell_site.benchmarks sample_cap --rows 1000000 [--model distance_model.joblib]
+    python -m tools.cell_site.benchmarks sweep --rows 1000000
+
+Each benchmark times the legacy per-row/per-cell path against the current
+implementation on a synthetic drive-test frame, checks that both agree, and
+prints a JSON summary. Checks that report "ok" (geodesy) exit non-zero when it
+is false.
+"""
+import argparse, inspect, json, logging, math, multiprocessing, os, sys, tempfile, time, tracemalloc
+import numpy as np
+import pandas as pd
+
+from . import cell_site_processing as site
+from .parallel import SectorPool
+from . import forest
+from . import geodesy as geo
+from .model_registry import process_memory
+
+
+def _best_of(fn, repeat: int = 1):
+    best, out = float("inf"), None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _legacy_haversine(lat1, lon1, lat2, lon2):
+    """The former scalar haversine (math module, R = 6371 km)."""
+    R = 6371000.0
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
+    return 2*R*math.asin(math.sqrt(a))
+
+
+def _legacy_meters_to_offsets(dNorth, dEast, base_lat):
+    """The former scalar metre -> degree offsets (absolute latitude, longitude offset; R = WGS84 a)."""
+    R = 6378137.0
+    dLat = dNorth / R
+    dLon = dEast / (R * math.cos(math.pi * base_lat / 180.0))
+    return base_lat + dLat * 180.0 / math.pi, dLon * 180.0 / math.pi
+
+
+# (site lat, site lon, sample lat, sample lon, initial bearing deg): cardinal directions, a spherical
+# reference case (Land's End -> John o' Groats, 009°07'11" = 9.1197 deg) and short site->sample hops,
+# where the former central-angle x-term collapsed every bearing to ~0
+GEODESY_BEARINGS = [
+    (0.0, 0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0, 90.0), (0.0, 0.0, -1.0, 0.0, 180.0), (0.0, 0.0, 0.0, -1.0, 270.0),
+    (50.0664, -5.7147, 58.6439, -3.0700, 9.1197),
+    (40.0, -75.0, 40.009, -75.0, 0.0), (40.0, -75.0, 40.0, -74.988, 89.9961), (40.0, -75.0, 39.991, -75.0, 180.0),
+    (40.0, -75.0, 40.0, -75.012, 270.0039), (40.0, -75.0, 40.00636, -74.99169, 45.0222),
+]
+GEODESY_TOLERANCE_M = 1e-3      # 1 mm against the scalar formulas
+BEARING_TOLERANCE_DEG = 1e-3
+
+
+def bench_geodesy(rows: int = 20_000, repeat: int = 1) -> dict:
+    """Parity of the vectorized geodesy kernels with the former scalar code on `rows` random pairs
+    (worldwide, and 0-5 km hops): haversine, bearing_distance, pairwise_haversine, meters_to_offsets /
+    offset_point and their inverse offsets_to_meters, to GEODESY_TOLERANCE_M; bearing against
+    GEODESY_BEARINGS. "ok" is false if any check fails."""
+    rng = np.random.default_rng(0)
+    lat1, lon1 = rng.uniform(-80, 80, rows), rng.uniform(-180, 180, rows)
+    far_lat, far_lon = rng.uniform(-80, 80, rows), rng.uniform(-180, 180, rows)
+    dn, de = rng.uniform(-5000, 5000, rows), rng.uniform(-5000, 5000, rows)
+    near_lat, near_lon = geo.offset_point(lat1, lon1, dn, de)
+    lat2, lon2 = np.concatenate([far_lat, near_lat]), np.concatenate([far_lon, near_lon])
+    la1, lo1 = np.tile(lat1, 2), np.tile(lon1, 2)
+
+    t_scalar, ref = _best_of(lambda: np.array([_legacy_haversine(*p) for p in zip(la1, lo1, lat2, lon2)]), repeat)
+    t_vec, d = _best_of(lambda: geo.haversine(la1, lo1, lat2, lon2), repeat)
+    checks = {"haversine_max_abs_diff_m": float(np.max(np.abs(d - ref))),
+              "bearing_distance_max_abs_diff_m": float(np.max(np.abs(geo.bearing_distance(la1, lo1, lat2, lon2)[1] - ref)))}
+    k = min(rows, 300)
+    pw = geo.pairwise_haversine(lat2[:k], lon2[:k], lat1[:k], lon1[:k])
+    pw_ref = np.array([[_legacy_haversine(a, b, c, e) for c, e in zip(lat2[:k], lon2[:k])] for a, b in zip(lat1[:k], lon1[:k])])
+    checks["pairwise_haversine_max_abs_diff_m"] = float(np.max(np.abs(pw - pw_ref)))
+
+    # offsets in metres: a degree error at the sample's latitude, converted back to metres
+    off_ref = np.array([_legacy_meters_to_offsets(n, e, b) for n, e, b in zip(dn, de, lat1)])
+    lat_o, dlon = geo.meters_to_offsets(dn, de, lat1)
+    m_per_deg = np.radians(1.0) * geo.WGS84_A_M
+    checks["meters_to_offsets_max_abs_diff_m"] = float(max(np.max(np.abs(lat_o - off_ref[:, 0])),
+                                                           np.max(np.abs((dlon - off_ref[:, 1]) * np.cos(np.radians(lat1)))))) * m_per_deg
+    pt_lat, pt_lon = geo.offset_point(lat1, lon1, dn, de)
+    checks["offset_point_max_abs_diff_m"] = float(max(np.max(np.abs(pt_lat - off_ref[:, 0])),
+                                                      np.max(np.abs((pt_lon - (lon1 + off_ref[:, 1])) * np.cos(np.radians(lat1)))))) * m_per_deg
+    back_n, back_e = geo.offsets_to_meters(pt_lat, pt_lon, lat1, lon1)
+    checks["offsets_to_meters_roundtrip_max_abs_diff_m"] = float(max(np.max(np.abs(back_n - dn)), np.max(np.abs(back_e - de))))
+
+    ref_b = np.array(GEODESY_BEARINGS)
+    b = geo.bearing(ref_b[:, 0], ref_b[:, 1], ref_b[:, 2], ref_b[:, 3])
+    b_err = np.abs((b - ref_b[:, 4] + 180.0) % 360.0 - 180.0)
+    bd = geo.bearing_distance(ref_b[:, 0], ref_b[:, 1], ref_b[:, 2], ref_b[:, 3])[0]
+    checks["bearing_max_abs_diff_deg"] = float(np.max(b_err))
+    checks["bearing_distance_bearing_identical"] = bool(np.array_equal(b, bd))
+    ok = (all(v <= GEODESY_TOLERANCE_M for k_, v in checks.items() if k_.endswith("_m"))
+          and checks["bearing_max_abs_diff_deg"] <= BEARING_TOLERANCE_DEG and checks["bearing_distance_bearing_identical"])
+    if not ok:
+        logging.error(f"Geodesy parity failed: {checks}")
+    return {"benchmark": "geodesy", "pairs": len(la1), "scalar_s": round(t_scalar, 3), "vectorized_s": round(t_vec, 4),
+            "speedup": round(t_scalar / max(t_vec, 1e-9), 1), **checks,
+            "bearing_failures": [list(r) + [round(float(x), 4)] for r, x in zip(GEODESY_BEARINGS, b) if abs((x - r[4] + 180) % 360 - 180) > BEARING_TOLERANCE_DEG],
+            "ok": ok}
+
+
+def synthetic_raw_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Raw drive-test columns as they come out of read_csv: mostly floats, a few text columns
+    with thousands separators, INT32 sentinels and blanks."""
+    rng = np.random.default_rng(seed)
+    rsrp = rng.normal(-95, 12, rows).round(1)
+    rsrp[rng.random(rows) < 0.01] = 2147483647
+    earfcn = rng.choice(["1,850", "3,650", "275", ""], rows)
+    return pd.DataFrame({
+        "Latitude": 28.6 + rng.normal(0, 0.05, rows),
+        "Longitude": 77.2 + rng.normal(0, 0.05, rows),
+        "EARFCN": earfcn,
+        "PCI": rng.integers(0, 504, rows),
+        "RSRP_dBm": rsrp,
+        "RSRQ_dB": rng.normal(-10, 2, rows).round(1),
+        "SINR_dB": rng.normal(10, 5, rows).round(1),
+        "RSSI": rng.normal(-70, 8, rows).round(1),
+        "speed_kmh": rng.uniform(0, 80, rows).round(1),
+        "heading_deg": rng.uniform(0, 360, rows).round(0),
+        "TA": rng.choice(["1", "2", "5", "n/a"], rows),
+        "Network": rng.choice(["OpA", "OpB"], rows),
+        "Technology": "LTE",
+    })
+
+
+def bench_standardize(rows: int = 1_000_000, repeat: int = 1) -> dict:
+    """standardize_df + build_features vs. the former `apply(to_num)` / per-element rsrp_lin path."""
+    raw = synthetic_raw_frame(rows)
+    num_cols = ["lat", "lon", "rsrp_dbm", "rsrq_db", "sinr_db", "rssi", "earfcn_or_narfcn", "pci_or_psi",
+                "band_mhz", "speed_kmh", "heading_deg", "ta"]
+
+    def legacy():
+        df = raw.copy()
+        df.columns = site.normalize_cols(df.columns)
+        df = df.rename(columns={"latitude": "lat", "longitude": "lon", "earfcn": "earfcn_or_narfcn", "pci": "pci_or_psi"})
+        for c in num_cols:
+            if c in df.columns: df[c] = df[c].apply(site.to_num)
+        for c in site.FEATURE_CANDIDATES:
+            if c in df.columns: df[c] = df[c].apply(site.to_num)
+        df["rsrp_lin"] = df["rsrp_dbm"].apply(lambda v: 10**(v/10.0) if pd.notna(v) else np.nan)
+        return df
+
+    def vectorized():
+        return site.build_features(site.standardize_df(raw))
+
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        t_legacy, a = _best_of(legacy, repeat)
+        t_vec, b = _best_of(vectorized, repeat)
+    finally:
+        logging.getLogger().setLevel(level)
+    check = [c for c in num_cols + ["rsrp_lin"] if c in a.columns]
+    match = all(np.allclose(a[c].to_numpy(dtype=float), b[c].to_numpy(dtype=float), equal_nan=True, rtol=1e-12) for c in check)
+    return {"benchmark": "standardize", "rows": rows, "legacy_s": round(t_legacy, 3), "vectorized_s": round(t_vec, 3),
+            "speedup": round(t_legacy / max(t_vec, 1e-9), 1), "results_match": bool(match)}
+
+
+def _noml_sector(lat, lon, rsrp, ta):
+    lat_c, lon_c, med = site.centroid_from_arrays(lat, lon, rsrp)
+    az = site.noml_azimuth_task(lat, lon, rsrp, lat_c, lon_c, 5)
+    return (lat_c, lon_c, med) + tuple(az) + site.noml_ta_task(lat, lon, ta, lat_c, lon_c)
+
+
+def bench_parallel(rows: int = 2_000_000, repeat: int = 1, sector_size: int = 2000) -> dict:
+    """Per-sector NO-ML solves (centroid, azimuth, TA grid) on one process vs. a SectorPool using every core."""
+    rng = np.random.default_rng(0)
+    n_sec = max(1, rows // sector_size)
+    tasks = [(28.6 + rng.normal(0, 0.004, sector_size), 77.2 + rng.normal(0, 0.004, sector_size),
+              rng.normal(-95, 12, sector_size), rng.integers(0, 8, sector_size).astype(float)) for _ in range(n_sec)]
+
+    def run(workers):
+        with SectorPool(workers) as pool:
+            return list(pool.map(_noml_sector, tasks))
+
+    workers = os.cpu_count() or 1
+    t_serial, a = _best_of(lambda: run(1), repeat)
+    t_pool, b = _best_of(lambda: run(workers), repeat)
+    return {"benchmark": "parallel", "rows": n_sec * sector_size, "sectors": n_sec, "workers": workers,
+            "serial_s": round(t_serial, 3), "pool_s": round(t_pool, 3),
+            "speedup": round(t_serial / max(t_pool, 1e-9), 2), "results_match": a == b}
+
+
+def synthetic_ta_sectors(n_sec: int, sector_size: int, seed: int = 0):
+    """(lat, lon, ta_m, base_lat, base_lon, true_lat, true_lon) per sector: samples up to ~2 km from a known
+    site, LTE TA quantised to 78.07 m steps, and a first-cut base point up to 150 m off the truth."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n_sec):
+        t_lat, t_lon = 28.6 + rng.uniform(-0.05, 0.05), 77.2 + rng.uniform(-0.05, 0.05)
+        rng_m = rng.uniform(50, 2000, sector_size)
+        brg = rng.uniform(0, 120, sector_size) + rng.uniform(0, 360)
+        lat, lon = site.geo.offset_point(t_lat, t_lon, rng_m * np.cos(np.radians(brg)), rng_m * np.sin(np.radians(brg)))
+        ta_m = np.floor(rng_m / 78.07 + rng.normal(0, 0.3, sector_size)).clip(0) * 78.07 + 39.0
+        b_lat, b_lon = site.geo.offset_point(t_lat, t_lon, *rng.uniform(-150, 150, 2))
+        out.append((lat, lon, ta_m, float(b_lat), float(b_lon), t_lat, t_lon))
+    return out
+
+
+def bench_ta(rows: int = 200_000, repeat: int = 1, sector_size: int = 500) -> dict:
+    """TA refine: the former 81-point / 50 m grid scored one candidate at a time vs. the broadcast
+    coarse-to-fine engine. Accuracy is the distance from the refined point to the true site."""
+    sectors = synthetic_ta_sectors(max(1, rows // sector_size), sector_size)
+
+    def legacy():
+        res = []
+        for lat, lon, ta_m, b_lat, b_lon, _, _ in sectors:
+            best = (np.inf, b_lat, b_lon)
+            for dn in range(-200, 201, 50):
+                for de in range(-200, 201, 50):
+                    c_lat, c_lon = site.geo.offset_point(b_lat, b_lon, dn, de)
+                    loss = float(np.mean(np.abs(site.geo.haversine(c_lat, c_lon, lat, lon) - ta_m)))
+                    if loss < best[0]: best = (loss, float(c_lat), float(c_lon))
+            res.append(best[1:])
+        return res
+
+    def engine():
+        return [site.ta_refine(lat, lon, ta_m, b_lat, b_lon)[:2] for lat, lon, ta_m, b_lat, b_lon, _, _ in sectors]
+
+    def err(res):
+        return float(np.median([site.geo.haversine(p[0], p[1], s[5], s[6]) for p, s in zip(res, sectors)]))
+
+    t_legacy, a = _best_of(legacy, repeat)
+    t_eng, b = _best_of(engine, repeat)
+    return {"benchmark": "ta", "rows": len(sectors) * sector_size, "sectors": len(sectors),
+            "legacy_s": round(t_legacy, 3), "engine_s": round(t_eng, 3), "speedup": round(t_legacy / max(t_eng, 1e-9), 1),
+            "legacy_median_error_m": round(err(a), 1), "engine_median_error_m": round(err(b), 1)}
+
+
+def bench_solver(rows: int = 200_000, repeat: int = 1, sector_size: int = 500) -> dict:
+    """Range solver: the compass pattern search vs. IRLS (with its pattern-search polish and fallback) on
+    synthetic sectors whose predicted ranges carry ~25% multiplicative error, started from the top-RSRP
+    centroid. `irls_no_worse` holds when IRLS's median distance to the true site is at most the pattern search's."""
+    rng = np.random.default_rng(1)
+    sectors = []
+    for lat, lon, _, _, _, t_lat, t_lon in synthetic_ta_sectors(max(1, rows // sector_size), sector_size, seed=1):
+        d = site.geo.haversine(t_lat, t_lon, lat, lon)
+        rhat = d * rng.lognormal(0.0, 0.25, len(d))
+        rsrp = -60.0 - 35.0 * np.log10(np.maximum(d, 10.0) / 10.0) + rng.normal(0, 6, len(d))
+        lat0, lon0, _ = site.centroid_from_arrays(lat, lon, rsrp)
+        sectors.append((lat, lon, rsrp, rhat, lat0, lon0, t_lat, t_lon))
+
+    def pattern():
+        return [site.solve_ranges_pattern(lat, lon, rhat, site.sample_weights(rsrp, len(lat)), lat0, lon0)
+                for lat, lon, rsrp, rhat, lat0, lon0, _, _ in sectors]
+
+    def irls():
+        return [site.solve_ranges_from_arrays(lat, lon, rsrp, rhat, lat0, lon0) for lat, lon, rsrp, rhat, lat0, lon0, _, _ in sectors]
+
+    def err(res):
+        return float(np.median([site.geo.haversine(r[0], r[1], s[6], s[7]) for r, s in zip(res, sectors)]))
+
+    t_pat, a = _best_of(pattern, repeat)
+    t_irls, b = _best_of(irls, repeat)
+    err_a, err_b = round(err(a), 1), round(err(b), 1)
+    return {"benchmark": "solver", "rows": len(sectors) * sector_size, "sectors": len(sectors),
+            "pattern_s": round(t_pat, 3), "irls_s": round(t_irls, 3), "speedup": round(t_pat / max(t_irls, 1e-9), 1),
+            "pattern_median_error_m": err_a, "irls_median_error_m": err_b, "irls_no_worse": err_b <= err_a,
+            "pattern_mean_loss_m": round(float(np.mean([r[2] for r in a])), 2), "irls_mean_loss_m": round(float(np.mean([r[2] for r in b])), 2),
+            "irls_mean_iterations": round(float(np.mean([r[3] for r in b])), 1)}
+
+
+def synthetic_forest_bundle(outdir: str, n_train: int = 50_000, n_trees: int = 300, n_features: int = 12, seed: int = 0) -> str:
+    """Fit a RandomForest on a synthetic range target and save it with save_bundle (no serving sidecar)."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    rng = np.random.default_rng(seed)
+    features = [f"f{i}" for i in range(n_features)]
+    X = pd.DataFrame(rng.normal(size=(n_train, n_features)), columns=features)
+    y = 500 * np.exp(X["f0"] / 2) + 80 * X["f1"] ** 2 + rng.normal(0, 30, n_train)
+    imputer = SimpleImputer(strategy="median").fit(X)
+    model = RandomForestRegressor(n_estimators=n_trees, min_samples_leaf=2, n_jobs=-1, random_state=seed).fit(X, y)
+    return site.save_bundle(model, imputer, features, outdir, 1, {"train_mode": "full", "n_train": n_train})
+
+
+def _serve_worker(model_path, mode, rows, barrier, queue):
+    """One 'gunicorn worker': load the bundle the given way, predict `rows` rows, report memory while all workers are alive."""
+    import joblib
+    t0 = time.perf_counter()
+    if mode == "sklearn":
+        bundle = joblib.load(model_path)
+    else:
+        bundle = forest.load_serving_bundle(forest.serving_path(model_path))
+    load_s = time.perf_counter() - t0
+    X = pd.DataFrame(np.random.default_rng(0).normal(size=(rows, len(bundle["features"]))), columns=bundle["features"])
+    pred = bundle["model"].predict(X if mode == "sklearn" else X.to_numpy())
+    barrier.wait()
+    mem = process_memory()
+    barrier.wait()          # nobody exits (and unmaps) before everybody has measured
+    queue.put({"pid": os.getpid(), "load_s": round(load_s, 3), "pred_mean": float(pred.mean()), **mem})
+
+
+def bench_serve_memory(rows: int = 100_000, repeat: int = 1, workers: int = 4, model_path: str = None) -> dict:
+    """Per-worker memory of `workers` concurrent processes that each load the ML bundle and predict:
+    unpickled sklearn forest (private copy per worker) vs. the memory-mapped serving sidecar (pages shared).
+    Without `model_path` a synthetic forest is trained first; the sidecar is exported as serving would (on first load)."""
+    tmp = None
+    if model_path is None:
+        tmp = tempfile.TemporaryDirectory(prefix="serve_memory_")
+        model_path = synthetic_forest_bundle(tmp.name)
+    site.load_serving_bundle(model_path, mmap=True)
+    ctx = multiprocessing.get_context("spawn")     # fresh interpreters, like workers without --preload
+    out = {"benchmark": "serve_memory", "rows": rows, "workers": workers, "model_path": model_path,
+           "bundle_bytes": os.path.getsize(model_path), "serving_bytes": os.path.getsize(forest.serving_path(model_path))}
+    for mode in ("sklearn", "mmap"):
+        barrier, queue = ctx.Barrier(workers), ctx.Queue()
+        procs = [ctx.Process(target=_serve_worker, args=(model_path, mode, rows, barrier, queue)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        res = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+        out[mode] = {k: int(np.mean([r.get(k, 0) for r in res])) for k in ("rss_bytes", "pss_bytes", "private_bytes")}
+        out[mode]["load_s"] = round(float(np.mean([r["load_s"] for r in res])), 3)
+        out[mode]["pred_mean"] = res[0]["pred_mean"]
+    out["private_saved_per_worker_bytes"] = out["sklearn"]["private_bytes"] - out["mmap"]["private_bytes"]
+    out["pss_saved_per_worker_bytes"] = out["sklearn"]["pss_bytes"] - out["mmap"]["pss_bytes"]
+    if tmp is not None:
+        tmp.cleanup()
+    return out
+
+
+def _traced(fn):
+    """(seconds, peak bytes allocated through tracemalloc, result) of one call."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dt, peak, out
+
+
+def bench_mmap_predict(rows: int = 200_000, repeat: int = 1, model_path: str = None) -> dict:
+    """What CELL_SITE_MMAP_MODELS / --mmap-model costs per predict: the default path (the unpickled
+    RandomForestRegressor on the imputed DataFrame) vs. the memory-mapped sidecar (FlatForest over the
+    mapped arrays). Reports sidecar export time, predict time ("mmap_slowdown" > 1 means the mapped path
+    is slower), tracemalloc peak of each predict call, tree bytes per path and the largest prediction
+    difference. The per-worker memory this buys is `serve_memory`."""
+    import joblib
+    tmp = None
+    if model_path is None:
+        tmp = tempfile.TemporaryDirectory(prefix="mmap_predict_")
+        model_path = synthetic_forest_bundle(tmp.name)
+    bundle = joblib.load(model_path)
+    model, features = bundle["model"], bundle["features"]
+    X = pd.DataFrame(np.random.default_rng(0).normal(size=(rows, len(features))), columns=features)
+    X_imp = bundle["imputer"].transform(X)
+    t_export, serve_path = _best_of(lambda: forest.save_serving_bundle(bundle, model_path), 1)
+    mapped = forest.load_serving_bundle(serve_path)["model"]
+    t_default, a = _best_of(lambda: model.predict(pd.DataFrame(X_imp, columns=features)), repeat)
+    t_mmap, b = _best_of(lambda: mapped.predict(X_imp), repeat)
+    _, peak_default, _ = _traced(lambda: model.predict(pd.DataFrame(X_imp, columns=features)))
+    _, peak_mmap, _ = _traced(lambda: mapped.predict(X_imp))
+    default_bytes = int(sum(e.tree_.__getstate__()["nodes"].nbytes + e.tree_.value.nbytes for e in model.estimators_))
+    out = {"benchmark": "mmap_predict", "rows": rows, "trees": mapped.n_estimators, "nodes": int(len(mapped.value)),
+           "sidecar_export_s": round(t_export, 3), "default_predict_s": round(t_default, 3), "mmap_predict_s": round(t_mmap, 3),
+           "mmap_slowdown": round(t_mmap / max(t_default, 1e-9), 2),
+           "default_peak_bytes": int(peak_default), "mmap_peak_bytes": int(peak_mmap),
+           "default_model_bytes": default_bytes, "mmap_model_bytes": mapped.nbytes,
+           "max_abs_diff_m": float(np.max(np.abs(a - b))) if rows else 0.0}
+    if tmp is not None:
+        tmp.cleanup()
+    return out
+
+
+def bench_encode(rows: int = 1_000_000, repeat: int = 1) -> dict:
+    """Inference feature matrix: build_features + get_dummies + column alignment + imputer (the former
+    predict_ranges path) vs. the compiled-schema FeatureEncoder, on a standardized synthetic frame."""
+    from sklearn.impute import SimpleImputer
+    df = site.standardize_df(synthetic_raw_frame(rows))
+    X_tr, features = site.select_feature_matrix(site.build_features(df.head(50_000)))
+    imputer = SimpleImputer(strategy="median").fit(X_tr)
+    encoder = site.feature_encoder({"features": features, "imputer": imputer})
+
+    def legacy():
+        X_in, _ = site.select_feature_matrix(site.build_features(df))
+        for col in features:
+            if col not in X_in.columns: X_in[col] = 0
+        X_in = X_in[features].replace([np.inf, -np.inf], np.nan)
+        return pd.DataFrame(imputer.transform(X_in), columns=features)
+
+    t_legacy, a = _best_of(legacy, repeat)
+    t_enc, b = _best_of(lambda: encoder.encode(df), repeat)
+    _, peak_legacy, _ = _traced(legacy)
+    _, peak_enc, _ = _traced(lambda: encoder.encode(df))
+    return {"benchmark": "encode", "rows": rows, "features": len(features),
+            "legacy_s": round(t_legacy, 3), "encoder_s": round(t_enc, 3), "speedup": round(t_legacy / max(t_enc, 1e-9), 1),
+            "legacy_peak_bytes": int(peak_legacy), "encoder_peak_bytes": int(peak_enc),
+            "max_abs_diff": float(np.max(np.abs(a.to_numpy(dtype=np.float32) - b))) if rows else 0.0}
+
+
+def synthetic_site_sectors(n_sites: int, seed: int = 0) -> pd.DataFrame:
+    """Per-sector prediction rows for `n_sites` sites of 1-6 sectors: 5-degree azimuths, reliabilities, sample counts."""
+    rng = np.random.default_rng(seed)
+    n_sec = rng.integers(1, 7, n_sites)
+    site_of = np.repeat(np.arange(n_sites), n_sec)
+    n = len(site_of)
+    return pd.DataFrame({"network": np.where(site_of % 2, "OpA", "OpB"), "earfcn_or_narfcn": 1850.0,
+                         "site_key_inferred": [f"s{i}" for i in site_of],
+                         "pci_or_psi": (np.arange(n) % 504).astype(float), "samples": rng.integers(20, 500, n),
+                         "azimuth_deg_5": rng.choice(np.arange(0, 360, 5), n).astype(float),
+                         "azimuth_reliability": np.where(rng.random(n) < 0.1, np.nan, rng.random(n))})
+
+
+def bench_soft_spacing(rows: int = 20_000, repeat: int = 1) -> dict:
+    """Soft equal spacing: soft_equal_spacing per site group + concat vs. the batched soft_equal_spacing_sites."""
+    keys = ["network", "earfcn_or_narfcn", "site_key_inferred"]
+    pred = synthetic_site_sectors(max(1, rows // 3))
+
+    def legacy():
+        return pd.concat([site.soft_equal_spacing(g, bin_size=5) for _, g in pred.groupby(keys)], ignore_index=True)
+
+    t_legacy, a = _best_of(legacy, repeat)
+    t_batch, b = _best_of(lambda: site.soft_equal_spacing_sites(pred, keys, bin_size=5), repeat)
+    return {"benchmark": "soft_spacing", "sectors": len(pred), "sites": int(pred["site_key_inferred"].nunique()),
+            "legacy_s": round(t_legacy, 3), "batched_s": round(t_batch, 3), "speedup": round(t_legacy / max(t_batch, 1e-9), 1),
+            "identical": bool(a.equals(b))}
+
+
+def _legacy_azimuth(lat, lon, rsrp, lat_site, lon_site, bin_size):
+    """The former per-sector azimuth: np.histogram, then a half-power walk that stopped after one bin each way."""
+    w = site.sample_weights(rsrp, len(lat))
+    bearings = site.geo.bearing(lat_site, lon_site, lat, lon)
+    w2 = w * np.power(np.maximum(site.geo.haversine(lat_site, lon_site, lat, lon), 1.0), 0.5)
+    hist, edges = np.histogram(bearings, bins=np.arange(0, 360 + bin_size, bin_size), weights=w2)
+    if hist.sum() <= 0:
+        return np.nan, np.nan, 0.0
+    p = int(np.argmax(hist))
+    n, half = len(hist), hist[p] / 2.0
+    left = p
+    while hist[left] >= half:
+        left = (left - 1) % n
+        if left == (p - 1) % n: break
+    right = p
+    while hist[right] >= half:
+        right = (right + 1) % n
+        if right == (p + 1) % n: break
+    width = (right - left) if right >= left else (n - left + right)
+    return site.snap_deg((edges[p] + edges[p + 1]) / 2.0, step=bin_size), width * bin_size, float(hist[p] / max(hist.sum(), 1e-12))
+
+
+def synthetic_beam_sectors(n_sec: int, seed: int = 0):
+    """(lat, lon, rsrp, lat_site, lon_site) per sector: 15-1000 samples spread around a random boresight."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for s in range(n_sec):
+        n = int(rng.integers(15, 1000))
+        lat0, lon0 = 28.6 + rng.normal(0, 0.1), 77.2 + rng.normal(0, 0.1)
+        b = np.radians(rng.uniform(0, 360) + rng.normal(0, rng.uniform(5, 90), n))
+        d = rng.uniform(50, 2000, n)
+        lat = lat0 + d * np.cos(b) / 111_000
+        lon = lon0 + d * np.sin(b) / (111_000 * np.cos(np.radians(lat0)))
+        out.append((lat, lon, rng.normal(-95, 10, n) if s % 5 else None, lat0, lon0))
+    return out
+
+
+def bench_azimuth(rows: int = 2_000_000, repeat: int = 1) -> dict:
+    """Azimuth / beamwidth: one np.histogram per sector vs. azimuth_batches (one bincount per batch), at 5 and 1 degree bins.
+    Azimuth and reliability must agree; beamwidth differs by design (the legacy walk always reported 2 bins)."""
+    sectors, n = [], 0
+    while n < rows:
+        sectors += synthetic_beam_sectors(500, seed=len(sectors))
+        n = sum(len(s[0]) for s in sectors)
+    out = {"benchmark": "azimuth", "rows": n, "sectors": len(sectors)}
+    for bs in (5, 1):
+        t_legacy, a = _best_of(lambda: [_legacy_azimuth(*s, bs) for s in sectors], repeat)
+        t_batch, b = _best_of(lambda: list(site.azimuth_batches(iter(sectors), bin_size=bs)), repeat)
+        a, b = np.array(a, dtype=float), np.array(b, dtype=float)
+        out[f"bin_{bs}"] = {"legacy_s": round(t_legacy, 3), "batched_s": round(t_batch, 3),
+                            "speedup": round(t_legacy / max(t_batch, 1e-9), 1),
+                            "azimuth_match": bool(np.array_equal(a[:, 0], b[:, 0], equal_nan=True)),
+                            "reliability_max_abs_diff": float(np.nanmax(np.abs(a[:, 2] - b[:, 2]))),
+                            "legacy_mean_beamwidth_deg": round(float(np.nanmean(a[:, 1])), 1),
+                            "mean_beamwidth_deg": round(float(np.nanmean(b[:, 1])), 1)}
+    return out
+
+
+def bench_site_merge(rows: int = 30_000, repeat: int = 1) -> dict:
+    """NO-ML site merge: the former groupby().apply(pd.Series) centroids + merge and per-site spread/revert
+    loop vs. merge_site_positions. `rows` is the number of sectors."""
+    keys = ["network", "earfcn_or_narfcn", "site_key_inferred"]
+    rng = np.random.default_rng(0)
+    pred = synthetic_site_sectors(max(1, rows // 3))
+    pred["lat_pred_firstcut"] = 28.6 + rng.normal(0, 0.01, len(pred))
+    pred["lon_pred_firstcut"] = 77.2 + rng.normal(0, 0.01, len(pred))
+
+    def legacy():
+        p = pred.assign(_w=pred["samples"].clip(lower=1))
+        c = (p.groupby(keys).apply(lambda g: pd.Series({"lat_site": float(np.average(g["lat_pred_firstcut"], weights=g["_w"])),
+                                                        "lon_site": float(np.average(g["lon_pred_firstcut"], weights=g["_w"])),
+                                                        "sector_count": len(g)})).reset_index())
+        p = p.merge(c, on=keys, how="left")
+        revert = pd.Series(False, index=p.index)
+        for _, gg in p.groupby(keys):
+            d = site.geo.haversine(float(gg["lat_site"].iloc[0]), float(gg["lon_site"].iloc[0]),
+                                   gg["lat_pred_firstcut"].to_numpy(dtype=float), gg["lon_pred_firstcut"].to_numpy(dtype=float))
+            if max(d) > site.SITE_SPREAD_MAX_M or np.median(d) > site.SITE_SPREAD_MEDIAN_M:
+                idx = pd.Series(True, index=p.index)
+                for k in keys:
+                    idx &= p[k].eq(gg[k].iloc[0])
+                revert |= idx
+        return p["lat_site"].to_numpy(), revert.to_numpy()
+
+    def vectorized():
+        s = site.merge_site_positions(pred, keys, "lat_pred_firstcut", "lon_pred_firstcut", weights=pred["samples"].clip(lower=1),
+                                      max_spread_m=site.SITE_SPREAD_MAX_M, median_spread_m=site.SITE_SPREAD_MEDIAN_M)
+        return s["lat_site"].to_numpy(), s["revert"].to_numpy()
+
+    t_legacy, a = _best_of(legacy, repeat)
+    t_vec, b = _best_of(vectorized, repeat)
+    return {"benchmark": "site_merge", "sectors": len(pred), "sites": int(pred["site_key_inferred"].nunique()),
+            "legacy_s": round(t_legacy, 3), "vectorized_s": round(t_vec, 3), "speedup": round(t_legacy / max(t_vec, 1e-9), 1),
+            "results_match": bool(np.allclose(a[0], b[0], rtol=0, atol=1e-12) and np.array_equal(a[1], b[1]))}
+
+
+def bench_guards(rows: int = 1_000_000, repeat: int = 1, sector_size: int = 200) -> dict:
+    """NO-ML spatial guards: the former passes (global radius, per-sector geofence loop, second sanity loop,
+    each re-slicing the sector samples for their medians) vs. one groupby for the medians + spatial_guard."""
+    rng = np.random.default_rng(0)
+    n_sec = max(1, rows // sector_size)
+    c_lat, c_lon = 28.6 + rng.normal(0, 0.05, n_sec), 77.2 + rng.normal(0, 0.05, n_sec)
+    df = pd.DataFrame({"network": "opa", "earfcn_or_narfcn": 1850.0, "pci_or_psi": np.repeat(np.arange(n_sec), sector_size).astype(float),
+                       "lat": np.repeat(c_lat, sector_size) + rng.normal(0, 0.003, n_sec * sector_size),
+                       "lon": np.repeat(c_lon, sector_size) + rng.normal(0, 0.003, n_sec * sector_size)})
+    sectors = site.SectorIndex(df, ["network", "earfcn_or_narfcn", "pci_or_psi"])
+    # estimates: mostly near the sector, a few percent kilometres off or far outside the drive area
+    off = rng.choice([0.0, 0.02, 1.0], n_sec, p=[0.95, 0.04, 0.01])
+    pred = pd.DataFrame({"network": "opa", "earfcn_or_narfcn": 1850.0, "pci_or_psi": np.arange(n_sec, dtype=float),
+                         "lat_pred": c_lat + off, "lon_pred": c_lon, "lat_pred_firstcut": c_lat, "lon_pred_firstcut": c_lon,
+                         "sector_count": 1.0})
+
+    def legacy():
+        p = pred.copy()
+        ll = sectors.latlon
+        lat_m, lon_m = float(np.median(ll[:, 0])), float(np.median(ll[:, 1]))
+        rad95 = float(np.percentile(site.geo.haversine(lat_m, lon_m, ll[:, 0], ll[:, 1]), 95))
+        counts = [0, 0]
+        for i, local_only in enumerate((False, True)):
+            for r in p.itertuples(index=False):
+                g = sectors.rows(sectors.key_of(r))
+                bad = len(g) >= 5 and site.geo.haversine(float(g["lat"].median()), float(g["lon"].median()), float(r.lat_pred), float(r.lon_pred)) > 1000.0
+                if not local_only:
+                    bad |= site.geo.haversine(lat_m, lon_m, float(r.lat_pred), float(r.lon_pred)) > rad95 + 1000.0
+                if bad:
+                    idx = p["network"].eq(r.network) & p["earfcn_or_narfcn"].eq(r.earfcn_or_narfcn) & p["pci_or_psi"].eq(r.pci_or_psi)
+                    p.loc[idx, ["lat_pred", "lon_pred"]] = p.loc[idx, ["lat_pred_firstcut", "lon_pred_firstcut"]].values
+                    counts[i] += int(idx.sum())
+        return p, counts
+
+    def fused():
+        p = pred.copy()
+        med = sectors.frame.groupby(sectors.group_cols, sort=True).agg(lat=("lat", "median"), lon=("lon", "median"), n=("lat", "size"))
+        c = site.spatial_guard(p, med["lat"].to_numpy(), med["lon"].to_numpy(), med["n"].to_numpy(), sectors.latlon)
+        return p, [c["geofence"], c["sanity"]]
+
+    t_legacy, (a, ca) = _best_of(legacy, repeat)
+    t_fused, (b, cb) = _best_of(fused, repeat)
+    return {"benchmark": "guards", "rows": len(df), "sectors": n_sec, "legacy_s": round(t_legacy, 3), "fused_s": round(t_fused, 3),
+            "speedup": round(t_legacy / max(t_fused, 1e-9), 1), "reverted": cb[0],
+            "results_match": bool(a[["lat_pred", "lon_pred"]].equals(b[["lat_pred", "lon_pred"]]) and ca == cb)}
+
+
+def synthetic_drive_test(rows: int, seed: int = 0, hz: float = 10.0, speed_ms: float = 10.0, drives_per_sector: int = 4):
+    """Dense drive test around 3-sector sites: `drives_per_sector` straight drives through each sector's
+    beam sampled at `hz` (one sample every speed/hz metres), log-distance RSRP with shadowing, LTE TA.
+    Returns (raw frame with the usual input column names, truth frame of site positions and boresights per cell id)."""
+    rng = np.random.default_rng(seed)
+    per_drive = 400
+    n_drives = max(1, rows // per_drive)
+    n_sites = max(1, n_drives // (3 * drives_per_sector))
+    s_lat, s_lon = 28.6 + rng.uniform(-0.1, 0.1, n_sites), 77.2 + rng.uniform(-0.1, 0.1, n_sites)
+    frames = []
+    for d in range(n_drives):
+        site_i, sec = d % n_sites, (d // n_sites) % 3
+        boresight = sec * 120.0 + 30.0
+        # a straight drive at 100-1500 m from the site, heading roughly across the beam
+        r0, b0 = rng.uniform(100, 1500), boresight + rng.uniform(-40, 40)
+        n0, e0 = r0 * np.cos(np.radians(b0)), r0 * np.sin(np.radians(b0))
+        heading = np.radians(b0 + 90 + rng.uniform(-30, 30))
+        t = np.arange(per_drive) * speed_ms / hz - per_drive * speed_ms / hz / 2
+        n_m = n0 + t * np.cos(heading) + rng.normal(0, 2, per_drive)
+        e_m = e0 + t * np.sin(heading) + rng.normal(0, 2, per_drive)
+        lat, lon = site.geo.offset_point(s_lat[site_i], s_lon[site_i], n_m, e_m)
+        dist = np.maximum(np.hypot(n_m, e_m), 10.0)
+        off = (np.degrees(np.arctan2(e_m, n_m)) - boresight + 180) % 360 - 180
+        rsrp = -40 - 35 * np.log10(dist) - np.minimum(12 * (off / 65) ** 2, 25) + rng.normal(0, 4, per_drive)
+        frames.append(pd.DataFrame({"Latitude": lat, "Longitude": lon, "EARFCN": 1850, "PCI": site_i * 3 + sec,
+                                    "RSRP_dBm": rsrp.round(1), "RSRQ_dB": rng.normal(-10, 2, per_drive).round(1),
+                                    "SINR_dB": rng.normal(10, 5, per_drive).round(1), "Network": "OpA", "Technology": "LTE",
+                                    "cellid": 10 * (1000 + site_i) + sec + 1, "TA": np.floor(dist / 78.07),
+                                    "speed_kmh": speed_ms * 3.6}))
+    truth = pd.DataFrame({"pci_or_psi": np.arange(n_sites * 3, dtype=float), "lat_true": np.repeat(s_lat, 3), "lon_true": np.repeat(s_lon, 3),
+                          "azimuth_true": np.tile([30.0, 150.0, 270.0], n_sites)})
+    return pd.concat(frames, ignore_index=True), truth
+
+
+def _pipeline_curve(raw: pd.DataFrame, truth: pd.DataFrame, option: str, values, label, report, repeat: int = 1, model_path: str = None) -> dict:
+    """run_noml (with TA) and, given a bundle, run_ml on `raw` once without `option` and once per value
+    of it. Per value: wall time, speedup, `report(result)`, the per-sector position shift against the
+    plain run, azimuth agreement, and the median position / azimuth error to the truth for both."""
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.WARNING)
+    out = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "drive.csv")
+            raw.to_csv(path, index=False)
+            runs = [("noml", lambda od, kw: site.run_noml(path, od, soft_spacing=False, use_ta=True, **kw), "ta")]
+            if model_path:
+                runs.append(("ml", lambda od, kw: site.run_ml(model_path=model_path, input_path=path, outdir=od, soft_spacing=False, **kw), "per_sector"))
+            for name, run, key in runs:
+                res = {}
+                for v in (None,) + tuple(values):
+                    od = os.path.join(tmp, f"{name}_{v}")
+                    t, r = _best_of(lambda: run(od, {option: v}), repeat)
+                    pred = site.load_any(r[key])
+                    pred = pred.merge(truth, on="pci_or_psi")
+                    err = site.geo.haversine(pred["lat_pred"], pred["lon_pred"], pred["lat_true"], pred["lon_true"])
+                    az_err = np.abs((pred["azimuth_deg_5"] - pred["azimuth_true"] + 180) % 360 - 180)
+                    res[v] = (t, r, pred.set_index("pci_or_psi"), float(np.median(err)), float(np.nanmedian(az_err)))
+                t_raw, _, base, err_raw, az_raw = res[None]
+                out[name] = {"raw": {"s": round(t_raw, 3), "median_error_m": round(err_raw, 1), "median_azimuth_error_deg": az_raw}}
+                for v in values:
+                    t, r, pred, err, az_err = res[v]
+                    b = base.loc[pred.index]
+                    shift = site.geo.haversine(b["lat_pred"], b["lon_pred"], pred["lat_pred"], pred["lon_pred"])
+                    az = (pred["azimuth_deg_5"] - b["azimuth_deg_5"] + 180) % 360 - 180
+                    out[name][label(v)] = {
+                        "s": round(t, 3), "speedup": round(t_raw / max(t, 1e-9), 1), **report(r),
+                        "median_error_m": round(err, 1), "error_delta_m": round(err - err_raw, 1), "median_azimuth_error_deg": az_err,
+                        "shift_vs_raw_m": {"median": round(float(np.median(shift)), 1), "p95": round(float(np.percentile(shift, 95)), 1)},
+                        "azimuth_within_bin": round(float(np.mean(np.abs(az) <= 5)), 3)}
+    finally:
+        logging.getLogger().setLevel(level)
+    return out
+
+
+def bench_grid(rows: int = 1_000_000, repeat: int = 1, model_path: str = None) -> dict:
+    """Grid pre-aggregation (aggregate_samples) on a dense synthetic drive test: the raw samples vs.
+    5/10/25 m grids (see _pipeline_curve), with the compression ratio of each grid."""
+    raw, truth = synthetic_drive_test(rows)
+    out = {"benchmark": "grid", "rows": len(raw), "sectors": len(truth)}
+    out.update(_pipeline_curve(raw, truth, "grid_m", (5.0, 10.0, 25.0), lambda g: f"grid_{g:g}m",
+                               lambda r: {"compression": r.get("aggregation", {}).get("compression")}, repeat, model_path))
+    return out
+
+
+def bench_sample_cap(rows: int = 1_000_000, repeat: int = 1, model_path: str = None) -> dict:
+    """Fast mode (cap_sector_samples) on a synthetic drive test with large sectors (25 drives, ~10k
+    samples each): every sample vs. caps of 250 to 5000 rows per sector (see _pipeline_curve) -- the
+    accuracy/latency trade-off curve, with the rows the solvers actually saw."""
+    raw, truth = synthetic_drive_test(rows, drives_per_sector=25)
+    out = {"benchmark": "sample_cap", "rows": len(raw), "sectors": len(truth)}
+    out.update(_pipeline_curve(raw, truth, "max_samples_per_sector", (250, 500, 1000, 2000, 5000), lambda k: f"cap_{k}",
+                               lambda r: {"rows_solved": r.get("sampling", {}).get("rows_out")}, repeat, model_path))
+    return out
+
+
+def bench_sweep(rows: int = 1_000_000, repeat: int = 1) -> dict:
+    """NO-ML parameter sweep over bin_size 1/3/5/10/15 x min_samples 20/50 (with soft spacing and TA): one
+    run_noml per configuration vs. run_noml_sweep, against a single run; every configuration's outputs
+    must match its own run_noml."""
+    raw, _ = synthetic_drive_test(rows)
+    grid = {"bin_size": site.BIN_SIZES, "min_samples": [20, 50]}
+    configs = site.sweep_configs(grid, {})
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "drive.csv")
+            raw.to_csv(path, index=False)
+            kw = {"soft_spacing": True, "use_ta": True}
+            t_one, _ = _best_of(lambda: site.run_noml(path, os.path.join(tmp, "one"), **kw), repeat)
+            t_each, each = _best_of(lambda: [site.run_noml(path, os.path.join(tmp, "each"), **cfg, **kw) for cfg in configs], repeat)
+            t_sweep, swept = _best_of(lambda: site.run_noml_sweep(path, os.path.join(tmp, "sweep"), grid, **kw), repeat)
+            same = all(site.load_any(a[k]).equals(site.load_any(b[k])) for a, b in zip(each, swept["configs"]) for k in ("no_ta", "soft", "ta"))
+    finally:
+        logging.getLogger().setLevel(level)
+    return {"benchmark": "sweep", "rows": len(raw), "configs": len(configs),
+            "single_run_s": round(t_one, 3), "separate_runs_s": round(t_each, 3), "sweep_s": round(t_sweep, 3),
+            "sweep_vs_single_run": round(t_sweep / max(t_one, 1e-9), 2), "speedup_vs_separate": round(t_each / max(t_sweep, 1e-9), 1),
+            "identical": same}
+
+
+BENCHMARKS = {
+    "geodesy": bench_geodesy,
+    "standardize": bench_standardize,
+    "azimuth": bench_azimuth,
+    "parallel": bench_parallel,
+    "ta": bench_ta,
+    "solver": bench_solver,
+    "serve_memory": bench_serve_memory,
+    "mmap_predict": bench_mmap_predict,
+    "encode": bench_encode,
+    "soft_spacing": bench_soft_spacing,
+    "site_merge": bench_site_merge,
+    "guards": bench_guards,
+    "grid": bench_grid,
+    "sample_cap": bench_sample_cap,
+    "sweep": bench_sweep,
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cell-site pipeline micro-benchmarks")
+    ap.add_argument("name", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="Synthetic input rows")
+    ap.add_argument("--repeat", type=int, default=1, help="Repetitions (best time is reported)")
+    ap.add_argument("--workers", type=int, default=4, help="(serve_memory) Concurrent worker processes")
+    ap.add_argument("--model", default=None, help="(serve_memory, mmap_predict, grid, sample_cap) Bundle to load instead of a synthetic forest / to run the ML pipeline with")
+    args = ap.parse_args()
+    bench = BENCHMARKS[args.name]
+    kw = {"workers": args.workers, "model_path": args.model}
+    kw = {k: v for k, v in kw.items() if k in inspect.signature(bench).parameters}
+    result = bench(rows=args.rows, repeat=args.repeat, **kw)
+    print(json.dumps(result, indent=2))
+    if result.get("ok") is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,16 +14,33 @@ New in v3 (this build):
 - ML optionally computes **eval metrics** (MAE/RMSE in meters) against a labeled eval file.
 - Saves a per-sector ML CSV for debugging, plus site-merged CSV.
 """
-import argparse, os, sys, math, re, logging, hashlib, json
+import argparse, os, sys, math, re, logging, json, glob, copy, hashlib, itertools, shutil, tempfile, time, weakref
+from collections import deque
 from datetime import datetime
 from typing import Dict, Tuple, List
 import numpy as np
 import pandas as pd
 
+try:
+    from . import geodesy as geo
+    from .parallel import SectorPool
+    from .model_registry import registry as model_registry
+    from .replay_store import ReplayStore
+    from . import validation
+    from . import forest
+    from .feature_schema import compile_schema, FeatureEncoder, log_drift
+except ImportError:  # executed as a standalone script
+    import geodesy as geo
+    from parallel import SectorPool
+    from model_registry import registry as model_registry
+    from replay_store import ReplayStore
+    import validation
+    import forest
+    from feature_schema import compile_schema, FeatureEncoder, log_drift
+
 # Optional ML imports
 try:
     from sklearn.ensemble import RandomForestRegressor
-    from sklearn.model_selection import KFold
     from sklearn.metrics import mean_absolute_error
     from sklearn.impute import SimpleImputer
     import joblib
@@ -66,31 +83,30 @@ def to_num(x):
         return v
     except: return np.nan
 
+INT32_SENTINEL = 2147483647.0
+
+def to_num_series(s: pd.Series) -> pd.Series:
+    """Column-wise `to_num`: strip thousands separators, coerce to float, map the INT32 sentinel and ±inf to NaN."""
+    if not (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s)):
+        s = pd.to_numeric(s.astype(str).str.strip().str.replace(",", "", regex=False), errors="coerce")
+    v = s.to_numpy(dtype=float, na_value=np.nan, copy=True)
+    v[(np.abs(v - INT32_SENTINEL) < 1) | np.isinf(v)] = np.nan
+    return pd.Series(v, index=s.index, name=s.name)
+
+def dbm_to_linear(dbm) -> np.ndarray:
+    return np.power(10.0, np.asarray(dbm, dtype=float) / 10.0)
+
+def rsrp_weights(rsrp_dbm) -> np.ndarray:
+    """Linear-power sample weights: 10^(dBm/10) floored at 1e-13, 0 for missing RSRP."""
+    lin = dbm_to_linear(rsrp_dbm)
+    return np.where(np.isnan(lin), 0.0, np.maximum(lin, 1e-13))
+
 def deg2rad(d): return d*math.pi/180.0
 def rad2deg(r): return r*180.0/math.pi
-def haversine(lat1, lon1, lat2, lon2):
-    R=6371000.0
-    phi1, phi2 = deg2rad(lat1), deg2rad(lat2)
-    dphi = deg2rad(lat2-lat1)
-    dl = deg2rad(lon2-lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
-    return 2*R*math.asin(math.sqrt(a))
-
-def meters_to_offsets(dNorth, dEast, base_lat):
-    R=6378137.0
-    dLat = dNorth / R
-    dLon = dEast / (R * math.cos(math.pi * base_lat / 180.0))
-    latO = base_lat + dLat * 180.0 / math.pi
-    lonO = dLon * 180.0 / math.pi
-    return latO, lonO
-
-def bearing_from_site(lat_site, lon_site, lat, lon):
-    phi1, phi2 = deg2rad(lat_site), deg2rad(lat)
-    dlon = deg2rad(lon - lon_site)
-    y = math.sin(dlon) * math.cos(phi2)
-    x = math.cos(phi1)*math.cos(phi2)*math.cos(dlon) + math.sin(phi1)*math.sin(phi2)
-    b = math.atan2(y, x)
-    return (rad2deg(b) + 360.0) % 360.0
+# Geodesy lives in geodesy.py (array-in/array-out); these names are kept for existing callers.
+haversine = geo.haversine
+meters_to_offsets = geo.meters_to_offsets
+bearing_from_site = geo.bearing
 
 def snap_deg(x, step=5):
     try:
@@ -98,6 +114,10 @@ def snap_deg(x, step=5):
         return (int(round(float(x)/step))*step) % 360
     except: return np.nan
 
+def most_common_str(s: pd.Series):
+    s = s.dropna()
+    return s.astype(str).value_counts().idxmax() if s.size > 0 else np.nan
+
 def infer_site_key(cellid):
     if pd.isna(cellid): return np.nan
     s = str(cellid).strip()
@@ -109,58 +129,96 @@ def infer_site_key(cellid):
     else:
         return s[:-1] if len(s)>1 else s
 
-def load_any(path: str, sheet: str = None) -> pd.DataFrame:
-    if path.lower().endswith((".xlsx",".xls")):
+PARQUET_EXTS = (".parquet", ".pq")
+ARROW_EXTS = (".feather", ".arrow", ".ipc")
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except Exception:
+        raise RuntimeError("pyarrow not available. Install: pip install pyarrow")
+
+def load_any(path: str, sheet: str = None, columns: List[str] = None) -> pd.DataFrame:
+    low = path.lower()
+    if low.endswith((".xlsx",".xls")):
         return pd.read_excel(path, sheet_name=sheet) if sheet else pd.read_excel(path)
-    return pd.read_csv(path)
+    if low.endswith(PARQUET_EXTS):
+        _require_pyarrow()
+        return pd.read_parquet(path, columns=columns)
+    if low.endswith(ARROW_EXTS):
+        _require_pyarrow()
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Arrow needs one type per column: numeric object columns (e.g. site_key_inferred with NaNs) become numbers,
+    anything else mixed becomes strings."""
+    out = df
+    for c in df.columns:
+        if df[c].dtype != object: continue
+        kind = pd.api.types.infer_dtype(df[c], skipna=True)
+        if kind in ("string", "empty"): continue
+        if out is df: out = df.copy()
+        if kind in ("integer", "floating", "mixed-integer-float", "decimal"):
+            out[c] = pd.to_numeric(df[c], errors="coerce")
+        else:
+            out[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return out
 
-def standardize_df(df: pd.DataFrame) -> pd.DataFrame:
+def write_table(df: pd.DataFrame, path_stem: str, fmt: str = "csv") -> str:
+    """Write `df` as `path_stem` + extension for `fmt` (csv | parquet | feather) and return the path."""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format '{fmt}'. Choose one of: {sorted(OUTPUT_FORMATS)}")
+    path = path_stem + OUTPUT_FORMATS[fmt]
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    else:
+        _require_pyarrow()
+        df = _arrow_safe(df.reset_index(drop=True))
+        if fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_feather(path)
+    return path
+
+COLUMN_ALIASES = {
+    "lat": ["latitude", "lat", "sector_lat", "site_lat"],
+    "lon": ["longitude", "lon", "sector_lon", "site_lon"],
+    "earfcn_or_narfcn": ["earfcn", "narfcn", "arfcn", "uarfcn", "frequency_channel", "channel"],
+    "pci_or_psi": ["pci", "psi", "physical_cell_id", "physcellid", "pcid", "primary_scrambling_code", "psc"],
+    "network": ["network", "operator", "carrier", "mno"],
+}
+NUMERIC_COLS = ["lat", "lon", "rsrp_dbm", "rsrq_db", "sinr_db", "rssi", "earfcn_or_narfcn", "pci_or_psi", "band_mhz", "speed_kmh", "heading_deg", "ta"]
+CELLID_CANDIDATES = ["cell_id_global","cellid","cell_id","eci","ecgi","nrcgi","nr_cgi"]
+
+def column_renames(cols) -> Dict[str, str]:
+    """Normalized column name -> canonical name, first matching alias wins (an existing canonical column is kept)."""
+    present = list(cols)
+    renames = {}
+    for target, candidates in COLUMN_ALIASES.items():
+        for candidate in candidates:
+            if candidate in present and target not in present:
+                renames[candidate] = target
+                present[present.index(candidate)] = target
+                break
+    return renames
+
+def standardize_df(df: pd.DataFrame, verbose: bool = True) -> pd.DataFrame:
     df = df.copy()
     df.columns = normalize_cols(df.columns)
     
-    # Latitude/Longitude mapping
-    lat_candidates = ["latitude", "lat", "sector_lat", "site_lat"]
-    for candidate in lat_candidates:
-        if candidate in df.columns and "lat" not in df.columns:
-            df.rename(columns={candidate: "lat"}, inplace=True)
-            logging.info(f"Mapped '{candidate}' -> 'lat'")
-            break
-    
-    lon_candidates = ["longitude", "lon", "sector_lon", "site_lon"]
-    for candidate in lon_candidates:
-        if candidate in df.columns and "lon" not in df.columns:
-            df.rename(columns={candidate: "lon"}, inplace=True)
-            logging.info(f"Mapped '{candidate}' -> 'lon'")
-            break
-    
-    # EARFCN/NARFCN mapping
-    earfcn_candidates = ["earfcn", "narfcn", "arfcn", "uarfcn", "frequency_channel", "channel"]
-    for candidate in earfcn_candidates:
-        if candidate in df.columns and "earfcn_or_narfcn" not in df.columns:
-            df.rename(columns={candidate: "earfcn_or_narfcn"}, inplace=True)
-            logging.info(f"Mapped '{candidate}' -> 'earfcn_or_narfcn'")
-            break
-    
-    # PCI/PSI mapping
-    pci_candidates = ["pci", "psi", "physical_cell_id", "physcellid", "pcid", "primary_scrambling_code", "psc"]
-    for candidate in pci_candidates:
-        if candidate in df.columns and "pci_or_psi" not in df.columns:
-            df.rename(columns={candidate: "pci_or_psi"}, inplace=True)
-            logging.info(f"Mapped '{candidate}' -> 'pci_or_psi'")
-            break
-    
-    # Network mapping (if exists)
-    network_candidates = ["network", "operator", "carrier", "mno"]
-    for candidate in network_candidates:
-        if candidate in df.columns and "network" not in df.columns:
-            df.rename(columns={candidate: "network"}, inplace=True)
-            logging.info(f"Mapped '{candidate}' -> 'network'")
-            break
+    # Canonical lat/lon, EARFCN/NARFCN, PCI/PSI and network names
+    renames = column_renames(df.columns)
+    df.rename(columns=renames, inplace=True)
+    if verbose:
+        for candidate, target in renames.items():
+            logging.info(f"Mapped '{candidate}' -> '{target}'")
     
     # Numeric conversions
-    for c in ["lat", "lon", "rsrp_dbm", "rsrq_db", "sinr_db", "rssi", "earfcn_or_narfcn", "pci_or_psi", "band_mhz", "speed_kmh", "heading_deg", "ta"]:
+    for c in NUMERIC_COLS:
         if c in df.columns:
-            df[c] = df[c].apply(to_num)
+            df[c] = to_num_series(df[c])
     
     # Categorical conversions
     for cat in ["network", "technology"]:
@@ -168,44 +226,572 @@ def standardize_df(df: pd.DataFrame) -> pd.DataFrame:
             df[cat] = df[cat].astype(str).str.lower()
     
     # Log final column mapping
-    required = ["lat", "lon", "earfcn_or_narfcn", "pci_or_psi"]
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        logging.warning(f"Missing required columns after mapping: {missing}")
-        logging.info(f"Available columns: {list(df.columns)}")
-    else:
-        logging.info(f"✅ All required columns mapped successfully")
+    if verbose:
+        required = ["lat", "lon", "earfcn_or_narfcn", "pci_or_psi"]
+        missing = [col for col in required if col not in df.columns]
+        if missing:
+            logging.warning(f"Missing required columns after mapping: {missing}")
+            logging.info(f"Available columns: {list(df.columns)}")
+        else:
+            logging.info(f"✅ All required columns mapped successfully")
     
     return df
+# --------------------- Standardized input cache --------------------
+STANDARDIZED_VERSION = 1        # bump when standardize_df changes what it produces for the same file
+INPUT_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+def file_sha256(path: str, block: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def input_key(path: str, sheet: str = None) -> str:
+    """Input id: SHA-256 over the file's bytes, the sheet and STANDARDIZED_VERSION."""
+    return hashlib.sha256(f"{file_sha256(path)}|{sheet or ''}|v{STANDARDIZED_VERSION}".encode()).hexdigest()
+
+def find_standardized(cache_dir: str, key: str):
+    """Path of the standardized Parquet artifact for input id `key` in `cache_dir`, None if absent or `key` is malformed."""
+    if not cache_dir or not INPUT_ID_RE.fullmatch(str(key)):
+        return None
+    found = glob.glob(os.path.join(cache_dir, key, "*.parquet"))
+    return found[0] if found else None
+
+def standardized_source(path: str, sheet: str = None, cache_dir: str = None):
+    """(cached standardized artifact to read instead of `path` or None, input id or None). `path` may itself be
+    an artifact (a run reusing an input id); without `cache_dir` nothing is hashed."""
+    if not cache_dir:
+        return None, None
+    parent = os.path.dirname(os.path.abspath(path))
+    if os.path.dirname(parent) == os.path.abspath(cache_dir) and INPUT_ID_RE.fullmatch(os.path.basename(parent)):
+        return path, os.path.basename(parent)
+    key = input_key(path, sheet)
+    art = find_standardized(cache_dir, key)
+    if art is not None:
+        os.utime(os.path.dirname(art))     # last use, for pruning
+        logging.info(f"Reusing standardized input {key[:12]} ({art})")
+    return art, key
+
+def save_standardized(df: pd.DataFrame, cache_dir: str, key: str, path: str, sheet: str = None, max_bytes: int = None):
+    """Write a standardized frame as `cache_dir`/<key>/<input stem>.parquet (+ meta.json), then prune the cache.
+    The stem keeps output names of runs that reuse the id. Returns the artifact path (None without pyarrow)."""
+    try:
+        _require_pyarrow()
+    except RuntimeError as e:
+        logging.warning(f"Standardized input not cached: {e}")
+        return None
+    final = os.path.join(cache_dir, key)
+    tmp = f"{final}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0] + ".parquet"
+    _arrow_safe(df.reset_index(drop=True)).to_parquet(os.path.join(tmp, name), index=False)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"input_id": key, "filename": os.path.basename(path), "sheet": sheet, "rows": int(len(df)),
+                   "columns": list(map(str, df.columns)), "created": time.time()}, f)
+    try:
+        os.replace(tmp, final)
+    except OSError:     # another run cached the same input first
+        shutil.rmtree(tmp, ignore_errors=True)
+    if max_bytes is not None:
+        prune_standardized(cache_dir, max_bytes)
+    return find_standardized(cache_dir, key)
+
+def prune_standardized(cache_dir: str, max_bytes: int):
+    """Drop the least recently used artifacts while the cache exceeds `max_bytes` (the newest is always kept)."""
+    dirs = []
+    for name in os.listdir(cache_dir):
+        d = os.path.join(cache_dir, name)
+        if INPUT_ID_RE.fullmatch(name) and os.path.isdir(d):
+            size = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+            dirs.append((os.path.getmtime(d), size, d))
+    dirs.sort()
+    total = sum(size for _, size, _ in dirs)
+    while len(dirs) > 1 and total > max_bytes:
+        _, size, d = dirs.pop(0)
+        shutil.rmtree(d, ignore_errors=True)
+        total -= size
+        logging.info(f"Standardized input cache: evicted {os.path.basename(d)[:12]}")
+
+def load_standardized(path: str, sheet: str = None, cache_dir: str = None, max_bytes: int = None):
+    """standardize_df(load_any(path, sheet)), read from / written to the input cache in `cache_dir` when given.
+    Returns (frame, input id or None)."""
+    src, key = standardized_source(path, sheet, cache_dir)
+    if src is not None:
+        return load_any(src), key
+    df = standardize_df(load_any(path, sheet))
+    if key is not None:
+        save_standardized(df, cache_dir, key, path, sheet, max_bytes)
+    return df, key
+
+# --------------------- Sector grouping & streaming ingestion -------
+AUDIT_COLS = ["timestamp_utc","lat","lon","technology","network","band","band_mhz","earfcn_or_narfcn","pci_or_psi","rsrp_dbm","rsrq_db","sinr_db","ta"]
+AUDIT_ROWS = 20000
+
+def sector_group_cols(columns) -> List[str]:
+    group_cols = []
+    if "network" in columns: group_cols.append("network")
+    for gc in ["earfcn_or_narfcn","pci_or_psi"]:
+        if gc in columns: group_cols.append(gc)
+    if len(group_cols) < 2:
+        raise ValueError("Need at least earfcn_or_narfcn and pci_or_psi (network optional).")
+    return group_cols
+
+class SectorIndex:
+    """Sort-based layout of the samples per sector key (network, earfcn_or_narfcn, pci_or_psi).
+
+    Rows with valid `required` columns are grouped once and stored contiguously by key, so every
+    per-sector pass takes a cheap positional slice instead of re-masking the full frame.
+    Within a sector, rows keep their original order and index labels.
+    """
+    def __init__(self, df: pd.DataFrame, group_cols: List[str], required: Tuple[str, ...] = ("lat","lon")):
+        self.group_cols = list(group_cols)
+        self.columns = list(df.columns)
+        self.nonnull = {c: int(n) for c, n in df.notna().sum().items()}
+        sub = df.dropna(subset=list(required))
+        self.latlon = sub[["lat","lon"]].to_numpy(dtype=float)
+        groups = sub.groupby(self.group_cols, sort=True).indices
+        parts = list(groups.values())
+        order = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        self.frame = sub.iloc[order]
+        bounds = np.cumsum([0] + [len(p) for p in parts])
+        self.slices = {(k if isinstance(k, tuple) else (k,)): slice(int(bounds[i]), int(bounds[i+1]))
+                       for i, k in enumerate(groups)}
+
+    def __len__(self):
+        return len(self.slices)
+
+    def has_values(self, col: str) -> bool:
+        return self.nonnull.get(col, 0) > 0
+
+    def key_of(self, r) -> tuple:
+        return tuple(getattr(r, c) for c in self.group_cols)
+
+    def rows(self, key: tuple) -> pd.DataFrame:
+        s = self.slices.get(key)
+        return self.frame.iloc[s] if s is not None else self.frame.iloc[0:0]
+
+    def items(self):
+        for key, s in self.slices.items():
+            yield key, self.frame.iloc[s]
+
+class SpilledSectors:
+    """Out-of-core counterpart of SectorIndex for inputs larger than memory.
+
+    Standardized chunks are hash-partitioned by sector key into pickle files in a temporary
+    directory. Iteration and lookups load one partition at a time (as a SectorIndex), so peak
+    memory is about one chunk plus one partition. Passes that walk sectors in `items()` order hit
+    each partition once. Global coordinates are kept as a bounded uniform sample (`latlon`)
+    for the geofence statistics; it is exact when the input has fewer rows than `sample_size`.
+    """
+    def __init__(self, group_cols: List[str], required: Tuple[str, ...] = ("lat","lon"), n_partitions: int = 64,
+                 spill_dir: str = None, sample_size: int = 200_000, seed: int = 42):
+        self.group_cols = list(group_cols)
+        self.required = tuple(required)
+        self.n_partitions = int(n_partitions)
+        self.dir = tempfile.mkdtemp(prefix="cellsite_spill_", dir=spill_dir)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.dir, True)
+        self.columns, self.nonnull, self.partition_of = [], {}, {}
+        self.n_rows, self._n_chunks = 0, 0
+        self._parts, self._empty, self._cached = set(), None, (None, None)
+        self._rng = np.random.default_rng(seed)
+        self._sample_size = int(sample_size)
+        self.latlon, self._prio = np.empty((0, 2)), np.empty(0)
+
+    def add(self, chunk: pd.DataFrame):
+        self.columns += [c for c in chunk.columns if c not in self.columns]
+        for c, n in chunk.notna().sum().items():
+            self.nonnull[c] = self.nonnull.get(c, 0) + int(n)
+        chunk = chunk.dropna(subset=list(self.required))
+        if self._empty is None:
+            self._empty = chunk.iloc[0:0]
+        if chunk.empty:
+            return
+        self._add_sample(chunk[["lat","lon"]].to_numpy(dtype=float))
+        part = (pd.util.hash_pandas_object(chunk[self.group_cols], index=False).to_numpy() % self.n_partitions).astype(np.int64)
+        for row in chunk[self.group_cols].assign(_part=part).drop_duplicates().itertuples(index=False, name=None):
+            self.partition_of[row[:-1]] = int(row[-1])
+        for p, piece in chunk.groupby(part, sort=False):
+            piece.to_pickle(os.path.join(self.dir, f"part{int(p):04d}_{self._n_chunks:06d}.pkl"))
+            self._parts.add(int(p))
+        self._n_chunks += 1
+        self.n_rows += len(chunk)
+
+    def _add_sample(self, ll: np.ndarray):
+        # bottom-k priority sampling == uniform sample without replacement over everything seen so far
+        self.latlon = np.vstack([self.latlon, ll])
+        self._prio = np.concatenate([self._prio, self._rng.random(len(ll))])
+        if len(self._prio) > self._sample_size:
+            keep = np.argpartition(self._prio, self._sample_size)[:self._sample_size]
+            self.latlon, self._prio = self.latlon[keep], self._prio[keep]
+
+    def _load(self, p: int) -> SectorIndex:
+        if self._cached[0] != p:
+            self._cached = (None, None)
+            files = sorted(glob.glob(os.path.join(self.dir, f"part{p:04d}_*.pkl")))
+            frame = pd.concat([pd.read_pickle(f) for f in files]) if files else self._empty
+            self._cached = (p, SectorIndex(frame, self.group_cols, self.required))
+        return self._cached[1]
+
+    def __len__(self):
+        return len(self.partition_of)
+
+    def has_values(self, col: str) -> bool:
+        return self.nonnull.get(col, 0) > 0
+
+    def key_of(self, r) -> tuple:
+        return tuple(getattr(r, c) for c in self.group_cols)
+
+    def rows(self, key: tuple) -> pd.DataFrame:
+        p = self.partition_of.get(key)
+        return self._empty if p is None else self._load(p).rows(key)
+
+    def items(self):
+        for p in sorted(self._parts):
+            yield from self._load(p).items()
+
+    def close(self):
+        self._cached = (None, None)
+        self._cleanup()
+
+def pipeline_columns() -> List[str]:
+    """Canonical columns any pipeline stage reads; everything else is dropped at ingestion."""
+    return sorted(set(AUDIT_COLS + FEATURE_CANDIDATES + CATEGORICALS + CELLID_CANDIDATES + ["lat","lon","ta"]))
+
+def read_header(path: str, sheet: str = None) -> List[str]:
+    low = path.lower()
+    if low.endswith(".xlsx"):
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet] if sheet else wb.worksheets[0]
+            return [c for c in next(ws.iter_rows(max_row=1, values_only=True))]
+        finally:
+            wb.close()
+    if low.endswith(".xls"):
+        return list(pd.read_excel(path, sheet_name=sheet or 0, nrows=0).columns)
+    if low.endswith(PARQUET_EXTS):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    if low.endswith(ARROW_EXTS):
+        _require_pyarrow()
+        import pyarrow as pa
+        with pa.memory_map(path, "r") as src:
+            return list(pa.ipc.open_file(src).schema.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def project_columns(raw_cols: List[str], wanted) -> List[str]:
+    """Raw header names whose canonical (normalized + aliased) name is in `wanted`."""
+    norm = normalize_cols(raw_cols)
+    renames = column_renames(norm)
+    wanted = set(wanted)
+    return [raw for raw, n in zip(raw_cols, norm) if renames.get(n, n) in wanted]
+
+def iter_input_chunks(path: str, sheet: str = None, chunksize: int = 200_000, columns: List[str] = None):
+    """Yield raw DataFrame chunks of at most `chunksize` rows, reading only the raw columns that map to `columns`.
+    CSV streams via read_csv(chunksize), XLSX via openpyxl read-only rows, Parquet/Arrow via record batches;
+    legacy XLS has no streaming reader and is loaded once, then sliced."""
+    header = read_header(path, sheet)
+    usecols = project_columns(header, columns) if columns else list(header)
+    low = path.lower()
+    if low.endswith(".xlsx"):
+        import openpyxl
+        take = [i for i, c in enumerate(header) if c in set(usecols)]
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet] if sheet else wb.worksheets[0]
+            buf, offset = [], 0
+            for row in ws.iter_rows(min_row=2, values_only=True):
+                buf.append([row[i] if i < len(row) else None for i in take])
+                if len(buf) >= chunksize:
+                    yield pd.DataFrame(buf, columns=[header[i] for i in take], index=pd.RangeIndex(offset, offset + len(buf)))
+                    offset += len(buf); buf = []
+            if buf:
+                yield pd.DataFrame(buf, columns=[header[i] for i in take], index=pd.RangeIndex(offset, offset + len(buf)))
+        finally:
+            wb.close()
+    elif low.endswith(".xls"):
+        df = load_any(path, sheet)[usecols]
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    elif low.endswith(PARQUET_EXTS) or low.endswith(ARROW_EXTS):
+        _require_pyarrow()
+        import pyarrow as pa, pyarrow.parquet as pq
+        if low.endswith(PARQUET_EXTS):
+            batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=usecols)
+        else:
+            # IPC files are memory-mapped: batches are zero-copy views until converted to pandas
+            batches = pa.ipc.open_file(pa.memory_map(path, "r")).read_all().select(usecols).to_batches(max_chunksize=chunksize)
+        offset = 0
+        for batch in batches:
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+    else:
+        yield from pd.read_csv(path, usecols=usecols, chunksize=chunksize)
+
+def spill_input(path: str, sheet: str = None, chunksize: int = 200_000, required: Tuple[str, ...] = ("lat","lon"),
+                transform=None, spill_dir: str = None, n_partitions: int = None):
+    """Stream `path` into a SpilledSectors store: project, standardize (and optionally `transform`) each chunk, then
+    partition it by sector key. Returns (store, head) where head holds the first AUDIT_ROWS standardized rows."""
+    if n_partitions is None:
+        n_partitions = int(np.clip(os.path.getsize(path) // (32 * 1024 * 1024), 16, 512))
+    sectors, head, n_head = None, [], 0
+    for i, raw in enumerate(iter_input_chunks(path, sheet, chunksize, columns=pipeline_columns())):
+        chunk = standardize_df(raw, verbose=(i == 0))
+        if n_head < AUDIT_ROWS:
+            head.append(chunk.head(AUDIT_ROWS - n_head)); n_head += len(head[-1])
+        if transform is not None:
+            chunk = transform(chunk)
+        if sectors is None:
+            sectors = SpilledSectors(sector_group_cols(chunk.columns), required, n_partitions, spill_dir)
+        sectors.add(chunk)
+    if sectors is None:
+        raise ValueError(f"No rows found in {path}")
+    logging.info(f"Streamed {sectors.n_rows} rows into {len(sectors)} sector keys across {n_partitions} spill partitions")
+    return sectors, pd.concat(head)
+
+# --------------------- Spatial pre-aggregation ---------------------
+AGG_COUNT = "agg_count"     # raw samples behind an aggregated row; kernels weight rows by it
+
+def aggregate_samples(df: pd.DataFrame, group_cols: List[str], grid_m: float) -> pd.DataFrame:
+    """Collapse each sector's samples into one weighted representative per `grid_m` metre grid cell.
+
+    The grid is fixed, not fitted to the data (rows of `grid_m` metres of latitude, each cut into
+    `grid_m`-metre columns at the row's latitude), so every chunk of a stream snaps to the same cells.
+    A representative carries the mean position, the linear-power mean RSRP, the mean of every other
+    numeric column, ta_min/ta_max, the first value of cell ids and non-numeric columns, and AGG_COUNT.
+    Rows without a position or sector key are dropped, as the sector grouping drops them anyway."""
+    df = df.dropna(subset=["lat","lon"] + list(group_cols))
+    lat, lon = df["lat"].to_numpy(dtype=float), df["lon"].to_numpy(dtype=float)
+    row = np.floor(np.radians(lat) * geo.WGS84_A_M / grid_m)
+    row_lat = np.radians((row + 0.5) * grid_m / geo.WGS84_A_M)
+    col = np.floor(np.radians(lon) * geo.WGS84_A_M * np.cos(row_lat) / grid_m)
+    keys = [df[c] for c in group_cols] + [pd.Series(row, index=df.index), pd.Series(col, index=df.index)]
+    num = [c for c in df.select_dtypes("number").columns if c not in group_cols and c not in CELLID_CANDIDATES]
+    other = [c for c in df.columns if c not in num and c not in group_cols]
+    work = df[num].astype(float)
+    if "rsrp_dbm" in num:
+        work["rsrp_dbm"] = dbm_to_linear(work["rsrp_dbm"])
+    by = work.groupby(keys, sort=False)
+    out = by.mean()
+    if "rsrp_dbm" in out.columns:
+        out["rsrp_dbm"] = 10.0 * np.log10(out["rsrp_dbm"])
+    if "ta" in num:
+        out["ta_min"], out["ta_max"] = by["ta"].min(), by["ta"].max()
+    if other:
+        out[other] = df[other].groupby(keys, sort=False).first()
+    out[AGG_COUNT] = by.size()
+    out = out.reset_index(level=list(range(len(group_cols)))).reset_index(drop=True)
+    front = [c for c in df.columns if c in out.columns]
+    return out[front + [c for c in out.columns if c not in front]]
+
+def pre_aggregator(grid_m: float, stats: dict):
+    """aggregate_samples as a per-frame transform (whole input or stream chunk) that tallies rows in/out
+    and the compression ratio into `stats`."""
+    stats.update(grid_m=float(grid_m), rows_in=0, rows_out=0)
+    def run(frame: pd.DataFrame) -> pd.DataFrame:
+        out = aggregate_samples(frame, sector_group_cols(frame.columns), grid_m)
+        stats["rows_in"] += len(frame); stats["rows_out"] += len(out)
+        stats["compression"] = round(stats["rows_in"] / max(stats["rows_out"], 1), 2)
+        return out
+    return run
+
+def sector_size(g: pd.DataFrame) -> int:
+    """Raw samples of a sector slice (sum of AGG_COUNT when aggregated)."""
+    return int(round(g[AGG_COUNT].sum())) if AGG_COUNT in g.columns else int(len(g))
+
+def weighted_median(x: np.ndarray, w: np.ndarray = None) -> float:
+    """np.median, or the lower weighted median when `w` (aggregated counts) is given."""
+    if w is None:
+        return float(np.median(x))
+    order = np.argsort(x, kind="stable")
+    cw = np.cumsum(w[order])
+    return float(x[order][np.searchsorted(cw, cw[-1] / 2.0)])
+
+def sector_counts(g: pd.DataFrame):
+    """Per-row sample counts of an aggregated sector slice, None for raw samples."""
+    return g[AGG_COUNT].to_numpy(dtype=float) if AGG_COUNT in g.columns else None
+
+# --------------------- Per-sector sample cap ("fast mode") ---------
+SAMPLE_CAP_BEARING_BINS = 8     # 45-degree bearing strata around the sector's median sample point
+SAMPLE_CAP_DISTANCE_BINS = 4    # distance-quartile strata within each bearing stratum
+
+def cap_sector_samples(g: pd.DataFrame, max_samples: int, seed: int = 0) -> pd.DataFrame:
+    """At most `max_samples` rows of one sector slice, as a stratified reservoir sample.
+
+    Rows are binned by bearing and distance-quartile from the sector's median sample point, and each
+    stratum keeps a share of the cap proportional to its size (at least one row), so the shape of the
+    coverage survives. Within a stratum the rows with the smallest uniform random keys are kept (a
+    reservoir sample, seeded so every pass over the same sector picks the same rows). Kept rows carry
+    AGG_COUNT = stratum size / rows kept (times any aggregated count), so the weighted kernels and
+    sector_size see the full sector. Caps below the stratum count are raised to it."""
+    n_strata = SAMPLE_CAP_BEARING_BINS * SAMPLE_CAP_DISTANCE_BINS
+    k, n = max(int(max_samples), n_strata), len(g)
+    if n <= k:
+        return g
+    lat, lon = g["lat"].to_numpy(dtype=float), g["lon"].to_numpy(dtype=float)
+    count = sector_counts(g)
+    brg, dist = geo.bearing_distance(weighted_median(lat, count), weighted_median(lon, count), lat, lon)
+    b = np.minimum((brg * (SAMPLE_CAP_BEARING_BINS / 360.0)).astype(np.intp), SAMPLE_CAP_BEARING_BINS - 1)
+    d = np.searchsorted(np.quantile(dist, np.linspace(0, 1, SAMPLE_CAP_DISTANCE_BINS + 1)[1:-1]), dist, side="right")
+    stratum = b * SAMPLE_CAP_DISTANCE_BINS + d
+    sizes = np.bincount(stratum, minlength=n_strata)
+    # proportional quotas, one row for every non-empty stratum, the rest by largest remainder
+    share = sizes * ((k - np.count_nonzero(sizes)) / n)
+    quota = np.floor(share).astype(np.intp)
+    left = k - np.count_nonzero(sizes) - quota.sum()
+    quota[np.argsort(quota - share, kind="stable")[:left]] += 1
+    quota = np.minimum(quota + (sizes > 0), sizes)
+    order = np.lexsort((np.random.default_rng(seed).random(n), stratum))
+    rank = np.arange(n) - (np.cumsum(sizes) - sizes)[stratum[order]]
+    keep = np.sort(order[rank < quota[stratum[order]]])
+    out = g.iloc[keep].copy()
+    scale = sizes[stratum[keep]] / quota[stratum[keep]]
+    out[AGG_COUNT] = scale if count is None else count[keep] * scale
+    return out
+
+def sector_capper(max_samples: int, stats: dict):
+    """cap_sector_samples as a per-sector transform; `record=True` (first pass over a sector) tallies
+    sectors capped and rows in/out into `stats`. The identity when `max_samples` is unset."""
+    if not max_samples:
+        return lambda g, record=False: g
+    stats.update(max_samples_per_sector=int(max_samples), sectors_capped=0, rows_in=0, rows_out=0)
+    def run(g: pd.DataFrame, record: bool = False) -> pd.DataFrame:
+        out = cap_sector_samples(g, max_samples)
+        if record:
+            stats["sectors_capped"] += int(len(out) < len(g))
+            stats["rows_in"] += len(g); stats["rows_out"] += len(out)
+        return out
+    return run
+
 # --------------------- Shared Azimuth ------------------------------
-def azimuth_histogram(samples: pd.DataFrame, lat_site: float, lon_site: float, bin_size:int=5):
-    if "rsrp_dbm" in samples.columns and not samples["rsrp_dbm"].isna().all():
-        w = samples["rsrp_dbm"].apply(lambda v: max(10**(v/10.0), 1e-13) if pd.notna(v) else 0.0).values
+def sector_arrays(g: pd.DataFrame, extra: Tuple[str, ...]=()):
+    """Compact per-sector slice handed to the array kernels / worker processes: float lat, lon,
+    rsrp (None when the column is absent) and any `extra` columns."""
+    out = [g["lat"].to_numpy(dtype=float), g["lon"].to_numpy(dtype=float),
+           g["rsrp_dbm"].to_numpy(dtype=float) if "rsrp_dbm" in g.columns else None]
+    return tuple(out + [g[c].to_numpy(dtype=float) for c in extra])
+
+def sample_weights(rsrp, n: int) -> np.ndarray:
+    if rsrp is not None and not np.isnan(rsrp).all():
+        return rsrp_weights(rsrp)
+    return np.ones(n)
+
+AZIMUTH_BATCH_SAMPLES = 2_000_000   # samples per azimuth_sectors call when batching a stream of sectors
+AZIMUTH_BLOCK_CELLS = 4_000_000     # (sector, bin) cells per block of the half-power walk
+
+def azimuth_sectors(sid, lat, lon, rsrp, lat_site, lon_site, bin_size:int=5, count=None):
+    """Azimuth, half-power beamwidth and reliability for many sectors at once. `sid` (0..S-1) assigns each
+    sample to a sector, `lat_site`/`lon_site` hold each sector's site. Samples are weighted by linear RSRP
+    (1 in sectors without any RSRP) times sqrt(distance), and every sector's bearing histogram is one row of
+    a single (S, bins) np.bincount. Beamwidth counts the bins from the first below-half-peak bin on one
+    side of the peak to the first on the other (2 bins for a lone peak, all bins if none falls below).
+    `count` multiplies the weights of aggregated samples (see aggregate_samples).
+    Returns float arrays (azimuth snapped to `bin_size`, beamwidth deg, reliability); NaN, NaN, 0 for
+    sectors without weight."""
+    sid = np.asarray(sid, dtype=np.intp)
+    bearings, w2 = sector_bearings(sid, lat, lon, rsrp, lat_site, lon_site, count=count)
+    return bearing_azimuths(sid, bearings, w2, len(lat_site), bin_size=bin_size)
+
+def sector_bearings(sid, lat, lon, rsrp, lat_site, lon_site, count=None):
+    """Bearing (deg) of every sample from its sector's site and its histogram weight; the bin-size
+    independent half of azimuth_sectors."""
+    lat_site, lon_site = np.asarray(lat_site, dtype=float), np.asarray(lon_site, dtype=float)
+    S = len(lat_site)
+    if rsrp is None:
+        w = np.ones(len(sid))
     else:
-        w = np.ones(len(samples))
-    bearings = np.array([bearing_from_site(lat_site, lon_site, r.lat, r.lon) for r in samples.itertuples(index=False)])
-    dists = np.array([haversine(lat_site, lon_site, r.lat, r.lon) for r in samples.itertuples(index=False)])
-    w2 = w * np.power(np.maximum(dists, 1.0), 0.5)
-    bins = np.arange(0, 360+bin_size, bin_size)
-    hist, edges = np.histogram(bearings, bins=bins, weights=w2)
-    if hist.sum() <= 0:
+        rsrp = np.asarray(rsrp, dtype=float)
+        has_rsrp = np.bincount(sid, weights=~np.isnan(rsrp), minlength=S) > 0
+        w = np.where(has_rsrp[sid], rsrp_weights(rsrp), 1.0)
+    if count is not None:
+        w = w * count
+    ls, lo = lat_site[sid], lon_site[sid]
+    bearings, dist = geo.bearing_distance(ls, lo, lat, lon)
+    return bearings, w * np.power(np.maximum(dist, 1.0), 0.5)
+
+def bearing_azimuths(sid, bearings, w2, S: int, bin_size:int=5):
+    """Histogram half of azimuth_sectors over precomputed sector_bearings (S sectors)."""
+    edges = np.arange(0, 360 + bin_size, bin_size)
+    nb = len(edges) - 1
+    ok = ~np.isnan(bearings)
+    x = bearings[ok]
+    # np.histogram's uniform-bin rule: floor((x - lo) * nb / span), then nudge by one where the float
+    # product lands on the wrong side of an edge
+    b = np.minimum((x * (nb / float(edges[-1]))).astype(np.intp), nb - 1)
+    b -= x < edges[b]
+    b += (x >= edges[b + 1]) & (b != nb - 1)
+    hist = np.bincount(sid[ok] * nb + b, weights=w2[ok], minlength=S * nb).reshape(S, nb)
+    total = hist.sum(axis=1)
+    peak = hist.argmax(axis=1)
+    top = hist[np.arange(S), peak]
+    width = np.empty(S, dtype=np.intp)
+    j = np.arange(nb)
+    step = max(1, AZIMUTH_BLOCK_CELLS // nb)
+    for s0 in range(0, S, step):
+        blk = slice(s0, s0 + step)
+        above = hist[blk] >= (top[blk] / 2.0)[:, None]
+        r = np.arange(above.shape[0])[:, None]
+        right = np.argmin(above[r, (peak[blk, None] + j) % nb], axis=1)    # first bin below half, going right
+        left = np.argmin(above[r, (peak[blk, None] - j) % nb], axis=1)
+        width[blk] = np.where(above.all(axis=1), nb, np.minimum(left + right, nb))
+    center = (edges[peak] + edges[peak + 1]) / 2.0
+    empty = total <= 0
+    az = np.where(empty, np.nan, (np.round(center / bin_size) * bin_size) % 360)   # snap_deg
+    beam = np.where(empty, np.nan, width * bin_size)
+    rel = np.where(empty, 0.0, top / np.maximum(total, 1e-12))
+    return az, beam, rel
+
+def _azimuth_scalars(az, beam, rel):
+    if np.isnan(az):
         return np.nan, np.nan, 0.0
-    peak_idx = int(np.argmax(hist))
-    center_deg = (edges[peak_idx] + edges[peak_idx+1]) / 2.0
-    half = hist[peak_idx] / 2.0
-    n = len(hist)
-    left = peak_idx
-    while hist[left] >= half:
-        left = (left - 1) % n
-        if left == (peak_idx - 1) % n: break
-    right = peak_idx
-    while hist[right] >= half:
-        right = (right + 1) % n
-        if right == (peak_idx + 1) % n: break
-    width_bins = (right - left) if right >= left else (n - left + right)
-    beam_deg = width_bins * bin_size
-    reliability = float(hist[peak_idx]/max(hist.sum(),1e-12))
-    return snap_deg(center_deg, step=bin_size), beam_deg, reliability
+    return int(az), int(beam), float(rel)
+
+def azimuth_from_arrays(lat, lon, rsrp, lat_site: float, lon_site: float, bin_size:int=5):
+    az, beam, rel = azimuth_sectors(np.zeros(len(lat), dtype=np.intp), lat, lon, rsrp, [lat_site], [lon_site], bin_size=bin_size)
+    return _azimuth_scalars(az[0], beam[0], rel[0])
+
+def azimuth_batches(items, bin_size:int=5, max_samples:int=AZIMUTH_BATCH_SAMPLES):
+    """Yield (azimuth, beamwidth, reliability) per item of `items`, in order. An item is (lat, lon, rsrp,
+    lat_site, lon_site[, count]) for one sector, or None for a sector to skip (NaN result). Sectors are
+    gathered until `max_samples` samples and solved by one azimuth_sectors call per batch."""
+    for res in azimuth_sweep_batches(items, (bin_size,), max_samples=max_samples):
+        yield res[0]
+
+def azimuth_sweep_batches(items, bin_sizes, max_samples:int=AZIMUTH_BATCH_SAMPLES):
+    """azimuth_batches for several bin sizes at once: yields, per item, one (azimuth, beamwidth,
+    reliability) per entry of `bin_sizes`. Bearings are computed once per batch and binned per size."""
+    buf, n_buf = [], 0
+    skipped = tuple((np.nan, np.nan, np.nan) for _ in bin_sizes)
+
+    def flush():
+        todo = [it for it in buf if it is not None]
+        if todo:
+            sizes = np.array([len(it[0]) for it in todo])
+            rsrp = [it[2] if it[2] is not None else np.full(len(it[0]), np.nan) for it in todo]
+            counted = any(len(it) > 5 and it[5] is not None for it in todo)
+            count = np.concatenate([it[5] if len(it) > 5 and it[5] is not None else np.ones(len(it[0])) for it in todo]) if counted else None
+            sid = np.repeat(np.arange(len(todo)), sizes)
+            bearings, w2 = sector_bearings(sid, np.concatenate([it[0] for it in todo]), np.concatenate([it[1] for it in todo]),
+                                           np.concatenate(rsrp), [it[3] for it in todo], [it[4] for it in todo], count=count)
+            res = [iter(zip(*bearing_azimuths(sid, bearings, w2, len(todo), bin_size=b))) for b in bin_sizes]
+        for it in buf:
+            yield skipped if it is None else tuple(_azimuth_scalars(*next(r)) for r in res)
+
+    for it in items:
+        buf.append(it)
+        n_buf += 0 if it is None else len(it[0])
+        if n_buf >= max_samples:
+            yield from flush()
+            buf, n_buf = [], 0
+    yield from flush()
+
+def azimuth_histogram(samples: pd.DataFrame, lat_site: float, lon_site: float, bin_size:int=5):
+    lat, lon, rsrp = sector_arrays(samples)
+    return azimuth_from_arrays(lat, lon, rsrp, lat_site, lon_site, bin_size=bin_size)
 
 def soft_equal_spacing(df_site: pd.DataFrame, bin_size:int=5) -> pd.DataFrame:
     def ang_diff(a,b):
@@ -263,298 +849,630 @@ def soft_equal_spacing(df_site: pd.DataFrame, bin_size:int=5) -> pd.DataFrame:
     df_site2.drop(columns=["__rowid__"], inplace=True)
     return df_site2
 
-# --------------------- NO-ML pipeline ------------------------------
-def weighted_centroid_top_rsrp(g: pd.DataFrame):
-    if "rsrp_dbm" in g.columns and not g["rsrp_dbm"].isna().all():
-        w = g["rsrp_dbm"].apply(lambda v: max(10**(v/10.0), 1e-13) if pd.notna(v) else 0.0)
+SOFT_SPACING_COLUMNS = ["azimuth_deg_5_soft", "azimuth_adjustment_deg", "template_spacing_deg", "spacing_used"]
+
+def _soft_spacing_weights(pred: pd.DataFrame, gid: np.ndarray, n_groups: int) -> np.ndarray:
+    """Per-row template weights, as soft_equal_spacing picks them for the row's site group."""
+    if "azimuth_reliability" in pred.columns:
+        rel = pred["azimuth_reliability"].to_numpy(dtype=float, na_value=np.nan)
+        has_rel = np.bincount(gid, weights=~np.isnan(rel), minlength=n_groups) > 0
+        w_rel = np.clip(np.where(np.isnan(rel), 0.4, rel), 0.05, 1.0)
     else:
-        w = pd.Series(np.ones(len(g)), index=g.index)
-    q = w.quantile(0.9)
-    sel = g[w >= q] if q>0 else g
+        has_rel, w_rel = np.zeros(n_groups, dtype=bool), None
+    if "samples" in pred.columns:
+        smp = pred["samples"].to_numpy(dtype=float, na_value=np.nan)
+        gmax = np.full(n_groups, np.nan)
+        ok = ~np.isnan(smp)
+        np.fmax.at(gmax, gid[ok], smp[ok])
+        w_smp = np.clip(smp / np.where(gmax[gid] < 1, 1, gmax[gid]), 0.05, 1.0)
+    else:
+        w_smp = np.ones(len(pred))
+    return np.where(has_rel[gid], w_rel if w_rel is not None else 0.0, w_smp)
+
+def soft_equal_spacing_sites(pred: pd.DataFrame, key_cols: List[str], bin_size: int = 5) -> pd.DataFrame:
+    """soft_equal_spacing over every site group of `pred` (groupby(key_cols) order), batched: all sites
+    with the same sector count N are solved together as (sites, offsets, N) arrays. Output is the same
+    as concatenating soft_equal_spacing per group; groups it cannot batch (repeated or missing PCIs,
+    missing azimuths) go through soft_equal_spacing itself."""
+    gb = pred.groupby(key_cols)
+    gid_all = gb.ngroup().to_numpy()
+    n_groups = int(gb.ngroups)
+    rows_in = np.flatnonzero(gid_all >= 0)                          # groupby drops NaN keys
+    order = rows_in[np.argsort(gid_all[rows_in], kind="stable")]   # group order, original order within
+    gid = np.full(len(pred), -1, dtype=np.int64)
+    gid[rows_in] = gid_all[rows_in]
+    n_sec = gb["pci_or_psi"].nunique().to_numpy()
+    size = gb.size().to_numpy()
+    az = pred["azimuth_deg_5"].to_numpy(dtype=float, na_value=np.nan)
+    w = np.full(len(pred), np.nan)
+    w[rows_in] = _soft_spacing_weights(pred.iloc[rows_in], gid[rows_in], n_groups)
+    bad = np.zeros(n_groups, dtype=bool)
+    np.logical_or.at(bad, gid[rows_in], np.isnan(az[rows_in]) | np.isnan(w[rows_in]))
+    single = n_sec <= 1
+    batch = ~single & (size == n_sec) & ~bad
+    soft = np.full(len(pred), np.nan)
+    adjust = np.full(len(pred), np.nan)
+    for N in np.unique(n_sec[batch]):
+        N = int(N); S = 360.0 / N
+        pos = order[np.isin(gid[order], np.flatnonzero(batch & (n_sec == N)))].reshape(-1, N)
+        meas_raw = pred["azimuth_deg_5"].to_numpy()[pos]
+        srt = np.argsort(meas_raw, axis=1, kind="quicksort")       # same order as sort_values per group
+        pos = np.take_along_axis(pos, srt, axis=1)
+        meas, wg = az[pos], w[pos]
+        i = np.arange(N)
+        k = (i[None, :] - i[:, None]) % N                            # k[offset, i]
+        angs = np.radians((meas[:, None, :] - k[None] * S) % 360.0)
+        C = np.sum(wg[:, None, :] * np.cos(angs), axis=-1)
+        Ssin = np.sum(wg[:, None, :] * np.sin(angs), axis=-1)
+        theta0 = np.where((C == 0) & (Ssin == 0), 0.0, np.degrees(np.arctan2(Ssin, C)) % 360.0)
+        cost = np.zeros(theta0.shape)
+        for j in range(N):                                           # sequential, like the scalar loop
+            target = (theta0 + k[None, :, j] * S) % 360.0
+            cost += wg[:, None, j] * np.abs((meas[:, None, j] - target + 180.0) % 360.0 - 180.0)
+        best = np.argmin(cost, axis=1)
+        th = theta0[np.arange(len(pos)), best]
+        target = (th[:, None] + k[best] * S) % 360.0
+        alpha = np.clip(wg * 0.8, 0.35, 0.85)
+        adj = alpha * (((target - meas + 180.0) % 360.0) - 180.0)
+        soft[pos] = (np.round(((meas + adj) % 360.0) / bin_size) * bin_size) % 360      # snap_deg
+        adjust[pos] = adj
+    parts = []
+    in_batch = order[batch[gid[order]]]
+    if len(in_batch):
+        part = pred.iloc[in_batch].copy()
+        part["azimuth_deg_5_soft"] = soft[in_batch].astype(np.int64)
+        part["azimuth_adjustment_deg"] = [round(float(a), 2) for a in adjust[in_batch]]
+        part["template_spacing_deg"] = 360.0 / n_sec[gid[in_batch]]
+        part["spacing_used"] = [f"{int(round(360.0 / n))}°" for n in n_sec[gid[in_batch]]]
+        parts.append(part)
+    in_single = order[single[gid[order]]]
+    if len(in_single):
+        part = pred.iloc[in_single].copy()
+        part["azimuth_deg_5_soft"] = part["azimuth_deg_5"]
+        part["azimuth_adjustment_deg"] = 0.0
+        part["template_spacing_deg"] = np.nan
+        part["spacing_used"] = "none"
+        parts.append(part)
+    rest = np.flatnonzero(~batch & ~single)
+    for g in rest:
+        parts.append(soft_equal_spacing(pred.iloc[order[gid[order] == g]], bin_size=bin_size))
+    if not parts:
+        return pd.DataFrame(columns=list(pred.columns) + SOFT_SPACING_COLUMNS)
+    # restore group order: batched, single-sector and fallback parts interleave by group id
+    rank = np.concatenate([gid[in_batch], gid[in_single]] + [np.full(len(p), g) for p, g in zip(parts[len(parts) - len(rest):], rest)])
+    out = pd.concat(parts, ignore_index=True)
+    return out.iloc[np.argsort(rank, kind="stable")].reset_index(drop=True)
+
+SITE_SPREAD_MAX_M = 1500.0      # NO-ML: a site reverts to per-sector first cuts if any sector lies further from its centre
+SITE_SPREAD_MEDIAN_M = 800.0    # ... or if its median sector does
+
+def merge_site_positions(pred: pd.DataFrame, key_cols: List[str], lat_col: str, lon_col: str, weights=None,
+                max_spread_m: float = None, median_spread_m: float = None) -> pd.DataFrame:
+    """Site merge of per-sector positions, one vectorized pass over all sites (groupby(key_cols)):
+
+    1. centre: `weights`-weighted mean of (lat_col, lon_col) per site, or the median when no weights
+    2. spread: haversine from every sector to its site centre in one broadcast call
+    3. revert: sites whose farthest sector is beyond `max_spread_m` or median sector beyond `median_spread_m`
+
+    Returns a frame on pred's index: lat_site, lon_site, sector_count (rows per site), sector_dist_m,
+    site_spread_m (max over the site) and revert (bool). Rows with a missing key get NaN and no revert."""
+    keys = [pred[k] for k in key_cols]
+    lat = pred[lat_col].astype(float)
+    lon = pred[lon_col].astype(float)
+    if weights is None:
+        c = pd.DataFrame({"lat": lat, "lon": lon}).groupby(keys).transform("median")
+        lat_site, lon_site = c["lat"].to_numpy(), c["lon"].to_numpy()
+    else:
+        w = pd.Series(np.asarray(weights, dtype=float), index=pred.index)
+        s = pd.DataFrame({"lat": lat * w, "lon": lon * w, "w": w}).groupby(keys).transform("sum")
+        lat_site, lon_site = (s["lat"] / s["w"]).to_numpy(), (s["lon"] / s["w"]).to_numpy()
+    dist = pd.Series(geo.haversine(lat_site, lon_site, lat.to_numpy(), lon.to_numpy()), index=pred.index)
+    by_site = dist.groupby(keys)
+    spread = by_site.transform("max")
+    revert = np.zeros(len(pred), dtype=bool)
+    if max_spread_m is not None:
+        revert |= (spread > max_spread_m).to_numpy()
+    if median_spread_m is not None:
+        revert |= (by_site.transform("median") > median_spread_m).to_numpy()
+    return pd.DataFrame({"lat_site": lat_site, "lon_site": lon_site, "sector_count": by_site.transform("size"),
+                         "sector_dist_m": dist, "site_spread_m": spread, "revert": revert}, index=pred.index)
+
+# --------------------- NO-ML pipeline ------------------------------
+def centroid_from_arrays(lat, lon, rsrp, count=None):
+    """Linear-RSRP weighted centroid of the top-decile samples (top-20 by RSRP when fewer than 10 qualify)
+    and the median distance of those samples to it. With `count` (aggregated samples), the selection is
+    by RSRP as before and the centroid weights are multiplied by the counts."""
+    n = len(lat)
+    w = sample_weights(rsrp, n)
+    q = np.quantile(w, 0.9) if n else 0.0
+    sel = np.flatnonzero(w >= q) if q>0 else np.arange(n)
     if len(sel) < 10:
-        if "rsrp_dbm" in g.columns:
-            sel = g.nlargest(min(20, len(g)), "rsrp_dbm")
-            w = sel["rsrp_dbm"].apply(lambda v: max(10**(v/10.0), 1e-13) if pd.notna(v) else 0.0)
+        if rsrp is not None:
+            # same rows and order as DataFrame.nlargest(k, "rsrp_dbm"): NaN dropped, ties keep first
+            valid = np.flatnonzero(~np.isnan(rsrp))
+            sel = valid[np.argsort(-rsrp[valid], kind="stable")][:min(20, n)]
+            w = rsrp_weights(rsrp)
         else:
-            w = pd.Series(np.ones(len(sel)), index=sel.index)
+            w = np.ones(n)
     # SUBSET weights to selected rows to avoid dilution
-    w_sel = w.loc[sel.index]
+    w_sel = w[sel] if count is None else w[sel] * count[sel]
     W = float(w_sel.sum()) if float(w_sel.sum())>0 else 1.0
-    lat_c = float((sel["lat"]*w_sel).sum()/W)
-    lon_c = float((sel["lon"]*w_sel).sum()/W)
-    med_dist = float(np.median([haversine(lat_c, lon_c, r.lat, r.lon) for r in sel.itertuples(index=False)]))
+    lat_c = float((lat[sel]*w_sel).sum()/W)
+    lon_c = float((lon[sel]*w_sel).sum()/W)
+    med_dist = float(np.median(geo.haversine(lat_c, lon_c, lat[sel], lon[sel]))) if len(sel) else np.nan
     return lat_c, lon_c, med_dist
 
-def run_noml(input_path: str, outdir: str, sheet: str=None, min_samples:int=30, bin_size:int=5, soft_spacing:bool=True, use_ta:bool=False, make_map:bool=False, merge_sites:bool=False) -> Dict[str,str]:
+def weighted_centroid_top_rsrp(g: pd.DataFrame):
+    return centroid_from_arrays(*sector_arrays(g))
+
+# Per-sector tasks: module-level so SectorPool can ship them to worker processes
+def noml_azimuth_task(lat, lon, rsrp, lat_site: float, lon_site: float, bin_size:int=5):
+    if len(lat) < 15:
+        return np.nan, np.nan, np.nan
+    return azimuth_from_arrays(lat, lon, rsrp, lat_site, lon_site, bin_size=bin_size)
+
+def noml_ta_task(lat, lon, ta_m, base_lat: float, base_lon: float, count=None):
+    ok = ~np.isnan(ta_m)
+    if (ok.sum() if count is None else count[ok].sum()) < 25:
+        return None
+    return ta_refine(lat[ok], lon[ok], ta_m[ok], base_lat, base_lon, w=None if count is None else count[ok])[:3]
+
+# ----------------------------- Spatial guards (NO-ML) ----------------
+GEOFENCE_LOCAL_M = 1000.0           # estimate further than this from its sector's sample median reverts to the first cut
+GEOFENCE_LOCAL_MIN_SAMPLES = 5      # sectors with fewer samples skip the local rule
+GEOFENCE_GLOBAL_MARGIN_M = 1000.0   # estimate beyond the input's p95 radius plus this reverts too
+GEOFENCE_RADIUS_SAMPLE = 1_000_000  # p95 radius from a uniform sample of this many input points (0: all)
+
+def geofence_radius(latlon: np.ndarray, sample: int = GEOFENCE_RADIUS_SAMPLE, seed: int = 42):
+    """(median lat, median lon, p95 distance in m of the input points from that median; 5000 m without points).
+    Above `sample` points the percentile is taken over a seeded uniform sample."""
+    lat_med, lon_med = float(np.median(latlon[:, 0])), float(np.median(latlon[:, 1]))
+    if sample and len(latlon) > sample:
+        latlon = latlon[np.random.default_rng(seed).choice(len(latlon), int(sample), replace=False)]
+    if not len(latlon):
+        return lat_med, lon_med, 5000.0
+    return lat_med, lon_med, float(np.percentile(geo.haversine(lat_med, lon_med, latlon[:, 0], latlon[:, 1]), 95))
+
+def spatial_guard(pred: pd.DataFrame, med_lat, med_lon, n_samples, latlon: np.ndarray, site_revert=None, envelope=None) -> Dict[str, int]:
+    """All NO-ML position guards over `pred` (lat_pred/lon_pred, lat_pred_firstcut/lon_pred_firstcut) in one
+    pass, in place. `med_lat`/`med_lon`/`n_samples` are each row's sector sample median and count; `latlon`
+    the input points for the global envelope. Rules, applied in order as masks (reverts go to the first cut):
+
+    site_spread      rows of sites merge_site_positions flagged (`site_revert`); sector_count becomes 1
+    geofence_local   estimate > GEOFENCE_LOCAL_M from the sample median (sectors >= GEOFENCE_LOCAL_MIN_SAMPLES)
+    geofence_global  estimate beyond the p95 input radius + GEOFENCE_GLOBAL_MARGIN_M from the input median
+    sanity           local rule re-checked on the guarded positions: sectors whose first cut itself lies
+                     off the sample cloud (already at their first cut, counted only)
+
+    `envelope` is geofence_radius(latlon) when already computed. Returns rows per rule; `geofence` counts
+    rows hit by either geofence rule."""
+    lat_med_all, lon_med_all, rad95 = envelope or geofence_radius(latlon)
+    fc = pred[["lat_pred_firstcut","lon_pred_firstcut"]].to_numpy(dtype=float)
+    counts = {}
+
+    def revert(mask):
+        if mask.any():
+            pred.loc[mask, ["lat_pred","lon_pred"]] = fc[mask]
+        return int(mask.sum())
+
+    counts["site_spread"] = revert(np.zeros(len(pred), dtype=bool) if site_revert is None else np.asarray(site_revert))
+    if counts["site_spread"]:
+        pred.loc[np.asarray(site_revert), "sector_count"] = 1
+    local_ok = np.asarray(n_samples) >= GEOFENCE_LOCAL_MIN_SAMPLES
+
+    def off_cloud():
+        lat_p, lon_p = pred["lat_pred"].to_numpy(dtype=float), pred["lon_pred"].to_numpy(dtype=float)
+        return local_ok & (geo.haversine(med_lat, med_lon, lat_p, lon_p) > GEOFENCE_LOCAL_M), lat_p, lon_p
+
+    local, lat_p, lon_p = off_cloud()
+    outside = geo.haversine(lat_med_all, lon_med_all, lat_p, lon_p) > (rad95 + GEOFENCE_GLOBAL_MARGIN_M)
+    counts["geofence_local"], counts["geofence_global"] = int(local.sum()), int(outside.sum())
+    counts["geofence"] = revert(local | outside)
+    counts["sanity"] = int(off_cloud()[0].sum())
+    return counts
+
+# ----------------------------- TA refinement -------------------------
+# One-way metres per TA step by technology: c * (round-trip step) / 2. GSM: one bit period (48/13 us);
+# LTE and NR at 15 kHz SCS: 16 Ts. NR at wider subcarrier spacing scales down (30 kHz -> 39.03, ...), so
+# override per deployment via `ta_factors` / CELL_SITE_TA_FACTORS. Unknown technologies keep the
+# historical 78.0.
+TA_METERS_PER_STEP = {"gsm": 553.46, "lte": 78.07, "nr": 78.07}
+TA_DEFAULT_METERS = 78.0
+TECH_ALIASES = {"2g": "gsm", "gprs": "gsm", "edge": "gsm", "4g": "lte", "lte-a": "lte", "5g": "nr", "5g nr": "nr", "nr5g": "nr", "nr-sa": "nr", "nr-nsa": "nr"}
+
+def parse_ta_factors(spec) -> Dict[str, float]:
+    """`{"lte": 78.12}` or "lte=78.12,nr=39.06" -> {tech: metres per TA step}, merged over TA_METERS_PER_STEP."""
+    factors = dict(TA_METERS_PER_STEP)
+    if not spec:
+        return factors
+    items = spec.items() if isinstance(spec, dict) else (kv.split("=", 1) for kv in str(spec).split(",") if kv.strip())
+    for tech, metres in items:
+        tech = str(tech).strip().lower()
+        factors[TECH_ALIASES.get(tech, tech)] = float(metres)
+    return factors
+
+def ta_to_meters(g: pd.DataFrame, factors: Dict[str, float]) -> np.ndarray:
+    """Per-sample TA in metres, using each sample's technology (a sector may mix LTE and NR samples)."""
+    ta = g["ta"].to_numpy(dtype=float)
+    if "technology" not in g.columns:
+        return ta * TA_DEFAULT_METERS
+    tech = g["technology"].astype(str).str.strip().str.lower()
+    lut = {t: factors.get(TECH_ALIASES.get(t, t), TA_DEFAULT_METERS) for t in tech.unique()}
+    return ta * tech.map(lut).to_numpy(dtype=float)
+
+def ta_refine(lat, lon, ta_m, base_lat: float, base_lon: float, radius_m: float = 200.0,
+              coarse_step_m: float = 50.0, min_step_m: float = 5.0, w=None):
+    """Coarse-to-fine grid search for the site minimising mean |distance - TA range| over the samples.
+
+    Samples are projected once to local north/east metres around the base point, so every level scores
+    all candidates against all samples in one (candidates x samples) broadcast: a (2R/step+1)^2 grid
+    first, then 3x3 grids around the incumbent at half the step down to `min_step_m`. `w` weights the
+    samples (aggregated counts). Returns (lat, lon, mean_abs_error_m, candidates_evaluated)."""
+    sn, se = geo.offsets_to_meters(lat, lon, base_lat, base_lon)
+    best_n, best_e, step = 0.0, 0.0, float(coarse_step_m)
+    k = int(round(radius_m / step))
+    best_loss, n_eval = np.inf, 0
+    while True:
+        offs = np.arange(-k, k + 1) * step
+        cn, ce = np.meshgrid(best_n + offs, best_e + offs, indexing="ij")
+        cn, ce = cn.reshape(-1, 1), ce.reshape(-1, 1)
+        err = np.abs(np.hypot(sn - cn, se - ce) - ta_m)
+        losses = np.mean(err, axis=1) if w is None else err @ w / w.sum()
+        n_eval += len(losses)
+        i = int(np.argmin(losses))
+        if losses[i] < best_loss:
+            best_loss, best_n, best_e = float(losses[i]), float(cn[i, 0]), float(ce[i, 0])
+        if step <= min_step_m:
+            break
+        step, k = max(step / 2.0, min_step_m), 1
+    lat_b, lon_b = geo.offset_point(base_lat, base_lon, best_n, best_e)
+    return float(lat_b), float(lon_b), best_loss, n_eval
+
+def run_noml(input_path: str, outdir: str, sheet: str=None, min_samples:int=30, bin_size:int=5, soft_spacing:bool=True, use_ta:bool=False, make_map:bool=False, merge_sites:bool=False,
+             chunksize: int=None, spill_dir: str=None, output_format: str="csv", workers: int=1, ta_factors=None, grid_m: float=None,
+             max_samples_per_sector: int=None, input_cache: str=None, input_cache_mb: float=None) -> Dict[str,str]:
+    """NO-ML site/sector estimation. With `chunksize`, the input is streamed in chunks and spilled to
+    per-sector partitions on disk (see SpilledSectors) so memory is bounded by chunk size, not file size.
+    `workers` > 1 fans the per-sector centroid and TA solves out to a process pool; azimuths are
+    computed for batches of sectors at once (see azimuth_sectors).
+    `ta_factors` overrides metres per TA step by technology (see parse_ta_factors).
+    `grid_m` > 0 collapses each sector's samples per grid cell first (see aggregate_samples);
+    `max_samples_per_sector` bounds the rows each sector solve sees (see cap_sector_samples).
+    `input_cache` is a directory of standardized inputs keyed by content (see load_standardized).
+    Returns the output paths, plus "guards": rows reverted per spatial guard rule (see spatial_guard),
+    with `grid_m`, "aggregation": rows in/out and the compression ratio, with
+    `max_samples_per_sector`, "sampling": sectors capped and rows in/out, and with `input_cache`,
+    "input_id" (pass the cached artifact as input to skip ingestion)."""
+    runs, shared = _noml_configs(input_path, outdir, [{"min_samples": min_samples, "bin_size": bin_size}], tagged=False,
+                                 sheet=sheet, soft_spacing=soft_spacing, use_ta=use_ta, make_map=make_map, chunksize=chunksize,
+                                 spill_dir=spill_dir, output_format=output_format, workers=workers, ta_factors=ta_factors,
+                                 grid_m=grid_m, max_samples_per_sector=max_samples_per_sector, input_cache=input_cache,
+                                 input_cache_mb=input_cache_mb)
+    if runs[0].get("error"):
+        raise RuntimeError(runs[0]["error"])
+    return {"audit": shared.pop("audit"), **{k: v for k, v in runs[0].items() if k not in SWEEP_PARAMS}, **shared}
+
+# --------------------- NO-ML parameter sweep -----------------------
+SWEEP_PARAMS = ("min_samples", "bin_size")   # per-configuration parameters; everything else is shared by a sweep
+BIN_SIZES = [1, 3, 5, 10, 15]                # azimuth histogram bin sizes (deg)
+
+def parse_sweep_grid(spec) -> Dict[str, List[int]]:
+    """`{"bin_size": [1, 5], "min_samples": [20, 30]}` (or its JSON) or "bin_size=1,5;min_samples=20,30"
+    -> {param: [values]} over SWEEP_PARAMS."""
+    if isinstance(spec, str) and spec.strip().startswith("{"):
+        spec = json.loads(spec)
+    items = spec.items() if isinstance(spec, dict) else (kv.split("=", 1) for kv in str(spec or "").split(";") if kv.strip())
+    grid = {}
+    for param, values in items:
+        param = str(param).strip()
+        if param not in SWEEP_PARAMS:
+            raise ValueError(f"Cannot sweep '{param}' (sweepable: {', '.join(SWEEP_PARAMS)})")
+        if isinstance(values, str):
+            values = [v for v in values.split(",") if v.strip()]
+        values = list(dict.fromkeys(int(v) for v in (values if isinstance(values, (list, tuple)) else [values])))
+        if not values:
+            raise ValueError(f"No values to sweep for '{param}'")
+        if param == "bin_size" and not set(values) <= set(BIN_SIZES):
+            raise ValueError(f"bin_size must be one of {BIN_SIZES}")
+        if param == "min_samples" and min(values) < 1:
+            raise ValueError("min_samples must be >= 1")
+        grid[param] = values
+    if not grid:
+        raise ValueError("Empty sweep grid")
+    return grid
+
+def sweep_configs(grid: Dict[str, List[int]], defaults: Dict[str, int]) -> List[Dict[str, int]]:
+    """Cartesian product of `grid` (parameters it leaves out keep their `defaults`), min_samples-major."""
+    axes = [grid[p] if p in grid else [defaults[p]] for p in SWEEP_PARAMS]
+    return [dict(zip(SWEEP_PARAMS, combo)) for combo in itertools.product(*axes)]
+
+def sweep_tag(config: Dict[str, int]) -> str:
+    return f"ms{config['min_samples']}_bin{config['bin_size']}"
+
+def run_noml_sweep(input_path: str, outdir: str, grid, sheet: str=None, min_samples:int=30, bin_size:int=5, soft_spacing:bool=True,
+                   use_ta:bool=False, make_map:bool=False, chunksize: int=None, spill_dir: str=None, output_format: str="csv",
+                   workers: int=1, ta_factors=None, grid_m: float=None, max_samples_per_sector: int=None,
+                   input_cache: str=None, input_cache_mb: float=None) -> Dict:
+    """run_noml over every configuration of `grid` (see parse_sweep_grid; `min_samples`/`bin_size` are the
+    defaults for parameters it leaves out) in one pass. Ingestion, sector grouping and first-cut centroids
+    are computed once; site merge, guards and TA refinement once per min_samples value; sample bearings
+    once per (sector, site position) and only binned per bin size. Each configuration writes run_noml's
+    outputs tagged with sweep_tag. Returns "audit", "summary" (one row per configuration), "configs"
+    (per configuration: its parameters, output paths and guards, or "error" if no sector passed
+    min_samples) and the shared reports of run_noml."""
+    configs = sweep_configs(parse_sweep_grid(grid), {"min_samples": min_samples, "bin_size": bin_size})
+    runs, shared = _noml_configs(input_path, outdir, configs, tagged=True, sheet=sheet, soft_spacing=soft_spacing, use_ta=use_ta,
+                                 make_map=make_map, chunksize=chunksize, spill_dir=spill_dir, output_format=output_format,
+                                 workers=workers, ta_factors=ta_factors, grid_m=grid_m, max_samples_per_sector=max_samples_per_sector,
+                                 input_cache=input_cache, input_cache_mb=input_cache_mb)
+    return {"audit": shared.pop("audit"), "summary": shared.pop("summary"), "configs": runs, **shared}
+
+def _noml_configs(input_path: str, outdir: str, configs: List[Dict[str, int]], tagged: bool, sheet: str=None, soft_spacing: bool=True,
+                  use_ta: bool=False, make_map: bool=False, chunksize: int=None, spill_dir: str=None, output_format: str="csv",
+                  workers: int=1, ta_factors=None, grid_m: float=None, max_samples_per_sector: int=None,
+                  input_cache: str=None, input_cache_mb: float=None):
+    """The NO-ML pipeline for one or more (min_samples, bin_size) configurations; see run_noml and
+    run_noml_sweep. Returns ([per-configuration outputs], shared outputs; with `tagged`, a "summary" table)."""
     os.makedirs(outdir, exist_ok=True)
     base = os.path.splitext(os.path.basename(input_path))[0]
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    df_raw = load_any(input_path, sheet)
-    df = standardize_df(df_raw)
-    audit_cols = [c for c in ["timestamp_utc","lat","lon","technology","network","band","band_mhz","earfcn_or_narfcn","pci_or_psi","rsrp_dbm","rsrq_db","sinr_db","ta"] if c in df.columns]
-    audit = df[audit_cols].head(20000).copy()
-    audit_path = os.path.join(outdir, f"{base}_{ts}_audit_preview.csv")
-    audit.to_csv(audit_path, index=False)
+    agg_stats = {}
+    aggregate = pre_aggregator(grid_m, agg_stats) if grid_m else None
+    cap_stats = {}
+    cap = sector_capper(max_samples_per_sector, cap_stats)
+    cache_bytes = None if input_cache_mb is None else int(input_cache_mb * 1024**2)
+    if chunksize:
+        # a cached standardized artifact streams by record batch far faster than re-parsing the raw file
+        src, input_id = standardized_source(input_path, sheet, input_cache)
+        sectors, head = spill_input(src or input_path, None if src else sheet, chunksize=chunksize, transform=aggregate, spill_dir=spill_dir)
+        group_cols = sectors.group_cols
+    else:
+        df, input_id = load_standardized(input_path, sheet, input_cache, cache_bytes)
+        head = df
+        if aggregate is not None:
+            df = aggregate(df)
+        group_cols = sector_group_cols(df.columns)
+        sectors = SectorIndex(df, group_cols)
+        del df
+    audit_cols = [c for c in AUDIT_COLS if c in head.columns]
+    audit = head[audit_cols].head(AUDIT_ROWS).copy()
+    del head
+    audit_path = write_table(audit, os.path.join(outdir, f"{base}_{ts}_audit_preview"), output_format)
     logging.info(f"Audit -> {audit_path}")
-    group_cols = []
-    if "network" in df.columns: group_cols.append("network")
-    for gc in ["earfcn_or_narfcn","pci_or_psi"]:
-        if gc in df.columns: group_cols.append(gc)
-    if len(group_cols) < 2:
-        raise ValueError("Need at least earfcn_or_narfcn and pci_or_psi (network optional).")
+    if agg_stats:
+        logging.info(f"Grid pre-aggregation ({grid_m:g} m): {agg_stats['rows_in']} samples -> {agg_stats['rows_out']} rows ({agg_stats['compression']}x)")
     pred_rows = []
     cellid_col = None
-    for c in ["cell_id_global","cellid","cell_id","eci","ecgi","nrcgi","nr_cgi"]:
-        if c in df.columns: cellid_col = c; break
-    for keys, g in df.groupby(group_cols):
-        g2 = g.dropna(subset=["lat","lon"])
-        if len(g2) < min_samples: continue
-        lat_c, lon_c, med_dist = weighted_centroid_top_rsrp(g2)
-        if cellid_col and cellid_col in g2.columns:
-            try:
-                cell_id_rep = g2[cellid_col].dropna().astype(str).value_counts().idxmax()
-            except:
+    for c in CELLID_CANDIDATES:
+        if c in sectors.columns: cellid_col = c; break
+    pool = SectorPool(workers)
+    # first cuts for every sector any configuration keeps; each configuration filters these rows
+    min_samples_all = min(c["min_samples"] for c in configs)
+    first_meta = []
+    def first_tasks():
+        for keys, g2 in sectors.items():
+            n = sector_size(g2)
+            if n < min_samples_all: continue
+            g2 = cap(g2, record=True)
+            if cellid_col and cellid_col in g2.columns:
+                try:
+                    cell_id_rep = g2[cellid_col].dropna().astype(str).value_counts().idxmax()
+                except:
+                    cell_id_rep = np.nan
+            else:
                 cell_id_rep = np.nan
-        else:
-            cell_id_rep = np.nan
-        kd = {}
-        if isinstance(keys, tuple):
-            for i,k in enumerate(group_cols): kd[k]=keys[i]
-        else:
-            kd[group_cols[0]] = keys
-        pred_rows.append({**kd, "samples": int(len(g2)), "lat_pred_firstcut": lat_c, "lon_pred_firstcut": lon_c, "median_sample_distance_m": med_dist, "cell_id_representative": cell_id_rep})
-    pred_first = pd.DataFrame(pred_rows)
-    if len(pred_first)==0:
+            arrays, count = sector_arrays(g2), sector_counts(g2)
+            # sample median point, kept for the spatial guards so no later pass reloads the sector
+            first_meta.append((dict(zip(group_cols, keys)), n, cell_id_rep, weighted_median(arrays[0], count), weighted_median(arrays[1], count)))
+            yield arrays + (count,)
+    # results come back in task order, so row i belongs to first_meta[i] whatever the worker count
+    for i, (lat_c, lon_c, med_dist) in enumerate(pool.map(centroid_from_arrays, first_tasks())):
+        kd, n, cell_id_rep = first_meta[i][:3]
+        pred_rows.append({**kd, "samples": n, "lat_pred_firstcut": lat_c, "lon_pred_firstcut": lon_c, "median_sample_distance_m": med_dist, "cell_id_representative": cell_id_rep})
+    pred_all = pd.DataFrame(pred_rows)
+    if len(pred_all)==0:
         raise RuntimeError("No groups passed min_samples.")
-    pred_first["site_key_inferred"] = pred_first["cell_id_representative"].apply(infer_site_key)
-    site_group_cols = []
-    if "network" in pred_first.columns: site_group_cols.append("network")
-    for gc in ["earfcn_or_narfcn","site_key_inferred"]:
-        if gc in pred_first.columns: site_group_cols.append(gc)
-    if len(site_group_cols)>=2:
-        pred_first["_w"] = pred_first["samples"].clip(lower=1)
-        site_centroids = (pred_first.groupby(site_group_cols)
-                          .apply(lambda g: pd.Series({"lat_site": float(np.average(g["lat_pred_firstcut"], weights=g["_w"])),
-                                                      "lon_site": float(np.average(g["lon_pred_firstcut"], weights=g["_w"])),
-                                                      "sector_count": len(g)})).reset_index())
-        pred_first = pred_first.merge(site_centroids, on=site_group_cols, how="left")
-    else:
-        pred_first["lat_site"] = pred_first["lat_pred_firstcut"]
-        pred_first["lon_site"] = pred_first["lon_pred_firstcut"]
-        pred_first["sector_count"] = 1
-    # azimuth per sector
-    az_rows = []
-    for r in pred_first.itertuples(index=False):
-        m = pd.Series(True, index=df.index)
-        if "network" in df.columns and hasattr(r, "network") and pd.notna(r.network): m &= (df["network"] == r.network)
-        if "earfcn_or_narfcn" in df.columns and hasattr(r, "earfcn_or_narfcn"): m &= (df["earfcn_or_narfcn"] == r.earfcn_or_narfcn)
-        if "pci_or_psi" in df.columns and hasattr(r, "pci_or_psi"): m &= (df["pci_or_psi"] == r.pci_or_psi)
-        g = df[m].dropna(subset=["lat","lon"])
-        if len(g) < 15:
-            az5, beam, rel = (np.nan, np.nan, np.nan)
-        else:
-            az5, beam, rel = azimuth_histogram(g, r.lat_site, r.lon_site, bin_size=bin_size)
-        az_rows.append({"azimuth_deg_5": az5, "beamwidth_deg_est": beam, "azimuth_reliability": rel})
-    az_df = pd.DataFrame(az_rows)
-    pred_out = pd.concat([pred_first.reset_index(drop=True), az_df], axis=1)
-    
-    pred_out.rename(columns={"lat_site":"lat_pred","lon_site":"lon_pred"}, inplace=True)
-    # --- Global & site-level sanity guards ---
-    try:
-        import numpy as _np, math as _math, pandas as _pd
-
-        def _hav(a,b,c,d):
-            R=6371000.0
-            phi1, phi2 = _math.radians(a), _math.radians(c)
-            dphi = _math.radians(c-a); dl = _math.radians(d-b)
-            x = _math.sin(dphi/2)**2 + _math.cos(phi1)*_math.cos(phi2)*_math.sin(dl/2)**2
-            return 2*R*_math.asin(_math.sqrt(x))
-
-        # Global input median and p95 radius
-        lat_med_all = float(df["lat"].median())
-        lon_med_all = float(df["lon"].median())
-        dists_all = _np.array([_hav(lat_med_all, lon_med_all, r.lat, r.lon) for r in df.dropna(subset=["lat","lon"]).itertuples(index=False)])
-        if dists_all.size > 0:
-            rad95 = float(_np.percentile(dists_all, 95))
-        else:
-            rad95 = 5000.0
-
-        # Site-group spread check: if sectors within a site spread too wide, abandon site-averaging
-        key_cols_site = []
-        if "network" in pred_out.columns: key_cols_site.append("network")
-        for gc in ["earfcn_or_narfcn","site_key_inferred"]:
-            if gc in pred_out.columns: key_cols_site.append(gc)
-        bad_sites = 0
-        if len(key_cols_site) >= 2:
-            for sk, gg in pred_out.groupby(key_cols_site):
-                # distances between each sector's firstcut and the averaged site location
-                lat_s = float(gg["lat_pred"].iloc[0]); lon_s = float(gg["lon_pred"].iloc[0])
-                d_spreads = [_hav(lat_s, lon_s, rr.lat_pred_firstcut, rr.lon_pred_firstcut) for rr in gg.itertuples(index=False)]
-                if len(d_spreads) > 0 and (max(d_spreads) > 1500.0 or _np.median(d_spreads) > 800.0):
-                    # revert this entire site group back to per-sector firstcut
-                    idx = _pd.Series(True, index=pred_out.index)
-                    for i,k in enumerate(key_cols_site):
-                        idx &= pred_out[k].eq(gg[k].iloc[0])
-                    pred_out.loc[idx, ["lat_pred","lon_pred"]] = pred_out.loc[idx, ["lat_pred_firstcut","lon_pred_firstcut"]].values
-                    pred_out.loc[idx, "sector_count"] = 1
-                    bad_sites += int(idx.sum())
-        if bad_sites:
-            logging.warning(f"Site-spread guard reverted {bad_sites} rows to per-sector firstcut (site spread too large).")
-
-        # Per-sector local & global geofence checks
-        corrected = 0
-        for r in pred_out.itertuples(index=False):
-            # group filter for local median
-            m = _pd.Series(True, index=df.index)
-            if "network" in df.columns and hasattr(r, "network") and _pd.notna(r.network): m &= (df["network"] == r.network)
-            if "earfcn_or_narfcn" in df.columns and hasattr(r, "earfcn_or_narfcn"): m &= (df["earfcn_or_narfcn"] == r.earfcn_or_narfcn)
-            if "pci_or_psi" in df.columns and hasattr(r, "pci_or_psi"): m &= (df["pci_or_psi"] == r.pci_or_psi)
-            g = df[m].dropna(subset=["lat","lon"])
-            # default: use existing pred
-            lat_p, lon_p = float(r.lat_pred), float(r.lon_pred)
-            bad = False
-            # local check
-            if len(g) >= 5:
-                glat_med, glon_med = float(g["lat"].median()), float(g["lon"].median())
-                dist_local = _hav(glat_med, glon_med, lat_p, lon_p)
-                if dist_local > 1000.0:
-                    bad = True
-            # global check
-            dist_global = _hav(lat_med_all, lon_med_all, lat_p, lon_p)
-            if dist_global > (rad95 + 1000.0):
-                bad = True
-            if bad:
-                idx = (_pd.Series(True, index=pred_out.index))
-                if "network" in pred_out.columns and hasattr(r, "network"):
-                    idx &= pred_out["network"].eq(getattr(r,"network",_np.nan))
-                idx &= pred_out["earfcn_or_narfcn"].eq(getattr(r,"earfcn_or_narfcn",_np.nan))
-                idx &= pred_out["pci_or_psi"].eq(getattr(r,"pci_or_psi",_np.nan))
-                pred_out.loc[idx, ["lat_pred","lon_pred"]] = pred_out.loc[idx, ["lat_pred_firstcut","lon_pred_firstcut"]].values
-                corrected += int(idx.sum())
-        if corrected:
-            logging.warning(f"Spatial geofence corrected {corrected} sector rows (outside local/global envelope).")
-    except Exception as e:
-        logging.warning(f"Spatial sanity/geofence checks skipped: {e}")
-    
-    # --- Spatial sanity guard per sector group ---
-    # If final site centroid is >1 km from the group's raw-sample median, fall back to group's firstcut centroid.
-    try:
-        def haversine(lat1, lon1, lat2, lon2):
-            import math
-            R=6371000.0
-            phi1, phi2 = math.radians(lat1), math.radians(lat2)
-            dphi = math.radians(lat2-lat1)
-            dl = math.radians(lon2-lon1)
-            a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
-            return 2*R*math.asin(math.sqrt(a))
-
-        corrected = 0
-        for r in pred_out.itertuples(index=False):
-            m = pd.Series(True, index=df.index)
-            if "network" in df.columns and hasattr(r, "network") and pd.notna(r.network): m &= (df["network"] == r.network)
-            if "earfcn_or_narfcn" in df.columns and hasattr(r, "earfcn_or_narfcn"): m &= (df["earfcn_or_narfcn"] == r.earfcn_or_narfcn)
-            if "pci_or_psi" in df.columns and hasattr(r, "pci_or_psi"): m &= (df["pci_or_psi"] == r.pci_or_psi)
-            g = df[m].dropna(subset=["lat","lon"])
-            if len(g) < 5: 
-                continue
-            glat_med, glon_med = float(g["lat"].median()), float(g["lon"].median())
-            dist = haversine(glat_med, glon_med, float(r.lat_pred), float(r.lon_pred))
-            if dist > 1000.0:  # > 1 km away from the group's sample cloud -> suspicious
-                idx = (pred_out["network"].eq(getattr(r,"network",np.nan)) if "network" in pred_out.columns else True) &                       (pred_out["earfcn_or_narfcn"].eq(getattr(r,"earfcn_or_narfcn",np.nan))) &                       (pred_out["pci_or_psi"].eq(getattr(r,"pci_or_psi",np.nan)))
-                # fallback: use the group's firstcut centroid for this sector
-                pred_out.loc[idx, ["lat_pred","lon_pred"]] = pred_out.loc[idx, ["lat_pred_firstcut","lon_pred_firstcut"]].values
-                corrected += int(idx.sum())
-        if corrected:
-            logging.warning(f"Spatial sanity guard corrected {corrected} sector rows (>1km from sample cloud).")
-    except Exception as e:
-        logging.warning(f"Spatial sanity guard skipped: {e}")
-
-    cols = [c for c in ["network","earfcn_or_narfcn","pci_or_psi","samples","lat_pred","lon_pred","azimuth_deg_5","beamwidth_deg_est","median_sample_distance_m","cell_id_representative","site_key_inferred","sector_count","azimuth_reliability"] if c in pred_out.columns]
-    no_ta_path = os.path.join(outdir, f"{base}_{ts}_pred_main_no_ta.csv")
-    pred_out[cols].to_csv(no_ta_path, index=False)
-    logging.info(f"NO-ML -> {no_ta_path}")
+    pred_all["site_key_inferred"] = pred_all["cell_id_representative"].apply(infer_site_key)
+    keys_all = [tuple(m[0].values()) for m in first_meta]
+    _, n_all, _, med_lat_all, med_lon_all = (np.array(v) for v in zip(*first_meta))
+    envelope = geofence_radius(sectors.latlon)
 
-    # soft spacing
-    soft_path = None
-    if soft_spacing:
-        key_cols = []
-        if "network" in pred_out.columns: key_cols.append("network")
+    # --- per min_samples: site merge (its sectors only) and the spatial guards, which do not depend on bin_size ---
+    stages = {}
+    for ms in dict.fromkeys(c["min_samples"] for c in configs):
+        idx = np.flatnonzero(n_all >= ms)
+        if not len(idx):
+            continue
+        pred_first = pred_all.iloc[idx].reset_index(drop=True)
+        site_group_cols = []
+        if "network" in pred_first.columns: site_group_cols.append("network")
         for gc in ["earfcn_or_narfcn","site_key_inferred"]:
-            if gc in pred_out.columns: key_cols.append(gc)
-        parts = []
-        for _, g in pred_out.groupby(key_cols):
-            parts.append(soft_equal_spacing(g, bin_size=bin_size))
-        pred_soft = pd.concat(parts, ignore_index=True)
-        pred_soft["azimuth_deg_label_soft"] = pred_soft["azimuth_deg_5_soft"].apply(lambda v: f"{int(v)} degree" if not pd.isna(v) else "")
-        keep = [c for c in ["network","earfcn_or_narfcn","site_key_inferred","pci_or_psi","samples","lat_pred","lon_pred","azimuth_deg_5","azimuth_deg_5_soft","azimuth_deg_label_soft","azimuth_adjustment_deg","template_spacing_deg","beamwidth_deg_est","median_sample_distance_m","cell_id_representative","sector_count","azimuth_reliability","spacing_used"] if c in pred_soft.columns]
-        soft_path = os.path.join(outdir, f"{base}_{ts}_pred_main_no_ta_soft.csv")
-        pred_soft[keep].to_csv(soft_path, index=False)
-        logging.info(f"NO-ML + soft -> {soft_path}")
-    # optional TA refine (grid search)
-    ta_path = None
-    if use_ta and "ta" in df.columns and not df["ta"].dropna().empty:
-        rows_ta = []
-        for r in pred_out.itertuples(index=False):
-            m = pd.Series(True, index=df.index)
-            if "network" in df.columns and hasattr(r, "network") and pd.notna(r.network): m &= (df["network"] == r.network)
-            if "earfcn_or_narfcn" in df.columns and hasattr(r, "earfcn_or_narfcn"): m &= (df["earfcn_or_narfcn"] == r.earfcn_or_narfcn)
-            if "pci_or_psi" in df.columns and hasattr(r, "pci_or_psi"): m &= (df["pci_or_psi"] == r.pci_or_psi)
-            g = df[m].dropna(subset=["lat","lon","ta"])
-            if len(g) < 25:
-                rows_ta.append({**r._asdict(), "ta_refine_abs_error_m": np.nan})
-                continue
-            base_lat, base_lon = float(r.lat_pred), float(r.lon_pred)
-            g = g.assign(ta_m = g["ta"] * 78.0)
-            best = (1e18, base_lat, base_lon)
-            for dN in range(-200, 201, 50):
-                for dE in range(-200, 201, 50):
-                    lat_try, lon_try = meters_to_offsets(dN, dE, base_lat)
-                    dists = np.array([haversine(lat_try, lon_try, rr.lat, rr.lon) for rr in g.itertuples(index=False)])
-                    loss = float(np.mean(np.abs(dists - g["ta_m"].values)))
-                    if loss < best[0]: best = (loss, lat_try, lon_try)
-            rdict = r._asdict(); rdict["lat_pred"] = best[1]; rdict["lon_pred"] = best[2]; rdict["ta_refine_abs_error_m"] = best[0]
-            rows_ta.append(rdict)
-        pred_ta = pd.DataFrame(rows_ta)
-        ta_path = os.path.join(outdir, f"{base}_{ts}_pred_main_ta_refined.csv")
-        pred_ta.to_csv(ta_path, index=False)
-        logging.info(f"NO-ML TA refine -> {ta_path}")
-    # map
-    map_path = None
-    if make_map:
+            if gc in pred_first.columns: site_group_cols.append(gc)
+        site_revert = None
+        if len(site_group_cols)>=2:
+            sites = merge_site_positions(pred_first, site_group_cols, "lat_pred_firstcut", "lon_pred_firstcut",
+                                weights=pred_first["samples"].clip(lower=1),
+                                max_spread_m=SITE_SPREAD_MAX_M, median_spread_m=SITE_SPREAD_MEDIAN_M)
+            pred_first["lat_site"], pred_first["lon_site"] = sites["lat_site"], sites["lon_site"]
+            pred_first["sector_count"] = sites["sector_count"].astype(float)
+            site_revert = sites["revert"].to_numpy()
+        else:
+            pred_first["lat_site"] = pred_first["lat_pred_firstcut"]
+            pred_first["lon_site"] = pred_first["lon_pred_firstcut"]
+            pred_first["sector_count"] = 1
+        # azimuths are taken from the merged (pre-guard) site positions
+        az_from = pred_first[["lat_site","lon_site"]].to_numpy(dtype=float)
+        placed = pred_first.rename(columns={"lat_site":"lat_pred","lon_site":"lon_pred"})
+        # --- Spatial guards: site spread, local/global geofence, sanity re-check (one vectorized pass) ---
+        guards = {}
         try:
-            import folium
-            use_df = pred_soft if (soft_spacing and soft_path) else pred_out
-            m = folium.Map(location=[float(use_df["lat_pred"].median()), float(use_df["lon_pred"].median())], zoom_start=13)
-            for r in use_df.itertuples(index=False):
-                lat, lon = float(r.lat_pred), float(r.lon_pred)
-                az = getattr(r, "azimuth_deg_5_soft", np.nan) if (soft_spacing and soft_path) else getattr(r, "azimuth_deg_5", np.nan)
-                tooltip = f"{getattr(r,'network','')} | {getattr(r,'earfcn_or_narfcn','')} | PCI {getattr(r,'pci_or_psi','')} | Az {az}°"
-                folium.CircleMarker([lat,lon], radius=4, fill=True, tooltip=tooltip).add_to(m)
-            map_path = os.path.join(outdir, f"{base}_{ts}_map.html")
-            m.save(map_path)
-            logging.info(f"Map -> {map_path}")
+            guards = spatial_guard(placed, med_lat_all[idx].astype(float), med_lon_all[idx].astype(float), n_all[idx], sectors.latlon, site_revert, envelope=envelope)
+            if guards["site_spread"]:
+                logging.warning(f"Site-spread guard reverted {guards['site_spread']} rows to per-sector firstcut (site spread too large).")
+            if guards["geofence"]:
+                logging.warning(f"Spatial geofence corrected {guards['geofence']} sector rows (outside local/global envelope).")
+            if guards["sanity"]:
+                logging.warning(f"Spatial sanity guard corrected {guards['sanity']} sector rows (>1km from sample cloud).")
         except Exception as e:
-            logging.warning(f"Map generation skipped: {e}")
-    return {"audit": audit_path, "no_ta": no_ta_path, "soft": soft_path, "ta": ta_path, "map": map_path}
+            logging.warning(f"Spatial sanity/geofence checks skipped: {e}")
+        stages[ms] = {"idx": idx, "az_from": az_from, "placed": placed, "guards": guards}
+
+    def unique_solves(points):
+        """Distinct (first-cut row, lat, lon) across the min_samples stages, in sector order, and each stage's
+        positions in that list: a sector whose position no configuration changes is solved once."""
+        slots, where = {}, {}
+        for ms, st in stages.items():
+            where[ms] = np.array([slots.setdefault((int(i), float(la), float(lo)), len(slots)) for i, (la, lo) in zip(st["idx"], points(st))], dtype=np.intp)
+        order = sorted(slots, key=lambda k: (k[0], slots[k]))
+        rank = np.empty(len(slots), dtype=np.intp)
+        rank[[slots[k] for k in order]] = np.arange(len(order))
+        return order, {ms: rank[w] for ms, w in where.items()}
+
+    def sector_rows(solves):
+        # consecutive solves of one sector (different positions) share its loaded rows
+        last = (None, None)
+        for i, lat0, lon0 in solves:
+            if last[0] != i:
+                last = (i, cap(sectors.rows(keys_all[i])))
+            yield last[1], lat0, lon0
+
+    # azimuth per sector, batched histograms (sectors under 15 samples get none); bearings once per solve, one bin per bin size
+    bin_sizes = list(dict.fromkeys(c["bin_size"] for c in configs))
+    az_solves, az_at = unique_solves(lambda st: st["az_from"])
+    def az_items():
+        for g, lat0, lon0 in sector_rows(az_solves):
+            yield None if sector_size(g) < 15 else sector_arrays(g) + (lat0, lon0, sector_counts(g))
+    az_res = list(azimuth_sweep_batches(az_items(), bin_sizes))
+
+    # optional TA refine (coarse-to-fine grid search) from the guarded positions
+    ta_res = None
+    if use_ta and sectors.has_values("ta"):
+        factors = parse_ta_factors(ta_factors)
+        ta_solves, ta_at = unique_solves(lambda st: st["placed"][["lat_pred","lon_pred"]].to_numpy(dtype=float))
+        def ta_tasks():
+            for g, lat0, lon0 in sector_rows(ta_solves):
+                yield g["lat"].to_numpy(dtype=float), g["lon"].to_numpy(dtype=float), ta_to_meters(g, factors), lat0, lon0, sector_counts(g)
+        ta_res = list(pool.map(noml_ta_task, ta_tasks()))
+    pool.close()
+    if chunksize:
+        sectors.close()
+
+    runs, run_stats = [], []
+    for cfg in configs:
+        run = dict(cfg)
+        runs.append(run)
+        st = stages.get(cfg["min_samples"])
+        if st is None:
+            run["error"] = "No groups passed min_samples."
+            run_stats.append({})
+            continue
+        stem = os.path.join(outdir, f"{base}_{ts}_{sweep_tag(cfg)}" if tagged else f"{base}_{ts}")
+        b = bin_sizes.index(cfg["bin_size"])
+        az_df = pd.DataFrame([{"azimuth_deg_5": az5, "beamwidth_deg_est": beam, "azimuth_reliability": rel}
+                              for az5, beam, rel in (az_res[u][b] for u in az_at[cfg["min_samples"]])])
+        pred_out = pd.concat([st["placed"], az_df], axis=1)
+        cols = [c for c in ["network","earfcn_or_narfcn","pci_or_psi","samples","lat_pred","lon_pred","azimuth_deg_5","beamwidth_deg_est","median_sample_distance_m","cell_id_representative","site_key_inferred","sector_count","azimuth_reliability"] if c in pred_out.columns]
+        no_ta_path = write_table(pred_out[cols], f"{stem}_pred_main_no_ta", output_format)
+        logging.info(f"NO-ML -> {no_ta_path}")
+        stats = {"sectors": len(pred_out), "azimuths": int(pred_out["azimuth_deg_5"].notna().sum()),
+                 "azimuth_reliability_mean": float(pred_out["azimuth_reliability"].mean())}
+
+        # soft spacing
+        soft_path = None
+        if soft_spacing:
+            key_cols = []
+            if "network" in pred_out.columns: key_cols.append("network")
+            for gc in ["earfcn_or_narfcn","site_key_inferred"]:
+                if gc in pred_out.columns: key_cols.append(gc)
+            pred_soft = soft_equal_spacing_sites(pred_out, key_cols, bin_size=cfg["bin_size"])
+            pred_soft["azimuth_deg_label_soft"] = pred_soft["azimuth_deg_5_soft"].apply(lambda v: f"{int(v)} degree" if not pd.isna(v) else "")
+            keep = [c for c in ["network","earfcn_or_narfcn","site_key_inferred","pci_or_psi","samples","lat_pred","lon_pred","azimuth_deg_5","azimuth_deg_5_soft","azimuth_deg_label_soft","azimuth_adjustment_deg","template_spacing_deg","beamwidth_deg_est","median_sample_distance_m","cell_id_representative","sector_count","azimuth_reliability","spacing_used"] if c in pred_soft.columns]
+            soft_path = write_table(pred_soft[keep], f"{stem}_pred_main_no_ta_soft", output_format)
+            logging.info(f"NO-ML + soft -> {soft_path}")
+            stats["soft_adjustment_abs_mean"] = float(pred_soft["azimuth_adjustment_deg"].abs().mean())
+        ta_path = None
+        if ta_res is not None:
+            rows_ta = []
+            for r, u in zip(pred_out.itertuples(index=False), ta_at[cfg["min_samples"]]):
+                res = ta_res[u]
+                if res is None:
+                    rows_ta.append({**r._asdict(), "ta_refine_abs_error_m": np.nan})
+                    continue
+                rdict = r._asdict(); rdict["lat_pred"], rdict["lon_pred"], rdict["ta_refine_abs_error_m"] = res
+                rows_ta.append(rdict)
+            pred_ta = pd.DataFrame(rows_ta)
+            ta_path = write_table(pred_ta, f"{stem}_pred_main_ta_refined", output_format)
+            logging.info(f"NO-ML TA refine -> {ta_path}")
+            stats["ta_refine_abs_error_m_median"] = float(pred_ta["ta_refine_abs_error_m"].median())
+        # map
+        map_path = None
+        if make_map:
+            try:
+                import folium
+                use_df = pred_soft if (soft_spacing and soft_path) else pred_out
+                m = folium.Map(location=[float(use_df["lat_pred"].median()), float(use_df["lon_pred"].median())], zoom_start=13)
+                for r in use_df.itertuples(index=False):
+                    lat, lon = float(r.lat_pred), float(r.lon_pred)
+                    az = getattr(r, "azimuth_deg_5_soft", np.nan) if (soft_spacing and soft_path) else getattr(r, "azimuth_deg_5", np.nan)
+                    tooltip = f"{getattr(r,'network','')} | {getattr(r,'earfcn_or_narfcn','')} | PCI {getattr(r,'pci_or_psi','')} | Az {az}°"
+                    folium.CircleMarker([lat,lon], radius=4, fill=True, tooltip=tooltip).add_to(m)
+                map_path = f"{stem}_map.html"
+                m.save(map_path)
+                logging.info(f"Map -> {map_path}")
+            except Exception as e:
+                logging.warning(f"Map generation skipped: {e}")
+        run.update({"no_ta": no_ta_path, "soft": soft_path, "ta": ta_path, "map": map_path, "guards": st["guards"]})
+        run_stats.append(stats)
+    shared = {"audit": audit_path}
+    if tagged:
+        summary = pd.DataFrame([{**{p: r[p] for p in SWEEP_PARAMS}, **st, **(r.get("guards") or {}), "error": r.get("error", "")}
+                                for r, st in zip(runs, run_stats)])
+        shared["summary"] = write_table(summary, os.path.join(outdir, f"{base}_{ts}_sweep_summary"), output_format)
+        logging.info(f"Sweep of {len(runs)} configurations -> {shared['summary']}")
+    if agg_stats:
+        shared["aggregation"] = agg_stats
+    if cap_stats:
+        logging.info(f"Sample cap ({max_samples_per_sector}/sector): {cap_stats['sectors_capped']} sectors capped, {cap_stats['rows_in']} -> {cap_stats['rows_out']} rows")
+        shared["sampling"] = cap_stats
+    if input_id:
+        shared["input_id"] = input_id
+    return runs, shared
 
 # --------------------- ML pipeline (continual training + imputer) --
 FEATURE_CANDIDATES = ["rsrp_dbm","rsrq_db","sinr_db","rssi","band_mhz","earfcn_or_narfcn","speed_kmh","heading_deg"]
 CATEGORICALS = ["technology","network"]
 
+def _fill_nan(v, value: float) -> np.ndarray:
+    v = np.asarray(v, dtype=float)
+    return np.where(np.isnan(v), value, v)
+
+# derived feature -> (source features, fn(*source arrays)); used by build_features and the inference encoder
+DERIVED_FEATURES = {
+    "rsrp_lin": (("rsrp_dbm",), dbm_to_linear),
+    "rsrp_sinr": (("sinr_db", "rsrp_dbm"), lambda sinr, rsrp: _fill_nan(sinr, 0) + _fill_nan(rsrp, -120)),
+    "rsrp_rsrq": (("rsrq_db", "rsrp_dbm"), lambda rsrq, rsrp: _fill_nan(rsrq, 0) + _fill_nan(rsrp, -120)),
+}
+
 def build_features(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     for c in FEATURE_CANDIDATES:
-        if c in df.columns: df[c] = df[c].apply(to_num)
-    if "rsrp_dbm" in df.columns:
-        df["rsrp_lin"] = df["rsrp_dbm"].apply(lambda v: 10**(v/10.0) if pd.notna(v) else np.nan)
-    if "sinr_db" in df.columns and "rsrp_dbm" in df.columns:
-        df["rsrp_sinr"] = df["sinr_db"].fillna(0) + df["rsrp_dbm"].fillna(-120)
-    if "rsrq_db" in df.columns and "rsrp_dbm" in df.columns:
-        df["rsrp_rsrq"] = df["rsrq_db"].fillna(0) + df["rsrp_dbm"].fillna(-120)
+        if c in df.columns: df[c] = to_num_series(df[c])
+    for name, (sources, fn) in DERIVED_FEATURES.items():
+        if all(c in df.columns for c in sources):
+            df[name] = fn(*(df[c].to_numpy(dtype=float, na_value=np.nan) for c in sources))
     for cat in CATEGORICALS:
         if cat in df.columns: df[cat] = df[cat].astype(str).str.lower()
     return df
 
+def feature_encoder(bundle: Dict) -> FeatureEncoder:
+    """Inference encoder for a bundle: its compiled schema, or one compiled from the feature list and
+    imputer for bundles saved before schemas were stored."""
+    schema = bundle.get("schema")
+    if schema is None:
+        imputer = bundle.get("imputer")
+        schema = compile_schema(bundle["features"], CATEGORICALS, getattr(imputer, "statistics_", None))
+    return FeatureEncoder(schema, to_numeric=lambda s: to_num_series(s).to_numpy(), derived=DERIVED_FEATURES)
+
 def select_feature_matrix(df: pd.DataFrame):
     cols = [c for c in FEATURE_CANDIDATES + ["rsrp_lin","rsrp_sinr","rsrp_rsrq"] if c in df.columns]
     used_cats = [c for c in CATEGORICALS if c in df.columns]
@@ -567,44 +1485,98 @@ def select_feature_matrix(df: pd.DataFrame):
 def bundle_dir_from_model(model_path:str) -> str:
     return os.path.dirname(os.path.abspath(model_path))
 def replay_path_from_dir(model_dir:str) -> str:
-    return os.path.join(model_dir, "distance_model_replay.csv.gz")
-def save_bundle(model, imputer, features:List[str], outdir:str, version:int, extra_meta:Dict) -> str:
-    bundle = {"model": model, "imputer": imputer, "features": features, "version": version, "meta": extra_meta}
+    return os.path.join(model_dir, "distance_model_replay")
+def save_bundle(model, imputer, features:List[str], outdir:str, version:int, extra_meta:Dict, lineage:List[Dict]=None) -> str:
+    """Write the bundle; `lineage` is the parent bundle's history, extended with this version's entry."""
+    entry = {"version": version, "mode": extra_meta.get("train_mode", "full"), "timestamp": extra_meta.get("timestamp"),
+             "n_train": extra_meta.get("n_train"), "n_estimators": len(getattr(model, "estimators_", []))}
+    bundle = {"model": model, "imputer": imputer, "features": features, "version": version, "meta": extra_meta,
+              "lineage": list(lineage or []) + [entry],
+              "schema": compile_schema(features, CATEGORICALS, getattr(imputer, "statistics_", None))}
     model_path = os.path.join(outdir, "distance_model.joblib")
     joblib.dump(bundle, model_path)
+    model_registry.put(model_path, bundle)
     return model_path
 def load_bundle(model_path:str):
-    return joblib.load(model_path)
-def hash_rows(df: pd.DataFrame, cols: List[str]) -> pd.Series:
-    def hrow(row):
-        s = "|".join([str(row.get(c, "")) for c in cols])
-        return hashlib.md5(s.encode("utf-8")).hexdigest()
-    return df.apply(hrow, axis=1)
-def append_to_replay(replay_path:str, X_new: pd.DataFrame, y_new: pd.Series):
-    if os.path.exists(replay_path):
-        rep = pd.read_csv(replay_path, compression="gzip")
-        y_col = "target_distance_m"
-        cols_union = list(sorted(set(rep.columns) | set(X_new.columns) | {y_col}))
-        for c in cols_union:
-            if c not in rep.columns: rep[c] = 0
-            if c not in X_new.columns and c != y_col: X_new[c] = 0
-        rep = rep[cols_union]
-        X_new = X_new[cols_union[:-1]] if cols_union[-1] == y_col else X_new[cols_union]
-        new = X_new.copy(); new[y_col] = y_new.values
-        merged = pd.concat([rep, new], ignore_index=True)
-        feat_cols = [c for c in merged.columns if c != y_col]
-        merged["_h"] = hash_rows(merged, feat_cols)
-        merged = merged.drop_duplicates(subset="_h").drop(columns="_h")
-        merged.to_csv(replay_path, index=False, compression="gzip")
-        X_all = merged[feat_cols].copy(); y_all = merged[y_col].copy()
-    else:
-        y_col = "target_distance_m"
-        new = X_new.copy(); new[y_col] = y_new.values
-        new.to_csv(replay_path, index=False, compression="gzip")
-        X_all = X_new.copy(); y_all = y_new.copy()
+    """Cached per (path, mtime, size) in the process-wide model registry; treat the bundle as read-only."""
+    return model_registry.get(model_path)
+def load_serving_bundle(model_path:str, mmap: bool=False):
+    """Predict-only bundle for `model_path`: by default the bundle itself (sklearn predict). With `mmap`, its
+    memory-mapped `.serve.joblib` sidecar: the trees are shared between worker processes, but predicted by the
+    slower NumPy FlatForest (see forest.py). The sidecar is exported here, on first use, when it is missing or
+    older than the bundle; a bundle that cannot be exported is served by sklearn."""
+    if not mmap:
+        return load_bundle(model_path)
+    serve_path = forest.serving_path(model_path)
+    try:
+        if not os.path.exists(serve_path) or os.path.getmtime(serve_path) < os.path.getmtime(model_path):
+            bundle = load_bundle(model_path)
+            model = bundle["model"]
+            if not (hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_)):
+                return bundle
+            forest.save_serving_bundle(bundle, model_path)
+            logging.info(f"Exported serving sidecar {serve_path}")
+        return model_registry.get(serve_path, loader=forest.load_serving_bundle)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring serving sidecar {serve_path}: {e}")
+    return load_bundle(model_path)
+def append_to_replay(replay_path:str, X_new: pd.DataFrame, y_new: pd.Series, read_back: bool=True):
+    """Add the unseen rows of a training batch to the replay store and return the full replay set
+    (features in sorted-union order, missing ones as 0), or None with `read_back=False`.
+    A legacy `<replay_path>.csv.gz` is migrated first."""
+    store = ReplayStore(replay_path, target="target_distance_m")
+    store.migrate_csv(replay_path + ".csv.gz")
+    added = store.append(X_new, y_new)
+    logging.info(f"Replay: +{added} new of {len(X_new)} rows -> {store.rows} total")
+    if not read_back:
+        return None
+    X_all = store.read()
+    y_all = X_all.pop(store.target)
     return X_all, y_all
 
-def train_or_update_model(train_df: pd.DataFrame, outdir:str, existing_bundle_path:str=None):
+def update_model_incremental(old: Dict, X_new: pd.DataFrame, y_new: pd.Series, outdir:str, replay_path:str,
+                             trees_per_update:int=100, max_trees:int=1200, holdout_frac:float=0.2):
+    """Grow `trees_per_update` trees on the new batch only (warm_start) on top of the bundle's forest.
+    The ensemble is capped at `max_trees` by dropping the oldest trees, so the forest tracks recent drive data.
+    The bundle's feature list and imputer are kept. Columns it has never seen are ignored, so a full retrain
+    is needed to pick them up. Validation is a holdout of the new batch, scored before and after the update."""
+    features, imputer, base = list(old["features"]), old["imputer"], old["model"]
+    unknown = [c for c in X_new.columns if c not in features]
+    if unknown:
+        logging.warning(f"Incremental update ignores {len(unknown)} feature(s) unknown to the bundle: {unknown}")
+    X = X_new.reindex(columns=features, fill_value=0).replace([np.inf, -np.inf], np.nan)
+    X_imp = pd.DataFrame(imputer.transform(X), columns=features)
+    y = y_new.to_numpy(dtype=float)
+    order = np.random.default_rng(42).permutation(len(X_imp))
+    n_hold = int(len(order) * holdout_frac) if len(order) >= 50 else 0
+    hold, fit_idx = order[:n_hold], order[n_hold:]
+    # shallow copy + own estimators_ list: the cached parent bundle stays untouched
+    model = copy.copy(base)
+    model.estimators_ = list(base.estimators_)
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + int(trees_per_update))
+    model.fit(X_imp.iloc[fit_idx], y[fit_idx])
+    pruned = max(0, len(model.estimators_) - int(max_trees))
+    if pruned:
+        model.estimators_ = model.estimators_[pruned:]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+    meta = {"train_mode": "incremental", "n_train": int(len(fit_idx)), "n_holdout": int(n_hold),
+            "trees_added": int(trees_per_update), "trees_pruned": int(pruned), "n_estimators": len(model.estimators_),
+            "replay_path": replay_path, "parent_version": int(old.get("version", 1)), "timestamp": datetime.now().isoformat()}
+    if n_hold:
+        meta["holdout_mae_before_m"] = float(mean_absolute_error(y[hold], base.predict(X_imp.iloc[hold])))
+        pred = model.predict(X_imp.iloc[hold])
+        meta["holdout_mae_m"] = float(mean_absolute_error(y[hold], pred))
+        meta["holdout_rmse_m"] = float(np.sqrt(np.mean((pred - y[hold])**2)))
+    version = int(old.get("version", 1)) + 1
+    model_path = save_bundle(model, imputer, features, outdir, version, meta, lineage=old.get("lineage"))
+    return model, imputer, {"model_path": model_path, **meta}
+
+def train_or_update_model(train_df: pd.DataFrame, outdir:str, existing_bundle_path:str=None, incremental:bool=False,
+                          trees_per_update:int=100, max_trees:int=1200, cv_mode:str="auto", cv_max_rows:int=50000,
+                          cv_parallel_folds:int=None):
+    """Full retrain on the whole replay set or, with `incremental` and an existing RandomForest bundle,
+    a warm-start update on the new batch only (see update_model_incremental). Full retrains are
+    validated per `cv_mode` (see validation.py)."""
     if not SKLEARN_AVAILABLE:
         raise RuntimeError("scikit-learn/joblib not available. Install: pip install scikit-learn joblib")
     # Validate labels
@@ -616,72 +1588,159 @@ def train_or_update_model(train_df: pd.DataFrame, outdir:str, existing_bundle_pa
     if not label_lat_col or not label_lon_col:
         raise ValueError("Training needs sector/site coordinates (e.g., sector_lat, sector_lon).")
     tr = train_df.dropna(subset=["lat","lon", label_lat_col, label_lon_col]).copy()
-    tr["target_distance_m"] = [haversine(r.lat, r.lon, getattr(r, label_lat_col), getattr(r, label_lon_col)) for r in tr.itertuples(index=False)]
+    tr["target_distance_m"] = geo.haversine(tr["lat"].to_numpy(dtype=float), tr["lon"].to_numpy(dtype=float),
+                                            tr[label_lat_col].to_numpy(dtype=float), tr[label_lon_col].to_numpy(dtype=float))
     # Features
     tr = build_features(tr)
     X_new, feat_new = select_feature_matrix(tr)
     y_new = tr["target_distance_m"]
     # Replay path (prefer bundle dir if provided)
     replay_path = replay_path_from_dir(outdir if existing_bundle_path is None else bundle_dir_from_model(existing_bundle_path))
+    old = None
+    if existing_bundle_path and os.path.exists(existing_bundle_path):
+        try:
+            old = load_bundle(existing_bundle_path)
+        except Exception as e:
+            logging.warning(f"Could not read existing bundle {existing_bundle_path}: {e}")
+    if incremental:
+        if old is not None and isinstance(old.get("model"), RandomForestRegressor) and old.get("imputer") is not None:
+            append_to_replay(replay_path, X_new, y_new, read_back=False)
+            return update_model_incremental(old, X_new, y_new, outdir, replay_path, trees_per_update=trees_per_update, max_trees=max_trees)
+        logging.warning("Incremental update needs an existing RandomForest bundle with an imputer; doing a full retrain.")
     X_all, y_all = append_to_replay(replay_path, X_new, y_new)
     features = list(X_all.columns)
     # Imputer (fit on all replay data)
     imputer = SimpleImputer(strategy="median")
     X_all_imp = pd.DataFrame(imputer.fit_transform(X_all), columns=features)
-    # CV
-    kf = KFold(n_splits=min(5, max(2, int(len(X_all_imp) / 500))), shuffle=True, random_state=42)
-    maes = []
-    for tr_idx, va_idx in kf.split(X_all_imp):
-        model = RandomForestRegressor(n_estimators=300, max_depth=None, min_samples_leaf=2, random_state=42, n_jobs=-1)
-        model.fit(X_all_imp.iloc[tr_idx], y_all.iloc[tr_idx])
-        pred = model.predict(X_all_imp.iloc[va_idx])
-        maes.append(mean_absolute_error(y_all.iloc[va_idx], pred))
-    cv_mae = float(np.mean(maes)) if len(maes)>0 else np.nan
-    cv_rmse = float(np.sqrt(np.mean((model.predict(X_all_imp) - y_all.values)**2))) if len(X_all_imp)>0 else np.nan
+    # Validation
+    mode = validation.resolve_mode(cv_mode, len(X_all_imp), cv_max_rows)
+    val = {"mode": mode}
+    if mode in ("kfold", "subsample"):
+        val = validation.cross_validate(
+            lambda n_jobs: RandomForestRegressor(n_estimators=300, max_depth=None, min_samples_leaf=2, random_state=42, n_jobs=n_jobs),
+            X_all_imp, y_all, max_rows=cv_max_rows if mode == "subsample" else None, parallel_folds=cv_parallel_folds)
     # Final fit
-    model = RandomForestRegressor(n_estimators=600, max_depth=None, min_samples_leaf=2, random_state=42, n_jobs=-1)
+    model = RandomForestRegressor(n_estimators=600, max_depth=None, min_samples_leaf=2, random_state=42, n_jobs=-1,
+                                  oob_score=(mode == "oob"))
+    t_fit = time.perf_counter()
     model.fit(X_all_imp, y_all)
+    if mode == "oob":
+        val = validation.oob_validation(model, y_all, fit_s=time.perf_counter() - t_fit)
+    cv_mae, cv_rmse = val.get("mae_m", np.nan), val.get("rmse_m", np.nan)
+    logging.info(f"Validation ({mode}): MAE {cv_mae:.2f} m, RMSE {cv_rmse:.2f} m" + (f", {len(val['folds'])} folds in {val['wall_s']}s" if "folds" in val else ""))
     # Versioning
-    version = 1
-    if existing_bundle_path and os.path.exists(existing_bundle_path):
-        try:
-            old = load_bundle(existing_bundle_path)
-            version = int(old.get("version", 1)) + 1
-        except Exception:
-            version = 1
-    meta = {"cv_mae_m": cv_mae, "cv_rmse_m": cv_rmse, "n_train": int(len(X_all_imp)), "replay_path": replay_path, "timestamp": datetime.now().isoformat()}
-    model_path = save_bundle(model, imputer, features, outdir, version, meta)
+    version = int(old.get("version", 1)) + 1 if old is not None else 1
+    meta = {"train_mode": "full", "cv_mae_m": cv_mae, "cv_rmse_m": cv_rmse, "n_train": int(len(X_all_imp)), "replay_path": replay_path, "timestamp": datetime.now().isoformat(),
+            "validation": val}
+    model_path = save_bundle(model, imputer, features, outdir, version, meta, lineage=old.get("lineage") if old is not None else None)
     return model, imputer, {"model_path": model_path, **meta}
 
-def solve_site_from_predicted_ranges(samples: pd.DataFrame, lat0: float, lon0: float,
-                                     start_step_m: float = 300.0, min_step_m: float = 10.0):
-    def loss(latc, lonc):
-        d = np.array([haversine(latc, lonc, r.lat, r.lon) for r in samples.itertuples(index=False)])
-        rhat = samples["pred_range_m"].values
-        if "rsrp_dbm" in samples.columns and not samples["rsrp_dbm"].isna().all():
-            w = np.array([max(10**(v/10.0), 1e-13) if not pd.isna(v) else 0.0 for v in samples["rsrp_dbm"].values])
-        else:
-            w = np.ones(len(samples))
-        return float(np.average(np.abs(d - rhat), weights=w))
+def range_loss(lat_c: float, lon_c: float, lat_s, lon_s, rhat, w) -> float:
+    """Weighted mean |haversine(candidate, sample) - predicted range| (metres)."""
+    return float(np.average(np.abs(geo.haversine(lat_c, lon_c, lat_s, lon_s) - rhat), weights=w))
+
+def solve_ranges_pattern(lat_s, lon_s, rhat, w, lat0: float, lon0: float,
+                         start_step_m: float = 300.0, min_step_m: float = 10.0):
+    """8-direction compass search with step halving. Robust but slow; the fallback for solve_ranges_irls."""
     best_lat, best_lon = lat0, lon0
-    best_loss = loss(best_lat, best_lon)
-    step = start_step_m
+    best_loss = range_loss(best_lat, best_lon, lat_s, lon_s, rhat, w)
+    step, iters = start_step_m, 0
     dirs = [(1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1)]
     while step >= min_step_m:
+        iters += 1
         improved = False
         for dn, de in dirs:
-            lat_try, lon_try = meters_to_offsets(dn*step, de*step, best_lat)
-            cur_loss = loss(lat_try, lon_try)
+            lat_try, lon_try = geo.offset_point(best_lat, best_lon, dn*step, de*step)
+            cur_loss = range_loss(lat_try, lon_try, lat_s, lon_s, rhat, w)
             if cur_loss + 1e-6 < best_loss:
-                best_lat, best_lon, best_loss = lat_try, lon_try, cur_loss
+                best_lat, best_lon, best_loss = float(lat_try), float(lon_try), cur_loss
                 improved = True
         if not improved:
             step /= 2.0
-    return best_lat, best_lon, best_loss
+    return best_lat, best_lon, best_loss, iters
+
+def solve_ranges_irls(lat_s, lon_s, rhat, w, lat0: float, lon0: float,
+                      max_iter: int = 100, tol_m: float = 0.05, eps_m: float = 1.0, max_shift_m: float = 20000.0):
+    """IRLS / Gauss-Newton for min sum w_i |d_i(p) - r_i| on local ENU metres around (lat0, lon0).
+
+    Each iteration reweights by w_i / max(|residual_i|, eps) and solves the 2x2 Gauss-Newton normal
+    equations of the resulting weighted least squares. eps starts at twice the median range, where the
+    objective is smooth and nearly convex, and is halved every iteration down to `eps_m`. That keeps
+    the iterate from locking onto the few strongest samples early. Returns (lat, lon, loss, iterations),
+    or None when the normal equations are singular or the iterate runs away, so the caller can fall back
+    to the pattern search."""
+    sn, se = geo.offsets_to_meters(lat_s, lon_s, lat0, lon0)
+    pn = pe = 0.0
+    eps = max(2.0 * float(np.median(rhat)), eps_m)
+    it = 0
+    for it in range(1, max_iter + 1):
+        dn, de = pn - sn, pe - se
+        d = np.maximum(np.hypot(dn, de), 1e-6)
+        res = d - rhat
+        u = w / np.maximum(np.abs(res), eps)
+        jn, je = dn / d, de / d
+        a11, a12, a22 = float(np.dot(u, jn*jn)), float(np.dot(u, jn*je)), float(np.dot(u, je*je))
+        g1, g2 = float(np.dot(u, jn*res)), float(np.dot(u, je*res))
+        det = a11*a22 - a12*a12
+        if not np.isfinite(det) or det <= 1e-12 * max(a11*a22, 1e-300):
+            return None
+        step_n, step_e = -(a22*g1 - a12*g2) / det, -(a11*g2 - a12*g1) / det
+        pn, pe = pn + step_n, pe + step_e
+        if not (np.isfinite(pn) and np.isfinite(pe)) or math.hypot(pn, pe) > max_shift_m:
+            return None
+        if eps <= eps_m and math.hypot(step_n, step_e) < tol_m:
+            break
+        eps = max(eps / 2.0, eps_m)
+    lat_hat, lon_hat = geo.offset_point(lat0, lon0, pn, pe)
+    return float(lat_hat), float(lon_hat), range_loss(lat_hat, lon_hat, lat_s, lon_s, rhat, w), it
+
+IRLS_EPS_M = 100.0             # IRLS residual floor: below it samples are weighted as least squares (Huber-like)
+IRLS_POLISH_STEP_M = 50.0      # first step of the pattern search that finishes every IRLS solution
+IRLS_POLISH_MIN_STEP_M = 25.0  # and its last step
+
+def solve_ranges_from_arrays(lat_s, lon_s, rsrp, rhat, lat0: float, lon0: float,
+                             start_step_m: float = 300.0, min_step_m: float = 10.0, count=None):
+    """Site from per-sample predicted ranges: IRLS with an IRLS_EPS_M residual floor, then a short pattern
+    search (IRLS_POLISH_STEP_M down to IRLS_POLISH_MIN_STEP_M) seeded at its point; the full pattern search
+    from the start if IRLS fails or ends worse than the start. The floor keeps IRLS off the exact L1 optimum,
+    which chases the noise of the long ranges and lands further from the site than the pattern search did.
+    `count` multiplies the weights of aggregated samples. Returns (lat, lon, weighted MAE of the ranges in
+    metres, iterations of both stages)."""
+    w = sample_weights(rsrp, len(lat_s))
+    if count is not None:
+        w = w * count
+    sol = solve_ranges_irls(lat_s, lon_s, rhat, w, lat0, lon0, eps_m=IRLS_EPS_M)
+    if sol is None or not sol[2] <= range_loss(lat0, lon0, lat_s, lon_s, rhat, w) + 1e-6:
+        return solve_ranges_pattern(lat_s, lon_s, rhat, w, lat0, lon0, start_step_m=start_step_m, min_step_m=min_step_m)
+    lat_p, lon_p, loss, iters = solve_ranges_pattern(lat_s, lon_s, rhat, w, sol[0], sol[1],
+                                                     start_step_m=IRLS_POLISH_STEP_M, min_step_m=IRLS_POLISH_MIN_STEP_M)
+    return lat_p, lon_p, loss, sol[3] + iters
+
+def solve_site_from_predicted_ranges(samples: pd.DataFrame, lat0: float, lon0: float,
+                                     start_step_m: float = 300.0, min_step_m: float = 10.0):
+    lat_s, lon_s, rsrp, rhat = sector_arrays(samples, extra=("pred_range_m",))
+    return solve_ranges_from_arrays(lat_s, lon_s, rsrp, rhat, lat0, lon0, start_step_m=start_step_m, min_step_m=min_step_m)
+
+def ml_sector_task(lat, lon, rsrp, rhat, count=None):
+    """Initial centroid -> range solve for one sector (runs in a SectorPool worker)."""
+    lat0, lon0, _ = centroid_from_arrays(lat, lon, rsrp, count)
+    return solve_ranges_from_arrays(lat, lon, rsrp, rhat, lat0, lon0, count=count)
 
 def run_ml(train_path: str=None, model_path: str=None, update_model: bool=False, input_path: str=None, outdir: str=None,
            sheet_train:str=None, sheet_input:str=None, min_samples:int=30, bin_size:int=5, soft_spacing:bool=True, make_map:bool=False,
-           eval_path: str=None, sheet_eval: str=None, no_ml_merge: bool=False):
+           eval_path: str=None, sheet_eval: str=None, no_ml_merge: bool=False, chunksize: int=None, spill_dir: str=None,
+           output_format: str="csv", workers: int=1, incremental: bool=False, trees_per_update: int=100, max_trees: int=1200,
+           cv_mode: str="auto", cv_max_rows: int=50000, grid_m: float=None, max_samples_per_sector: int=None,
+           input_cache: str=None, input_cache_mb: float=None, mmap_model: bool=False):
+    """ML site/sector estimation. With `chunksize`, ranges are predicted chunk by chunk while the input is
+    streamed and spilled to per-sector partitions on disk (see SpilledSectors). `workers` > 1 fans the
+    per-sector solves out to a process pool. `update_model` + `incremental` grows the loaded forest on the
+    new training batch instead of retraining it (see update_model_incremental). `grid_m` > 0 collapses
+    each sector's samples per grid cell before range prediction (see aggregate_samples) and adds
+    "aggregation" (rows in/out, compression ratio) to the result. `max_samples_per_sector` bounds the
+    rows each sector solve sees (see cap_sector_samples) and adds "sampling" (sectors capped, rows in/out).
+    `input_cache` reads/writes the standardized input by content hash (see load_standardized) and adds "input_id".
+    `mmap_model` serves `model_path` from its memory-mapped sidecar (see load_serving_bundle)."""
     if not SKLEARN_AVAILABLE:
         raise RuntimeError("scikit-learn/joblib not available. Install: pip install scikit-learn joblib")
     if input_path is None or outdir is None:
@@ -689,93 +1748,110 @@ def run_ml(train_path: str=None, model_path: str=None, update_model: bool=False,
     os.makedirs(outdir, exist_ok=True)
     base_in = os.path.splitext(os.path.basename(input_path))[0]
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    # Load input
-    in_raw = load_any(input_path, sheet_input)
-    df = standardize_df(in_raw)
-    in_audit = df.head(20000)
-    in_audit_path = os.path.join(outdir, f"{base_in}_{ts}_audit_infer.csv")
-    in_audit.to_csv(in_audit_path, index=False)
-    logging.info(f"Audit infer -> {in_audit_path}")
     # Model: load or train/update
     if model_path and not update_model:
         logging.info(f"Loading model: {model_path}")
-        bundle = load_bundle(model_path)
-        model = bundle["model"]; tr_feats = bundle["features"]; imputer = bundle.get("imputer", None)
+        bundle = load_serving_bundle(model_path, mmap=mmap_model)
+        model = bundle["model"]
+        if isinstance(model, forest.FlatForest):
+            logging.info(f"Serving {model.n_estimators} trees from the memory-mapped sidecar (FlatForest: shared pages, slower than sklearn predict)")
         bundle_meta = bundle.get("meta", {})
     else:
         if train_path is None:
             raise ValueError("Provide --train to fit a model or --model to load one (with --update-model to update).")
         tr_raw = load_any(train_path, sheet_train)
         tr = standardize_df(tr_raw)
-        model, imputer, meta = train_or_update_model(tr, outdir, existing_bundle_path=model_path)
-        logging.info(f"Trained/updated model -> {meta['model_path']} | CV MAE ≈ {meta.get('cv_mae_m', np.nan):.2f} m | CV RMSE ≈ {meta.get('cv_rmse_m', np.nan):.2f} m | n_train={meta.get('n_train')}")
+        model, imputer, meta = train_or_update_model(tr, outdir, existing_bundle_path=model_path, incremental=incremental,
+                                                     trees_per_update=trees_per_update, max_trees=max_trees,
+                                                     cv_mode=cv_mode, cv_max_rows=cv_max_rows)
+        if meta.get("train_mode") == "incremental":
+            logging.info(f"Incrementally updated model -> {meta['model_path']} | trees={meta['n_estimators']} (+{meta['trees_added']}, -{meta['trees_pruned']}) | holdout MAE {meta.get('holdout_mae_before_m', np.nan):.2f} -> {meta.get('holdout_mae_m', np.nan):.2f} m | n_train={meta.get('n_train')}")
+        else:
+            logging.info(f"Trained/updated model -> {meta['model_path']} | CV MAE ≈ {meta.get('cv_mae_m', np.nan):.2f} m | CV RMSE ≈ {meta.get('cv_rmse_m', np.nan):.2f} m | n_train={meta.get('n_train')}")
         bundle_meta = meta
-        tr_feats = load_bundle(meta["model_path"])["features"]
-    # Predict ranges
-    feats_in = build_features(df.copy())
-    X_in, featnames = select_feature_matrix(feats_in)
-    for col in tr_feats:
-        if col not in X_in.columns: X_in[col] = 0
-    X_in = X_in[tr_feats]
-    X_in = X_in.replace([np.inf, -np.inf], np.nan)
-    if imputer is None:
-        logging.warning("Bundle has no imputer; fitting a temporary median imputer on inference features.")
-        imputer = SimpleImputer(strategy="median").fit(X_in)
-    X_in_imp = pd.DataFrame(imputer.transform(X_in), columns=tr_feats)
-    df["pred_range_m"] = model.predict(X_in_imp)
-    # group keys
-    group_cols = []
-    if "network" in df.columns: group_cols.append("network")
-    for gc in ["earfcn_or_narfcn","pci_or_psi"]:
-        if gc in df.columns: group_cols.append(gc)
-    if len(group_cols) < 2:
-        raise ValueError("Need at least earfcn_or_narfcn and pci_or_psi (network optional).")
-    # initial point
-    def weighted_centroid(g):
-        if "rsrp_dbm" in g.columns and not g["rsrp_dbm"].isna().all():
-            w = g["rsrp_dbm"].apply(lambda v: max(10**(v/10.0), 1e-13) if pd.notna(v) else 0.0)
+        bundle = load_bundle(meta["model_path"])  # registered by save_bundle, no reload
+    # Predict ranges: standardized frame -> fixed-schema float32 matrix (imputed) -> model
+    encoder = feature_encoder(bundle)
+    if bundle.get("imputer") is None:
+        logging.warning("Bundle has no imputer; missing feature values take each batch's median.")
+    drift = {}
+    def predict_ranges(frame: pd.DataFrame) -> pd.DataFrame:
+        X_in = encoder.encode(frame, drift=drift)
+        if isinstance(model, forest.FlatForest):
+            frame["pred_range_m"] = model.predict(X_in)
         else:
-            w = pd.Series(np.ones(len(g)), index=g.index)
-        q = w.quantile(0.9)
-        sel = g[w >= q] if q>0 else g
-        if len(sel) < 10:
-            if "rsrp_dbm" in g.columns:
-                sel = g.nlargest(min(20, len(g)), "rsrp_dbm")
-                w = sel["rsrp_dbm"].apply(lambda v: max(10**(v/10.0), 1e-13) if pd.notna(v) else 0.0)
-            else:
-                w = pd.Series(np.ones(len(sel)), index=sel.index)
-        w_sel = w.loc[sel.index]
-        W = float(w_sel.sum()) if float(w_sel.sum())>0 else 1.0
-        lat0 = float((sel["lat"]*w_sel).sum()/W); lon0 = float((sel["lon"]*w_sel).sum()/W)
-        return lat0, lon0
+            frame["pred_range_m"] = model.predict(pd.DataFrame(X_in, columns=encoder.features, copy=False))
+        return frame
+    # Load input (in memory, or streamed + spilled per sector), optionally grid-aggregated before prediction
+    required = ("lat","lon","pred_range_m")
+    agg_stats = {}
+    aggregate = pre_aggregator(grid_m, agg_stats) if grid_m else None
+    cap_stats = {}
+    cap = sector_capper(max_samples_per_sector, cap_stats)
+    if chunksize:
+        transform = predict_ranges if aggregate is None else (lambda frame: predict_ranges(aggregate(frame)))
+        src, input_id = standardized_source(input_path, sheet_input, input_cache)
+        sectors, in_audit = spill_input(src or input_path, None if src else sheet_input, chunksize=chunksize, required=required, transform=transform, spill_dir=spill_dir)
+        group_cols = sectors.group_cols
+        df = None
+    else:
+        df, input_id = load_standardized(input_path, sheet_input, input_cache, None if input_cache_mb is None else int(input_cache_mb * 1024**2))
+        in_audit = df.head(AUDIT_ROWS)
+        if aggregate is not None:
+            df = aggregate(df)
+        if cap_stats:
+            # in memory the whole sector is at hand, so cap before the model: only kept rows get a range
+            capped = SectorIndex(df, sector_group_cols(df.columns)).items()
+            df = pd.concat([df.iloc[:0]] + [cap(g, record=True) for _, g in capped], ignore_index=True)
+        df = predict_ranges(df)
+        group_cols = sector_group_cols(df.columns)
+        sectors = SectorIndex(df, group_cols, required=required)
+    log_drift(drift)
+    if agg_stats:
+        logging.info(f"Grid pre-aggregation ({grid_m:g} m): {agg_stats['rows_in']} samples -> {agg_stats['rows_out']} rows ({agg_stats['compression']}x)")
+    in_audit_path = write_table(in_audit.drop(columns=["pred_range_m"], errors="ignore"), os.path.join(outdir, f"{base_in}_{ts}_audit_infer"), output_format)
+    logging.info(f"Audit infer -> {in_audit_path}")
+    cellid_col = None
+    for c in ["cell_id_representative"] + CELLID_CANDIDATES:
+        if c in sectors.columns: cellid_col = c; break
     # solve
-    pred_rows = []
-    for keys, g in df.groupby(group_cols):
-        g2 = g.dropna(subset=["lat","lon","pred_range_m"])
-        if len(g2) < max(20, min_samples): continue
-        lat0, lon0 = weighted_centroid(g2)
-        lat_hat, lon_hat, loss_mae = solve_site_from_predicted_ranges(g2, lat0, lon0)
-        az5, beam_deg, rel = azimuth_histogram(g2, lat_hat, lon_hat, bin_size=bin_size)
-        kd = {}
-        if isinstance(keys, tuple):
-            for i,k in enumerate(group_cols): kd[k] = keys[i]
-        else:
-            kd[group_cols[0]] = keys
-        pred_rows.append({**kd, "samples": int(len(g2)), "lat_pred": lat_hat, "lon_pred": lon_hat, "azimuth_deg_5": az5, "beamwidth_deg_est": beam_deg, "azimuth_reliability": rel, "range_mae_m": float(loss_mae)})
+    pred_rows, cell_rows, sector_meta, solved = [], [], [], []
+    pending = deque()     # sample arrays of tasks in flight, kept for the azimuth pass
+    def sector_tasks():
+        for keys, g2 in sectors.items():
+            n = sector_size(g2)
+            if n < max(20, min_samples): continue
+            kd = dict(zip(group_cols, keys))
+            if cellid_col and df is None:
+                # streamed input: no full frame to group later, take the representative cell id from the sector's rows
+                cell_rows.append({**kd, "cell_id_representative": most_common_str(g2[cellid_col])})
+            sector_meta.append((kd, n))
+            g2 = cap(g2, record=df is None)     # in memory the rows were capped before prediction
+            task = sector_arrays(g2, extra=("pred_range_m",)) + (sector_counts(g2),)
+            pending.append(task[:3] + task[4:])
+            yield task
+    with SectorPool(workers) as pool:
+        def az_items():
+            for i, res in enumerate(pool.map(ml_sector_task, sector_tasks())):
+                solved.append(res)
+                lat, lon, rsrp, count = pending.popleft()
+                yield lat, lon, rsrp, res[0], res[1], count
+        for i, (az5, beam_deg, rel) in enumerate(azimuth_batches(az_items(), bin_size=bin_size)):
+            (kd, n), (lat_hat, lon_hat, loss_mae, iters) = sector_meta[i], solved[i]
+            pred_rows.append({**kd, "samples": n, "lat_pred": lat_hat, "lon_pred": lon_hat, "azimuth_deg_5": az5, "beamwidth_deg_est": beam_deg, "azimuth_reliability": rel, "range_mae_m": float(loss_mae), "solver_iterations": int(iters)})
     pred_df = pd.DataFrame(pred_rows)
     if len(pred_df)==0:
         raise RuntimeError("No sector groups produced predictions.")
     # Save per-sector predictions
-    per_sector_path = os.path.join(outdir, f"{base_in}_{ts}_pred_ml_per_sector.csv")
-    pred_df.to_csv(per_sector_path, index=False)
+    per_sector_path = write_table(pred_df, os.path.join(outdir, f"{base_in}_{ts}_pred_ml_per_sector"), output_format)
     logging.info(f"ML (per-sector) -> {per_sector_path}")
     # cell_id enrichment
-    cellid_col = None
-    for c in ["cell_id_representative","cell_id_global","cellid","cell_id","eci","ecgi","nrcgi","nr_cgi"]:
-        if c in df.columns: cellid_col = c; break
     group_cols_for_map = group_cols.copy()
     if cellid_col:
-        cellmap = (df.groupby(group_cols)[cellid_col].agg(lambda s: s.dropna().astype(str).value_counts().idxmax() if s.dropna().size>0 else np.nan).reset_index().rename(columns={cellid_col:"cell_id_representative"}))
+        if df is not None:
+            cellmap = (df.groupby(group_cols)[cellid_col].agg(most_common_str).reset_index().rename(columns={cellid_col:"cell_id_representative"}))
+        else:
+            cellmap = pd.DataFrame(cell_rows, columns=group_cols + ["cell_id_representative"])
         pred_df = pred_df.merge(cellmap, on=group_cols, how="left")
         pred_df["site_key_inferred"] = pred_df["cell_id_representative"].apply(infer_site_key)
     else:
@@ -786,23 +1862,12 @@ def run_ml(train_path: str=None, model_path: str=None, update_model: bool=False,
         site_keys = [c for c in ["network","earfcn_or_narfcn","site_key_inferred"] if c in pred_df.columns]
         if len(site_keys) >= 2:
             pred_df["sector_count"] = pred_df.groupby(site_keys)["pci_or_psi"].transform("nunique").fillna(1).astype(int)
-            # robust center = median of sector centers
-            site_centers = pred_df.groupby(site_keys).agg(lat_site=("lat_pred","median"), lon_site=("lon_pred","median")).reset_index()
-            pred_df = pred_df.merge(site_centers, on=site_keys, how="left")
+            # robust center = median of sector centers; spread = farthest sector solution from it
+            sites = merge_site_positions(pred_df, site_keys, "lat_pred", "lon_pred")
+            pred_df["lat_site"], pred_df["lon_site"] = sites["lat_site"], sites["lon_site"]
             pred_df["lat_pred"] = pred_df["lat_site"].fillna(pred_df["lat_pred"])
             pred_df["lon_pred"] = pred_df["lon_site"].fillna(pred_df["lon_pred"])
-            # compute site spread for info
-            def _hav(a,b,c,d):
-                R=6371000.0
-                phi1, phi2 = math.radians(a), math.radians(c)
-                dphi = math.radians(c-a); dl = math.radians(d-b)
-                x = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
-                return 2*R*math.asin(math.sqrt(x))
-            def _spread(group):
-                latc, lonc = float(group["lat_pred"].iloc[0]), float(group["lon_pred"].iloc[0])
-                return pd.Series({"site_spread_m": max([_hav(latc, lonc, float(r.lat_pred), float(r.lon_pred)) for r in group.itertuples(index=False)]) if len(group)>0 else 0.0})
-            spread = pred_df.groupby(site_keys).apply(_spread).reset_index()
-            pred_df = pred_df.merge(spread, on=site_keys, how="left")
+            pred_df["site_spread_m"] = sites["site_spread_m"]
         else:
             pred_df["site_spread_m"] = np.nan
             pred_df["sector_count"] = 1
@@ -813,24 +1878,19 @@ def run_ml(train_path: str=None, model_path: str=None, update_model: bool=False,
     soft_path = None
     key_cols = [c for c in ["network","earfcn_or_narfcn","site_key_inferred"] if c in pred_df.columns]
     if soft_spacing and len(key_cols)>0:
-        parts = []
-        for _, g in pred_df.groupby(key_cols):
-            parts.append(soft_equal_spacing(g, bin_size=bin_size))
-        pred_soft = pd.concat(parts, ignore_index=True)
+        pred_soft = soft_equal_spacing_sites(pred_df, key_cols, bin_size=bin_size)
         pred_soft["azimuth_deg_label_soft"] = pred_soft["azimuth_deg_5_soft"].apply(lambda v: f"{int(v)} degree" if not pd.isna(v) else "")
     else:
         pred_soft = pred_df.copy()
     # save
-    no_ta_path = os.path.join(outdir, f"{base_in}_{ts}_pred_ml_no_ta.csv")
-    soft_path = os.path.join(outdir, f"{base_in}_{ts}_pred_ml_no_ta_soft.csv")
-    pred_df.to_csv(no_ta_path, index=False)
-    pred_soft.to_csv(soft_path, index=False)
+    no_ta_path = write_table(pred_df, os.path.join(outdir, f"{base_in}_{ts}_pred_ml_no_ta"), output_format)
+    soft_path = write_table(pred_soft, os.path.join(outdir, f"{base_in}_{ts}_pred_ml_no_ta_soft"), output_format)
     # Persist training CV metrics if available
     try:
         if bundle_meta:
             metrics_path = os.path.join(outdir, f"{base_in}_{ts}_ml_metrics.json")
             with open(metrics_path, "w") as f:
-                json.dump({"cv": bundle_meta}, f, indent=2)
+                json.dump({"cv": bundle_meta, "feature_drift": drift}, f, indent=2)
             logging.info(f"Saved ML CV metrics -> {metrics_path}")
     except Exception:
         pass
@@ -852,29 +1912,55 @@ def run_ml(train_path: str=None, model_path: str=None, update_model: bool=False,
             logging.info(f"Map -> {map_path}")
         except Exception as e:
             logging.warning(f"Map generation skipped: {e}")
-    return {"no_ta": no_ta_path, "soft": soft_path, "map": map_path, "per_sector": per_sector_path}
+    if chunksize:
+        sectors.close()
+    out = {"no_ta": no_ta_path, "soft": soft_path, "map": map_path, "per_sector": per_sector_path}
+    if agg_stats:
+        out["aggregation"] = agg_stats
+    if cap_stats:
+        logging.info(f"Sample cap ({max_samples_per_sector}/sector): {cap_stats['sectors_capped']} sectors capped, {cap_stats['rows_in']} -> {cap_stats['rows_out']} rows")
+        out["sampling"] = cap_stats
+    if input_id:
+        out["input_id"] = input_id
+    return out
 
 # ----------------------------- CLI ---------------------------------
 def main():
     ap = argparse.ArgumentParser(description="Unified Site & Sector Locator Tool (NO-ML & ML w/ Continual Training, NaN-safe, site-merge)")
     ap.add_argument("--method", choices=["noml","ml"], required=True, help="Which method to run")
-    ap.add_argument("-i","--input", help="Input CSV/XLSX with drive-test samples (required for both methods)")
+    ap.add_argument("-i","--input", help="Input CSV/XLSX/Parquet/Feather with drive-test samples (required for both methods)")
     ap.add_argument("-o","--outdir", required=True, help="Output directory")
     ap.add_argument("--sheet", default=None, help="Excel sheet for NO-ML input file")
     ap.add_argument("--sheet-train", default=None, help="Excel sheet for ML train file")
     ap.add_argument("--sheet-input", default=None, help="Excel sheet for ML input file")
     ap.add_argument("--min-samples", type=int, default=30, help="Min samples per (network,EARFCN,PCI) group")
-    ap.add_argument("--bin-size", type=int, default=5, choices=[1,3,5,10,15], help="Azimuth histogram bin size (deg)")
+    ap.add_argument("--bin-size", type=int, default=5, choices=BIN_SIZES, help="Azimuth histogram bin size (deg)")
     ap.add_argument("--soft-spacing", action="store_true", help="Soft enforce ~360/N spacing per site")
     ap.add_argument("--use-ta", action="store_true", help="(NO-ML only) Grid-search TA refine")
+    ap.add_argument("--ta-factors", default=None, help="(NO-ML) Metres per TA step by technology, e.g. 'lte=78.07,nr=39.03'")
     ap.add_argument("--make-map", action="store_true", help="Export Folium HTML map")
+    ap.add_argument("--sweep", default=None, help="(NO-ML) Run a parameter grid in one pass, e.g. 'bin_size=1,3,5,10,15;min_samples=20,30' (outputs tagged per configuration, plus a sweep summary)")
     # ML specific
     ap.add_argument("--train", help="(ML) Labeled truth CSV/XLSX with sector_lat/sector_lon")
     ap.add_argument("--model", help="(ML) Pre-trained joblib model bundle")
     ap.add_argument("--update-model", action="store_true", help="(ML) Update existing model with new --train data (continual training)")
+    ap.add_argument("--incremental", action="store_true", help="(ML) With --update-model: grow extra trees on the new --train batch instead of a full retrain")
+    ap.add_argument("--trees-per-update", type=int, default=100, help="(ML) Trees added per incremental update")
+    ap.add_argument("--max-trees", type=int, default=1200, help="(ML) Cap on forest size; the oldest trees are dropped beyond it")
+    ap.add_argument("--cv-mode", default="auto", choices=list(validation.VALIDATION_MODES), help="(ML) Validation for full retrains: kfold, subsample, oob, none, or auto (kfold up to --cv-max-rows, oob above)")
+    ap.add_argument("--cv-max-rows", type=int, default=50000, help="(ML) Row budget for subsampled CV / kfold-vs-oob switch in auto mode")
     ap.add_argument("--eval", help="(ML) Optional labeled eval CSV/XLSX to compute site-level metrics")
     ap.add_argument("--sheet-eval", default=None, help="Excel sheet for ML eval file")
+    ap.add_argument("--mmap-model", action="store_true", help="(ML) Serve --model from its memory-mapped .serve.joblib sidecar: less memory per process, slower prediction")
     ap.add_argument("--no-ml-merge", action="store_true", help="Disable ML site merge (debug only)")
+    # Large inputs
+    ap.add_argument("--chunksize", type=int, default=None, help="Stream the input in chunks of N rows and spill per-sector partitions to disk (bounded memory)")
+    ap.add_argument("--spill-dir", default=None, help="Directory for temporary spill partitions (default: system temp)")
+    ap.add_argument("--output-format", default="csv", choices=sorted(OUTPUT_FORMATS), help="File format for tabular outputs")
+    ap.add_argument("--workers", type=int, default=1, help="Processes for per-sector solves (1 = serial, -1 = all cores)")
+    ap.add_argument("--grid-m", type=float, default=None, help="Collapse each sector's samples into one weighted row per N-metre grid cell before solving (off by default)")
+    ap.add_argument("--input-cache", default=None, help="Directory caching the standardized input by content hash; reruns on the same file skip parsing")
+    ap.add_argument("--max-samples-per-sector", type=int, default=None, help="Fast mode: solve each sector on a bearing/distance-stratified sample of at most N rows (off by default)")
 
     args = ap.parse_args()
 
@@ -883,10 +1969,14 @@ def main():
     try:
         if args.method == "noml":
             if not args.input: raise ValueError("--input is required for NO-ML")
-            outs = run_noml(args.input, args.outdir, sheet=args.sheet, min_samples=args.min_samples, bin_size=args.bin_size, soft_spacing=args.soft_spacing, use_ta=args.use_ta, make_map=args.make_map, merge_sites=args.soft_spacing)
+            if args.sweep:
+                outs = run_noml_sweep(args.input, args.outdir, args.sweep, sheet=args.sheet, min_samples=args.min_samples, bin_size=args.bin_size, soft_spacing=args.soft_spacing, use_ta=args.use_ta, make_map=args.make_map, chunksize=args.chunksize, spill_dir=args.spill_dir, output_format=args.output_format, workers=args.workers, ta_factors=args.ta_factors, grid_m=args.grid_m, max_samples_per_sector=args.max_samples_per_sector, input_cache=args.input_cache)
+            else:
+                outs = run_noml(args.input, args.outdir, sheet=args.sheet, min_samples=args.min_samples, bin_size=args.bin_size, soft_spacing=args.soft_spacing, use_ta=args.use_ta, make_map=args.make_map, merge_sites=args.soft_spacing, chunksize=args.chunksize, spill_dir=args.spill_dir, output_format=args.output_format, workers=args.workers, ta_factors=args.ta_factors, grid_m=args.grid_m, max_samples_per_sector=args.max_samples_per_sector, input_cache=args.input_cache)
         else:
             if not args.input: raise ValueError("--input is required for ML")
-            outs = run_ml(train_path=args.train, model_path=args.model, update_model=args.update_model, input_path=args.input, outdir=args.outdir, sheet_train=args.sheet_train, sheet_input=args.sheet_input, min_samples=args.min_samples, bin_size=args.bin_size, soft_spacing=args.soft_spacing, make_map=args.make_map, eval_path=args.eval, sheet_eval=args.sheet_eval, no_ml_merge=args.no_ml_merge)
+            if args.sweep: raise ValueError("--sweep is NO-ML only")
+            outs = run_ml(train_path=args.train, model_path=args.model, update_model=args.update_model, input_path=args.input, outdir=args.outdir, sheet_train=args.sheet_train, sheet_input=args.sheet_input, min_samples=args.min_samples, bin_size=args.bin_size, soft_spacing=args.soft_spacing, make_map=args.make_map, eval_path=args.eval, sheet_eval=args.sheet_eval, no_ml_merge=args.no_ml_merge, chunksize=args.chunksize, spill_dir=args.spill_dir, output_format=args.output_format, workers=args.workers, incremental=args.incremental, trees_per_update=args.trees_per_update, max_trees=args.max_trees, cv_mode=args.cv_mode, cv_max_rows=args.cv_max_rows, grid_m=args.grid_m, max_samples_per_sector=args.max_samples_per_sector, input_cache=args.input_cache, mmap_model=args.mmap_model)
         logging.info("Done.")
         for k,v in outs.items():
             if v: logging.info(f"{k}: {v}")
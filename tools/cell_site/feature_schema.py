@@ -0,0 +1,128 @@
+"""
+Fixed-schema feature encoder for distance-model inference.
+
+Training builds its matrix with `pd.get_dummies`, whose columns depend on the
+values present, and the model is fitted on whatever columns that produced.
+`compile_schema` freezes that outcome when the bundle is saved:
+
+    {"version": 1,
+     "features":    model column order,
+     "numeric":     [[position, name], ...]   raw or derived numeric columns,
+     "categorical": {"technology": {"lte": 8, "nan": 9}, ...}   value -> position,
+     "fill":        imputation constant per position (the imputer's statistics_)}
+
+`FeatureEncoder.encode` then fills one preallocated float32 matrix in that
+order, straight from a standardized frame: numeric columns are coerced once,
+categoricals are factorized once and mapped through the vocabulary, and NaN /
+±inf take the fill constant. No dummies, column alignment or imputer call at
+request time. Anything the schema does not know about is counted in the drift
+report instead of silently changing the matrix:
+
+- missing: schema columns the input cannot provide (encoded as 0, as before)
+- unseen:  categorical values absent from the vocabulary (all-zero one-hot)
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 1
+
+
+def compile_schema(features, categoricals, fill=None) -> dict:
+    """Schema for a trained feature list. One-hot columns are recognised by the `<categorical>_<value>`
+    names pd.get_dummies gives them; `fill` is the imputation constant per column (NaN: none)."""
+    numeric, vocab = [], {c: {} for c in categoricals}
+    for j, name in enumerate(features):
+        cat = next((c for c in categoricals if name.startswith(c + "_")), None)
+        if cat is None:
+            numeric.append([j, name])
+        else:
+            vocab[cat][name[len(cat) + 1:]] = j
+    fill = np.full(len(features), np.nan) if fill is None else np.asarray(fill, dtype=float)
+    if len(fill) != len(features):
+        raise ValueError(f"{len(fill)} imputation constants for {len(features)} features")
+    return {"version": SCHEMA_VERSION, "features": list(features), "numeric": numeric,
+            "categorical": {c: v for c, v in vocab.items() if v}, "fill": [float(v) for v in fill]}
+
+
+class FeatureEncoder:
+    """Encode standardized frames per a compiled schema.
+
+    `to_numeric(series) -> float ndarray` coerces a raw column; `derived` maps a feature name to
+    (source feature names, fn(*source arrays) -> ndarray) for features computed from other columns."""
+
+    def __init__(self, schema: dict, to_numeric, derived: dict = None):
+        if schema.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"Feature schema version {schema.get('version')!r}, expected {SCHEMA_VERSION}")
+        self.schema = schema
+        self.features = list(schema["features"])
+        self.fill = np.asarray(schema["fill"], dtype=float)
+        self.to_numeric = to_numeric
+        self.derived = derived or {}
+
+    @property
+    def n_features(self) -> int:
+        return len(self.features)
+
+    def _numeric(self, df: pd.DataFrame, name: str, cache: dict):
+        if name not in cache:
+            if name in self.derived:
+                sources, fn = self.derived[name]
+                args = [self._numeric(df, s, cache) for s in sources]
+                cache[name] = None if any(a is None for a in args) else np.asarray(fn(*args), dtype=float)
+            else:
+                cache[name] = self.to_numeric(df[name]) if name in df.columns else None
+        return cache[name]
+
+    def encode(self, df: pd.DataFrame, drift: dict = None) -> np.ndarray:
+        """(rows, n_features) float32 matrix, imputed. `drift`, if given, accumulates the drift report."""
+        n = len(df)
+        X = np.zeros((n, self.n_features), dtype=np.float32)
+        missing, unseen, cache = [], {}, {}
+        for j, name in self.schema["numeric"]:
+            v = self._numeric(df, name, cache)
+            if v is None:
+                missing.append(name)
+                continue
+            bad = ~np.isfinite(v)
+            if bad.any() and not np.isnan(self.fill[j]):
+                v = np.where(bad, self.fill[j], v)
+            elif bad.any():
+                v = np.where(bad, np.nan, v)
+            X[:, j] = v
+        for cat, vocab in self.schema["categorical"].items():
+            if cat not in df.columns:
+                missing.append(cat)
+                continue
+            codes, uniques = pd.factorize(df[cat], use_na_sentinel=True)
+            keys = [str(u).lower() for u in uniques]
+            lut = np.array([vocab.get(k, -1) for k in keys] + [vocab.get("nan", -1)], dtype=np.intp)
+            pos = lut[codes]                 # code -1 (missing) picks the trailing "nan" slot
+            hit = pos >= 0
+            X[np.flatnonzero(hit), pos[hit]] = 1.0
+            for k, c in zip(keys, np.bincount(codes[codes >= 0], minlength=len(keys))):
+                if k not in vocab and c:
+                    unseen.setdefault(cat, {})[k] = unseen.get(cat, {}).get(k, 0) + int(c)
+        if np.isnan(self.fill).any():
+            # no imputation constants (bundle without imputer): fall back to this batch's medians
+            for j in np.flatnonzero(np.isnan(self.fill)):
+                col = X[:, j]
+                nan = np.isnan(col)
+                if nan.any():
+                    col[nan] = np.nanmedian(col) if (~nan).any() else 0.0
+        if drift is not None:
+            drift["rows"] = drift.get("rows", 0) + n
+            for name in missing:
+                drift.setdefault("missing", {})[name] = drift.get("missing", {}).get(name, 0) + n
+            for cat, counts in unseen.items():
+                d = drift.setdefault("unseen", {}).setdefault(cat, {})
+                for k, c in counts.items():
+                    d[k] = d.get(k, 0) + c
+        return X
+
+
+def log_drift(drift: dict):
+    if drift.get("missing"):
+        logging.warning(f"Feature drift: input lacks {sorted(drift['missing'])}; encoded as 0")
+    for cat, counts in (drift.get("unseen") or {}).items():
+        logging.warning(f"Feature drift: {sum(counts.values())} row(s) with {cat} values unseen in training: {sorted(counts)[:10]}")
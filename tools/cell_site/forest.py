@@ -0,0 +1,181 @@
+"""
+Memory-mapped serving sidecar for RandomForest range models.
+
+sklearn's tree objects copy their node arrays into private buffers on
+unpickle, so `joblib.load(mmap_mode="r")` of a fitted forest still gives every
+gunicorn worker its own copy of all trees. `flatten_forest` turns the forest
+into a handful of flat NumPy arrays (all trees concatenated, child indices
+global), which joblib can memory-map: every worker maps the same file, and the
+tree pages are shared through the page cache.
+
+    arrays = flatten_forest(rf)                 # dict of contiguous arrays
+    FlatForest(arrays).predict(X)               # same predictions as rf.predict(X)
+
+`save_serving_bundle` writes `<bundle>.serve.joblib` next to the training
+bundle (imputer, features, meta and the flat arrays, but no sklearn forest),
+and `load_serving_bundle` maps it read-only. Training does not write it:
+cell_site_processing.load_serving_bundle(mmap=True) exports it on first use.
+
+FlatForest is the sidecar's predictor and is not used anywhere else. It only
+serves with CELL_SITE_MMAP_MODELS / --mmap-model, which trades predict speed
+for memory. The NumPy walk is slower than RandomForestRegressor.predict and
+has a higher transient peak (`benchmarks mmap_predict`). In exchange the trees
+are not copied into every worker (`benchmarks serve_memory`). By default
+bundles are served by sklearn.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+SERVE_SUFFIX = ".serve.joblib"
+FOREST_FORMAT = 2
+FOREST_ARRAYS = ("feature", "threshold", "children", "leaf", "missing_left", "value", "roots")
+PAIR_BUDGET = 150_000       # (tree, row) pairs walked per chunk; keeps the traversal state cache-sized
+COMPACT_EVERY = 4           # levels between drops of finished pairs from the active set
+
+
+def float32_floor(t: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each float64 threshold, so `x32 <= t64` and `x32 <= floor32(t)` route identically."""
+    t32 = t.astype(np.float32)
+    over = t32.astype(np.float64) > t
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+def flatten_forest(model) -> dict:
+    """Concatenate the nodes of every tree of a fitted single-output forest into contiguous arrays.
+
+    children   (n_nodes, 2) intp, global (left, right) node ids; a leaf points to itself on both sides
+    feature    int32 split feature (0 at leaves)
+    threshold  float32 split threshold rounded down (see float32_floor); +inf at leaves
+    leaf       bool, missing_left uint8 (where NaN goes), value float64 leaf output
+    roots      intp, first node of each tree
+    """
+    trees = [est.tree_ for est in model.estimators_]
+    counts = np.array([t.node_count for t in trees], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    left = np.concatenate([t.children_left for t in trees]).astype(np.int64)
+    right = np.concatenate([t.children_right for t in trees]).astype(np.int64)
+    own = np.concatenate([np.full(c, off) for c, off in zip(counts, offsets)])
+    leaf = left < 0
+    ids = np.arange(len(left))
+    children = np.stack([np.where(leaf, ids, left + own), np.where(leaf, ids, right + own)], axis=1).astype(np.intp)
+    threshold = float32_floor(np.concatenate([t.threshold for t in trees]).astype(np.float64))
+    threshold[leaf] = np.inf
+
+    def missing_left(t):
+        m = getattr(t, "missing_go_to_left", None)    # sklearn >= 1.3
+        return np.zeros(t.node_count, dtype=np.uint8) if m is None else np.asarray(m, dtype=np.uint8)
+
+    return {"format": FOREST_FORMAT,
+            "feature": np.where(leaf, 0, np.concatenate([t.feature for t in trees])).astype(np.int32),
+            "threshold": threshold, "children": np.ascontiguousarray(children), "leaf": leaf,
+            "missing_left": np.concatenate([missing_left(t) for t in trees]),
+            "value": np.concatenate([t.value[:, 0, 0] for t in trees]).astype(np.float64),
+            "roots": offsets.astype(np.intp),
+            "n_features": int(model.n_features_in_)}
+
+
+class FlatForest:
+    """Predict-only view over `flatten_forest` arrays (plain or memory-mapped).
+
+    Rows are walked in chunks of about PAIR_BUDGET (tree, row) pairs, ordered tree-major so the node
+    gathers of one step stay within a few trees. Every step moves each active pair one level down with
+    a handful of `np.take` gathers; leaves loop onto themselves, so finished pairs are only dropped every
+    COMPACT_EVERY levels. Leaf values are summed over trees in tree order, like sklearn, then averaged.
+    Chunks run on `n_jobs` threads (np.take releases the GIL). Several gathers per level make it slower
+    than sklearn's compiled traversal; it exists for memory-mapped serving only (see module docstring)."""
+
+    def __init__(self, arrays: dict):
+        if arrays.get("format") != FOREST_FORMAT:
+            raise ValueError(f"Flat forest format {arrays.get('format')!r}, expected {FOREST_FORMAT}; re-export the bundle")
+        self.arrays = arrays
+        for name in FOREST_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_features_in_ = int(arrays["n_features"])
+        self.n_estimators = len(self.roots)
+        self._child = self.children.reshape(-1)       # left of node i at 2i, right at 2i+1
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(self.arrays[a].nbytes for a in FOREST_ARRAYS))
+
+    def _leaves(self, xb: np.ndarray) -> np.ndarray:
+        """Leaf node id per (tree, row) pair of one chunk, shape (n_trees * rows,)."""
+        T, (m, n_feat) = self.n_estimators, xb.shape
+        flat = xb.reshape(-1)
+        node = np.repeat(np.asarray(self.roots, dtype=np.intp), m)
+        roff = np.tile(np.arange(m, dtype=np.intp) * n_feat, T)
+        has_nan = bool(np.isnan(xb).any())
+        out, act, step = node, None, 0
+        while len(node):
+            xi = np.take(self.feature, node, mode="wrap") + roff
+            xv = np.take(flat, xi, mode="wrap")
+            right = xv > np.take(self.threshold, node, mode="wrap")
+            if has_nan:
+                miss = np.flatnonzero(np.isnan(xv))
+                right[miss] = np.take(self.missing_left, node[miss]) == 0
+            node <<= 1
+            node += right
+            node = np.take(self._child, node, mode="wrap")
+            step += 1
+            if step % COMPACT_EVERY:
+                continue
+            done = np.take(self.leaf, node, mode="wrap")
+            if act is None:
+                out, act = node, np.arange(len(node), dtype=np.intp)    # `out` now shares nothing with `node`
+            if done.any():
+                k = np.flatnonzero(done)
+                out[act[k]] = node[k]
+                k = np.flatnonzero(~done)
+                node, roff, act = node[k], roff[k], act[k]
+        return out
+
+    def predict(self, X, chunk_rows: int = None, n_jobs: int = None) -> np.ndarray:
+        # sklearn routes float32 inputs; thresholds are pre-rounded so a float32 compare is exact
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, n_feat = X.shape
+        if n_feat != self.n_features_in_:
+            raise ValueError(f"X has {n_feat} features, the forest expects {self.n_features_in_}")
+        T = self.n_estimators
+        chunk = max(1, int(chunk_rows or PAIR_BUDGET // max(T, 1)))
+        out = np.empty(n, dtype=np.float64)
+
+        def run(s):
+            xb = X[s:s + chunk]
+            out[s:s + len(xb)] = np.take(self.value, self._leaves(xb)).reshape(T, len(xb)).sum(axis=0) / T
+
+        starts = range(0, n, chunk)
+        n_jobs = min(len(starts), n_jobs or os.cpu_count() or 1)
+        if n_jobs <= 1:
+            for s in starts:
+                run(s)
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as ex:
+                list(ex.map(run, starts))
+        return out
+
+
+def serving_path(model_path: str) -> str:
+    base = model_path[:-len(".joblib")] if model_path.endswith(".joblib") else model_path
+    return base + SERVE_SUFFIX
+
+
+def save_serving_bundle(bundle: dict, model_path: str) -> str:
+    """Write the predict-only sidecar of a training bundle. Uncompressed, so it can be memory-mapped."""
+    import joblib
+    path = serving_path(model_path)
+    serve = {k: v for k, v in bundle.items() if k != "model"}
+    serve["forest"] = flatten_forest(bundle["model"])
+    tmp = f"{path}.{os.getpid()}.tmp"       # workers exporting the same bundle at once each replace atomically
+    joblib.dump(serve, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_serving_bundle(path: str) -> dict:
+    """Map a serving sidecar read-only; the bundle's "model" is a FlatForest over the mapped arrays."""
+    import joblib
+    serve = joblib.load(path, mmap_mode="r")
+    serve["model"] = FlatForest(serve.pop("forest"))
+    return serve
@@ -0,0 +1,75 @@
+"""
+Vectorized geodesy kernels for the cell-site pipelines.
+
+Every function takes degrees and accepts scalars or NumPy arrays, broadcasting
+like a ufunc, so the same code serves one point or millions of samples:
+
+- haversine(lat1, lon1, lat2, lon2)        -> great-circle distance (m)
+- bearing(lat_site, lon_site, lat, lon)    -> initial bearing site->sample (deg, [0,360))
+- bearing_distance(...)                     -> (bearing, haversine) from one set of shared terms
+- meters_to_offsets(dNorth, dEast, lat)    -> (lat + dLat, dLon) in degrees
+- offset_point(lat, lon, dNorth, dEast)    -> absolute (lat, lon) shifted by metres
+- pairwise_haversine(pts, candidates)      -> (n_candidates, n_points) distance matrix
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0      # mean radius, used for distances
+WGS84_A_M = 6378137.0           # equatorial radius, used for metre<->degree offsets
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dl = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dl / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bearing(lat_site, lon_site, lat, lon):
+    phi1, phi2 = np.radians(lat_site), np.radians(lat)
+    dlon = np.radians(np.subtract(lon, lon_site))
+    y = np.sin(dlon) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlon)
+    return (np.degrees(np.arctan2(y, x)) + 360.0) % 360.0
+
+
+def bearing_distance(lat_site, lon_site, lat, lon):
+    """(bearing(...), haversine(...)) site->sample, bit-identical to the two calls but computing the
+    radians and the cosines they share once."""
+    phi1, phi2 = np.radians(lat_site), np.radians(lat)
+    dphi = np.radians(np.subtract(lat, lat_site))
+    dl = np.radians(np.subtract(lon, lon_site))
+    c1, c2 = np.cos(phi1), np.cos(phi2)
+    y = np.sin(dl) * c2
+    x = c1 * np.sin(phi2) - np.sin(phi1) * c2 * np.cos(dl)
+    a = np.sin(dphi / 2.0) ** 2 + c1 * c2 * np.sin(dl / 2.0) ** 2
+    return ((np.degrees(np.arctan2(y, x)) + 360.0) % 360.0,
+            2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))))
+
+
+def meters_to_offsets(dNorth, dEast, base_lat):
+    """Legacy contract: absolute latitude, but longitude *offset* only (add it to a base lon yourself)."""
+    dLat = np.asarray(dNorth, dtype=float) / WGS84_A_M
+    dLon = np.asarray(dEast, dtype=float) / (WGS84_A_M * np.cos(np.radians(base_lat)))
+    return base_lat + np.degrees(dLat), np.degrees(dLon)
+
+
+def offset_point(lat, lon, dNorth, dEast):
+    lat_o, dlon = meters_to_offsets(dNorth, dEast, lat)
+    return lat_o, np.add(lon, dlon)
+
+
+def offsets_to_meters(lat, lon, base_lat, base_lon):
+    """Inverse of offset_point: local north/east metres of (lat, lon) relative to a base point."""
+    dNorth = np.radians(np.subtract(lat, base_lat)) * WGS84_A_M
+    dEast = np.radians(np.subtract(lon, base_lon)) * WGS84_A_M * np.cos(np.radians(base_lat))
+    return dNorth, dEast
+
+
+def pairwise_haversine(lat_pts, lon_pts, lat_cand, lon_cand):
+    """Distances from every candidate (rows) to every point (columns)."""
+    lat_c = np.asarray(lat_cand, dtype=float).reshape(-1, 1)
+    lon_c = np.asarray(lon_cand, dtype=float).reshape(-1, 1)
+    lat_p = np.asarray(lat_pts, dtype=float).reshape(1, -1)
+    lon_p = np.asarray(lon_pts, dtype=float).reshape(1, -1)
+    return haversine(lat_c, lon_c, lat_p, lon_p)
@@ -0,0 +1,398 @@
+"""
+Background job queue for cell-site runs.
+
+`/api/cell-site/upload` saves the file, enqueues a job and answers at once;
+runner threads pick jobs up and execute each one in its own process, so an
+HTTP worker never blocks on a pipeline and a job can be cancelled by
+terminating that process.
+
+    store = store_from_config(app.config)      # Redis with REDIS_URL, else SQLite
+    job_id = submit(store, filepath, params, outdir, settings)
+    JobRunner(store, workers=2).start()
+    store.get(job_id)                          # status, progress, result, error
+    cancel(store, job_id)
+
+Backends share one interface (create / get / update / claim / request_cancel /
+counts). The SQLite store is a single file that every process on the host
+opens, claims are atomic (BEGIN IMMEDIATE), so several gunicorn workers can run
+runners against it. The Redis store keeps one hash per job and a FIFO list of
+queued ids, so runners on any host share it.
+
+A job's record: id, status (queued | running | done | failed | cancelled),
+created / started / finished (epoch s), params, settings (CELL_SITE_* config),
+filepath, outdir, progress ({"message", "updated"}: the pipeline's latest log
+line), result (the response CellSiteService.run builds), error, cancel flag,
+pid and heartbeat of the process running it. A running job whose heartbeat is
+older than STALE_AFTER_S (its runner died) reads as failed.
+
+Run dedicated runners (e.g. with CELL_SITE_JOB_WORKERS=0 in the web app):
+
+    python -m tools.cell_site.jobs --workers 2
+"""
+import argparse, json, logging, multiprocessing, os, shutil, sqlite3, threading, time, traceback, uuid
+from contextlib import closing
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except Exception:
+    REDIS_AVAILABLE = False
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINAL_STATES = {"done", "failed", "cancelled"}
+JSON_FIELDS = ("params", "settings", "progress", "result")
+POLL_S = 1.0                 # runner poll interval for new jobs, cancel flags and heartbeats
+STALE_AFTER_S = 60.0         # running jobs without a heartbeat for this long read as failed
+PROGRESS_EVERY_S = 1.0       # child processes write at most one progress update per interval
+
+
+def new_job_id() -> str:
+    """Sortable, collision-free id: epoch seconds + random suffix."""
+    return f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+
+
+def _reconcile(store, job):
+    """Mark a running job whose runner stopped heartbeating as failed (lazily, on read)."""
+    if job and job["status"] == "running" and time.time() - float(job.get("heartbeat") or 0) > STALE_AFTER_S:
+        store.update(job["id"], status="failed", finished=time.time(), error="Job runner stopped responding")
+        job = store.get(job["id"], reconcile=False)
+    return job
+
+
+class SqliteJobStore:
+    COLUMNS = ("id", "status", "created", "started", "finished", "filepath", "outdir", "params", "settings",
+               "progress", "result", "error", "cancel", "pid", "heartbeat", "cache_key")
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, created REAL, started REAL, "
+                        "finished REAL, filepath TEXT, outdir TEXT, params TEXT, settings TEXT, progress TEXT, result TEXT, "
+                        "error TEXT, cancel INTEGER DEFAULT 0, pid INTEGER, heartbeat REAL, cache_key TEXT)")
+            con.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created)")
+            have = {r[1] for r in con.execute("PRAGMA table_info(jobs)")}
+            for c in ("cache_key",):     # columns added after the first release of the table
+                if c not in have:
+                    con.execute(f"ALTER TABLE jobs ADD COLUMN {c} TEXT")
+
+    @property
+    def spec(self):
+        return ("sqlite", self.path)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        for k in JSON_FIELDS:
+            job[k] = json.loads(job[k]) if job[k] else None
+        job["cancel"] = bool(job["cancel"])
+        return job
+
+    def create(self, job: dict):
+        job = {**job, **{k: json.dumps(job[k]) for k in JSON_FIELDS if job.get(k) is not None}}
+        cols = [c for c in self.COLUMNS if c in job]
+        with closing(self._connect()) as con:
+            con.execute(f"INSERT INTO jobs ({','.join(cols)}) VALUES ({','.join('?' * len(cols))})", [job[c] for c in cols])
+
+    def get(self, job_id: str, reconcile: bool = True):
+        with closing(self._connect()) as con:
+            job = self._row(con.execute(f"SELECT {','.join(self.COLUMNS)} FROM jobs WHERE id=?", (job_id,)).fetchone())
+        return _reconcile(self, job) if reconcile else job
+
+    def update(self, job_id: str, **fields):
+        fields = {k: (json.dumps(v) if k in JSON_FIELDS and v is not None else v) for k, v in fields.items()}
+        with closing(self._connect()) as con:
+            con.execute(f"UPDATE jobs SET {','.join(f'{k}=?' for k in fields)} WHERE id=?", [*fields.values(), job_id])
+
+    def claim(self):
+        """Oldest queued job, atomically switched to running; None when the queue is empty."""
+        con = self._connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute("SELECT id FROM jobs WHERE status='queued' ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                con.execute("COMMIT")
+                return None
+            now = time.time()
+            con.execute("UPDATE jobs SET status='running', started=?, heartbeat=? WHERE id=?", (now, now, row[0]))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+        return self.get(row[0], reconcile=False)
+
+    def request_cancel(self, job_id: str):
+        """Flag a job for cancellation; a queued one is cancelled on the spot. Returns the job (None if unknown)."""
+        with closing(self._connect()) as con:
+            con.execute("UPDATE jobs SET cancel=1 WHERE id=? AND status IN ('queued','running')", (job_id,))
+            con.execute("UPDATE jobs SET status='cancelled', finished=? WHERE id=? AND status='queued'", (time.time(), job_id))
+        return self.get(job_id)
+
+    def counts(self) -> dict:
+        with closing(self._connect()) as con:
+            rows = con.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {**{s: 0 for s in JOB_STATES}, **dict(rows)}
+
+
+class RedisJobStore:
+    def __init__(self, url: str, prefix: str = "cellsite:jobs"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis not available. Install: pip install redis")
+        self.url, self.prefix = url, prefix
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+
+    @property
+    def spec(self):
+        return ("redis", self.url)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _encode(self, fields: dict) -> dict:
+        out = {}
+        for k, v in fields.items():
+            if k in JSON_FIELDS or k == "cancel":
+                v = json.dumps(v)
+            out[k] = "" if v is None else v
+        return out
+
+    def create(self, job: dict):
+        pipe = self.r.pipeline()
+        pipe.hset(self._key(job["id"]), mapping=self._encode({"cancel": False, **job}))
+        pipe.rpush(f"{self.prefix}:queue", job["id"])
+        pipe.execute()
+
+    def get(self, job_id: str, reconcile: bool = True):
+        raw = self.r.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = {k: (v if v != "" else None) for k, v in raw.items()}
+        for k in JSON_FIELDS + ("cancel",):
+            job[k] = json.loads(job[k]) if job.get(k) else None
+        for k in ("created", "started", "finished", "heartbeat"):
+            job[k] = float(job[k]) if job.get(k) else None
+        job["cancel"] = bool(job["cancel"])
+        return _reconcile(self, job) if reconcile else job
+
+    def update(self, job_id: str, **fields):
+        self.r.hset(self._key(job_id), mapping=self._encode(fields))
+
+    def claim(self):
+        """Pop queued ids until one is still queued (cancelled ones are skipped) and mark it running."""
+        while True:
+            job_id = self.r.lpop(f"{self.prefix}:queue")
+            if job_id is None:
+                return None
+            now = time.time()
+            # only the runner that flips queued -> running owns the job
+            with self.r.pipeline() as pipe:
+                try:
+                    pipe.watch(self._key(job_id))
+                    if pipe.hget(self._key(job_id), "status") != "queued":
+                        pipe.unwatch()
+                        continue
+                    pipe.multi()
+                    pipe.hset(self._key(job_id), mapping={"status": "running", "started": now, "heartbeat": now})
+                    pipe.execute()
+                except redis.WatchError:
+                    continue
+            return self.get(job_id, reconcile=False)
+
+    def request_cancel(self, job_id: str):
+        job = self.get(job_id, reconcile=False)
+        if job is None or job["status"] in FINAL_STATES:
+            return job
+        fields = {"cancel": True}
+        if job["status"] == "queued":
+            fields.update(status="cancelled", finished=time.time())
+        self.update(job_id, **fields)
+        return self.get(job_id)
+
+    def counts(self) -> dict:
+        out = {s: 0 for s in JOB_STATES}
+        for key in self.r.scan_iter(f"{self.prefix}:*"):
+            if key.count(":") == self.prefix.count(":") + 1 and not key.endswith(":queue"):
+                status = self.r.hget(key, "status")
+                out[status] = out.get(status, 0) + 1
+        return out
+
+
+def open_store(spec):
+    kind, where = spec
+    return RedisJobStore(where) if kind == "redis" else SqliteJobStore(where)
+
+
+def store_from_config(config):
+    """Redis when REDIS_URL is set (and the client is installed), else SQLite at CELL_SITE_JOB_DB
+    (default: cellsite_jobs.sqlite3 in OUTPUT_FOLDER)."""
+    url = config.get('REDIS_URL')
+    if url:
+        if REDIS_AVAILABLE:
+            return RedisJobStore(url)
+        logging.warning("REDIS_URL is set but the redis client is not installed; using the SQLite job queue")
+    path = config.get('CELL_SITE_JOB_DB') or os.path.join(config.get('OUTPUT_FOLDER', '.'), 'cellsite_jobs.sqlite3')
+    return SqliteJobStore(path)
+
+
+def job_settings(config) -> dict:
+    """The CELL_SITE_* settings (and OUTPUT_FOLDER) a job needs, as a plain (JSON-safe) dict."""
+    return {k: v for k, v in config.items() if (k.startswith('CELL_SITE_') or k == 'OUTPUT_FOLDER')
+            and isinstance(v, (str, int, float, bool, type(None)))}
+
+
+def submit(store, filepath: str, params: dict, outdir: str, settings: dict, job_id: str = None, cache_key: str = None) -> str:
+    """Queue a saved upload; with `cache_key` the finished run is stored in the result cache."""
+    job_id = job_id or new_job_id()
+    store.create({"id": job_id, "status": "queued", "created": time.time(), "filepath": filepath, "outdir": outdir,
+                  "params": params, "settings": settings, "progress": {"message": "queued", "updated": time.time()},
+                  "cache_key": cache_key})
+    return job_id
+
+
+def drop_upload(job: dict):
+    """Remove a job's upload directory (not for jobs reusing a cached standardized input)."""
+    if job.get("filepath") and not (job.get("params") or {}).get("input_id"):
+        shutil.rmtree(os.path.dirname(job["filepath"]), ignore_errors=True)
+
+
+def cancel(store, job_id: str):
+    """Request cancellation (see request_cancel); a job cancelled while still queued also drops its upload.
+    A running job is stopped by its runner."""
+    job = store.request_cancel(job_id)
+    if job is not None and job["status"] == "cancelled":
+        drop_upload(job)
+    return job
+
+
+def job_view(job: dict) -> dict:
+    """Public status of a job: everything but internal paths, settings and process bookkeeping."""
+    end = job.get("finished") or (time.time() if job.get("started") else None)
+    return {"job_id": job["id"], "status": job["status"], "method": (job.get("params") or {}).get("method"),
+            "created": job.get("created"), "started": job.get("started"), "finished": job.get("finished"),
+            "elapsed_s": round(end - job["started"], 1) if end and job.get("started") else None,
+            "progress": job.get("progress"), "cancel_requested": job.get("cancel", False),
+            "result": job.get("result"), "error": job.get("error")}
+
+
+class ProgressHandler(logging.Handler):
+    """Copies the pipeline's log lines into the job's progress field, at most once per `every` seconds
+    (the last line of a burst is kept and flushed with the next one)."""
+    def __init__(self, store, job_id: str, every: float = PROGRESS_EVERY_S):
+        super().__init__(logging.INFO)
+        self.store, self.job_id, self.every = store, job_id, every
+        self._last = 0.0
+
+    def emit(self, record):
+        now = time.time()
+        if now - self._last < self.every:
+            return
+        self._last = now
+        try:
+            self.store.update(self.job_id, progress={"message": record.getMessage()[:500], "updated": now})
+        except Exception:
+            pass
+
+
+def execute_job(spec, job_id: str):
+    """Child-process entry point: run one claimed job and record its result or error."""
+    from .services import CellSiteService
+    from .result_cache import ResultCache
+    store = open_store(spec)
+    job = store.get(job_id, reconcile=False)
+    settings = job["settings"] or {}
+    cache = ResultCache.from_config(settings) if job.get("cache_key") else None
+    try:
+        result = CellSiteService().run(job["filepath"], job["params"], job["outdir"], settings, cleanup_dir=True,
+                                       log_handler=ProgressHandler(store, job_id), cache=cache, cache_key=job.get("cache_key"))
+        store.update(job_id, status="done", finished=time.time(), result=result,
+                     progress={"message": "done", "updated": time.time()})
+    except Exception as e:
+        store.update(job_id, status="failed", finished=time.time(), error=f"{type(e).__name__}: {e}",
+                     progress={"message": traceback.format_exc(limit=3)[-500:], "updated": time.time()})
+
+
+class JobRunner:
+    """`workers` threads that claim jobs from `store` and run each in a fresh (spawned) process,
+    heartbeating while it runs and terminating it when the job's cancel flag is set."""
+    def __init__(self, store, workers: int = 1, poll_s: float = POLL_S):
+        self.store, self.workers, self.poll_s = store, max(0, int(workers)), poll_s
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"cellsite-job-runner-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim()
+            except Exception as e:
+                logging.warning(f"Job queue unavailable: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_s)
+                continue
+            self.run_one(job)
+
+    def run_one(self, job: dict):
+        job_id = job["id"]
+        proc = self._ctx.Process(target=execute_job, args=(self.store.spec, job_id), name=f"cellsite-job-{job_id}")
+        proc.start()
+        self.store.update(job_id, pid=proc.pid, progress={"message": "starting", "updated": time.time()})
+        logging.info(f"Job {job_id} started (pid {proc.pid})")
+        while proc.is_alive():
+            proc.join(self.poll_s)
+            current = self.store.get(job_id, reconcile=False)
+            if current and current["cancel"] and proc.is_alive():
+                proc.terminate()
+                proc.join()
+                self.store.update(job_id, status="cancelled", finished=time.time(), progress={"message": "cancelled", "updated": time.time()})
+                drop_upload(job)
+                logging.info(f"Job {job_id} cancelled")
+                return
+            self.store.update(job_id, heartbeat=time.time())
+        current = self.store.get(job_id, reconcile=False)
+        if current and current["status"] == "running":
+            self.store.update(job_id, status="failed", finished=time.time(), error=f"Job process exited with code {proc.exitcode}")
+            drop_upload(job)
+        logging.info(f"Job {job_id} finished: {current['status'] if current else 'unknown'}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cell-site background job runner (same queue as the web app)")
+    ap.add_argument("--workers", type=int, default=1, help="Jobs run concurrently by this runner")
+    ap.add_argument("--env", default=os.getenv('FLASK_ENV', 'default'), help="Config name from config.py")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    from config import config
+    cfg = config.get(args.env, config['default'])
+    settings = {k: getattr(cfg, k) for k in dir(cfg) if k.isupper()}
+    store = store_from_config(settings)
+    logging.info(f"Job runner: {args.workers} worker(s) on {store.spec[0]} queue")
+    runner = JobRunner(store, workers=args.workers).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Process-wide cache of loaded ML bundles.
+
+A bundle (600-tree RandomForest + imputer + feature list) costs seconds and
+hundreds of MB to `joblib.load`, so every request used to pay for it. The
+registry keeps loaded bundles keyed by (absolute path, mtime, size): a
+retrained or replaced file gets a new key and is loaded fresh, and its stale
+entry is dropped. Entries are evicted least-recently-used once the estimated
+footprint exceeds `max_bytes`. The footprint is the file size on disk, which
+matches memory closely for the uncompressed dumps `save_bundle` writes.
+
+    from .model_registry import registry
+    bundle = registry.get("/models/distance_model.joblib")
+    registry.stats()   # hits / misses / evictions / entries / bytes
+    process_memory()   # this worker's RSS / PSS / private bytes
+
+Memory-mapped serving bundles (see forest.py) count their file size here too,
+but their pages are shared between workers; `process_memory` shows the
+difference per worker.
+"""
+import logging, os, threading, time
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+
+def file_key(path: str):
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+
+class ModelRegistry:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, loader=None):
+        self.max_bytes = int(max_bytes)
+        self._loader = loader
+        self._entries = OrderedDict()    # key -> (bundle, nbytes), least recently used first
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+
+    def _load(self, path: str, loader=None):
+        if loader is not None:
+            return loader(path)
+        if self._loader is not None:
+            return self._loader(path)
+        import joblib
+        return joblib.load(path)
+
+    def configure(self, max_bytes: int = None, loader=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = int(max_bytes)
+            if loader is not None:
+                self._loader = loader
+            self._evict()
+
+    def get(self, path: str, loader=None):
+        """The bundle at `path`, loaded at most once per (path, mtime, size) while it stays cached.
+        `loader` overrides the registry's loader for this file (e.g. a memory-mapping one)."""
+        key = file_key(path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            t0 = time.perf_counter()
+            bundle = self._load(path, loader)
+            logging.info(f"Model registry: loaded {key[0]} in {time.perf_counter() - t0:.2f}s")
+            self._insert(key, bundle)
+            return bundle
+
+    def put(self, path: str, bundle):
+        """Register a bundle that was just written to `path` so the next get() does not reload it."""
+        with self._lock:
+            self._insert(file_key(path), bundle)
+
+    def preload(self, paths, load=None):
+        """Warm the cache with `paths`; `load(path)` replaces get() (e.g. to pick a serving sidecar)."""
+        loaded = []
+        for p in paths:
+            try:
+                (load or self.get)(p)
+                loaded.append(p)
+            except Exception as e:
+                logging.warning(f"Model registry: preload of {p} failed: {e}")
+        return loaded
+
+    def _insert(self, key, bundle):
+        for old in [k for k in self._entries if k[0] == key[0] and k != key]:
+            del self._entries[old]     # same file, older mtime/size: superseded
+        self._entries[key] = (bundle, key[2])
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        # always keep the most recent entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and sum(n for _, n in self._entries.values()) > self.max_bytes:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": round(self.hits / total, 4) if total else None,
+                    "entries": len(self._entries), "bytes": int(sum(n for _, n in self._entries.values())),
+                    "max_bytes": self.max_bytes, "models": [k[0] for k in self._entries]}
+
+
+def process_memory() -> dict:
+    """RSS, PSS (shared pages split between the processes mapping them) and private bytes of this
+    process, from /proc/self/smaps_rollup. Empty where that file does not exist (non-Linux)."""
+    fields = {"Rss": "rss_bytes", "Pss": "pss_bytes", "Private_Clean": "private_bytes", "Private_Dirty": "private_bytes",
+              "Shared_Clean": "shared_bytes", "Shared_Dirty": "shared_bytes"}
+    out = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    out[fields[name]] = out.get(fields[name], 0) + int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return out
+
+
+registry = ModelRegistry()
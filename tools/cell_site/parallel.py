@@ -0,0 +1,73 @@
+"""
+Process-pool fan-out for per-sector work in the cell-site pipelines.
+
+Sector solves are independent, so the pipelines build one small task per sector
+(a tuple of NumPy arrays plus scalars, never a DataFrame) and push them through
+`SectorPool.map`. Results come back in task order, and each task runs the same
+kernel serially or in a worker, so outputs do not depend on the worker count.
+
+    with SectorPool(workers=4) as pool:
+        for out in pool.map(kernel, tasks):
+            ...
+
+`workers <= 1` runs in-process with no pool (and no pickling) at all. The worker
+processes are started on the first parallel `map` and reused until `close()`.
+"""
+import itertools, os, weakref
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_BATCH = 1024     # tasks submitted per round; bounds memory when tasks come from a spilled input
+
+
+def resolve_workers(workers) -> int:
+    """`None`/0/1 -> serial, negative -> all cores (like joblib's n_jobs=-1), otherwise capped at the core count."""
+    n_cpu = os.cpu_count() or 1
+    if not workers:
+        return 1
+    workers = int(workers)
+    if workers < 0:
+        return n_cpu
+    return max(1, min(workers, n_cpu))
+
+
+class SectorPool:
+    def __init__(self, workers: int = 1, batch_size: int = DEFAULT_BATCH):
+        self.workers = resolve_workers(workers)
+        self.batch_size = max(1, int(batch_size))
+        self._executor = None
+        self._finalizer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._finalizer = weakref.finalize(self, self._executor.shutdown, wait=False, cancel_futures=True)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._finalizer.detach()
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = self._finalizer = None
+
+    def map(self, fn, tasks):
+        """Yield `fn(*task)` for every task, in order. Tasks are pulled lazily in batches so a
+        generator over spilled partitions never has all sector slices in memory at once."""
+        if self.workers <= 1:
+            for task in tasks:
+                yield fn(*task)
+            return
+        executor = self._start()
+        it = iter(tasks)
+        while True:
+            batch = list(itertools.islice(it, self.batch_size))
+            if not batch:
+                return
+            chunk = max(1, len(batch) // (4 * self.workers))
+            yield from executor.map(fn, *zip(*batch), chunksize=chunk)
@@ -0,0 +1,143 @@
+"""
+Append-only, deduplicated replay store for continual training.
+
+Layout of a store directory (next to the model bundle):
+
+    distance_model_replay/
+        manifest.json        feature-column union, target name, parts with their own columns
+        index.npy            sorted uint64 hashes of every stored row (the dedup index)
+        part-000000.parquet  one part per training call: only that batch's new, unique rows
+
+Appending hashes the new batch, drops rows already in the index (or repeated
+within the batch), writes the rest as a new part and merges their hashes into
+the index. Existing parts are never read or rewritten. Reads load only the
+requested columns; a feature a part lacks reads as 0, as the old gzip CSV
+union did.
+
+Row hashes combine per-column `pd.util.hash_array` values with an
+order-independent sum that skips zeros, so a row hashes the same whatever the
+column order and however many (zero-filled) columns later batches add.
+
+Parts are Parquet when pyarrow is available, pickles otherwise.
+"""
+import json, logging, os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_hashes(X: pd.DataFrame) -> np.ndarray:
+    """uint64 per row over (column name, value) pairs, ignoring column order and zero-valued cells."""
+    h = np.zeros(len(X), dtype=np.uint64)
+    for c in X.columns:
+        v = X[c].to_numpy(dtype=float, na_value=np.nan, copy=True)
+        v[np.isnan(v)] = np.nan                    # one NaN bit pattern, hash_array hashes the raw bits
+        hc = pd.util.hash_array(np.array([str(c)], dtype=object))[0]
+        hv = (pd.util.hash_array(v) ^ hc) * _MIX
+        hv[v == 0] = 0
+        h += hv
+    return h
+
+
+def _atomic_write(path: str, write, mode: str = "w"):
+    """write(fileobj) to a temp file, then rename over `path` so readers never see a partial file."""
+    tmp = path + ".tmp"
+    with open(tmp, mode) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class ReplayStore:
+    def __init__(self, root: str, target: str = "target_distance_m"):
+        self.root = root
+        self.target = target
+        self._manifest_path = os.path.join(root, "manifest.json")
+        self._index_path = os.path.join(root, "index.npy")
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"version": 1, "target": target, "columns": [], "parts": [], "rows": 0}
+
+    @property
+    def columns(self):
+        """Feature columns (sorted union over all parts, target excluded)."""
+        return list(self.manifest["columns"])
+
+    @property
+    def rows(self) -> int:
+        return int(self.manifest["rows"])
+
+    def _index(self) -> np.ndarray:
+        return np.load(self._index_path) if os.path.exists(self._index_path) else np.empty(0, dtype=np.uint64)
+
+    def append(self, X_new: pd.DataFrame, y_new) -> int:
+        """Store the rows of (X_new, y_new) not seen before; returns how many were added."""
+        X = X_new.reset_index(drop=True).astype(float)
+        y = np.asarray(y_new, dtype=float)
+        h = row_hashes(X)
+        _, first = np.unique(h, return_index=True)
+        keep = np.zeros(len(X), dtype=bool)
+        keep[first] = True                         # first occurrence within the batch
+        index = self._index()
+        if len(index):
+            keep &= ~np.isin(h, index, assume_unique=False)
+        if not keep.any():
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        part = X.loc[keep].reset_index(drop=True)
+        part[self.target] = y[keep]
+        seq = len(self.manifest["parts"])
+        name = f"part-{seq:06d}.parquet" if PYARROW_AVAILABLE else f"part-{seq:06d}.pkl"
+        self._write_part(part, os.path.join(self.root, name))
+        _atomic_write(self._index_path, lambda f: np.save(f, np.union1d(index, h[keep])), mode="wb")
+        self.manifest["parts"].append({"file": name, "rows": int(keep.sum()), "columns": list(X.columns)})
+        self.manifest["columns"] = sorted(set(self.manifest["columns"]) | set(X.columns))
+        self.manifest["rows"] = int(self.manifest["rows"]) + int(keep.sum())
+        _atomic_write(self._manifest_path, lambda f: json.dump(self.manifest, f, indent=1))
+        return int(keep.sum())
+
+    def _write_part(self, df: pd.DataFrame, path: str):
+        if PYARROW_AVAILABLE:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+        else:
+            df.to_pickle(path)
+
+    def _read_part(self, part: dict, cols):
+        path = os.path.join(self.root, part["file"])
+        have = [c for c in cols if c == self.target or c in part["columns"]]
+        if part["file"].endswith(".parquet"):
+            return pq.read_table(path, columns=have).to_pandas()
+        return pd.read_pickle(path)[have]
+
+    def read(self, columns=None, target: bool = True) -> pd.DataFrame:
+        """Stored rows projected to `columns` (default: every feature), plus the target column."""
+        cols = self.columns if columns is None else list(columns)
+        want = cols + ([self.target] if target else [])
+        if not self.manifest["parts"]:
+            return pd.DataFrame(columns=want, dtype=float)
+        frames = [self._read_part(p, want).reindex(columns=want, fill_value=0.0) for p in self.manifest["parts"]]
+        return pd.concat(frames, ignore_index=True)
+
+    def migrate_csv(self, csv_path: str) -> int:
+        """One-off import of a legacy gzip CSV replay file; the file is renamed `*.migrated` afterwards."""
+        if not os.path.exists(csv_path):
+            return 0
+        if self.manifest["parts"]:
+            logging.warning(f"Replay store {self.root} already has data; leaving legacy {csv_path} untouched.")
+            return 0
+        # round_trip: the default fast parser can be off by an ulp, which would change the row hashes
+        rep = pd.read_csv(csv_path, compression="gzip", float_precision="round_trip")
+        y = rep.pop(self.target)
+        added = self.append(rep, y)
+        os.replace(csv_path, csv_path + ".migrated")
+        logging.info(f"Migrated {added}/{len(rep)} replay rows from {csv_path} -> {self.root}")
+        return added
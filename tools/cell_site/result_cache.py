@@ -0,0 +1,178 @@
+"""
+Content-addressed cache of finished cell-site runs.
+
+A run is keyed by the SHA-256 of the uploaded bytes together with the
+parameters that shape its outputs (method, min_samples, bin_size,
+soft_spacing, use_ta, ... and, for ML, the model file's path/mtime/size), so
+re-uploading the same drive test with the same settings returns the earlier
+run's response and output directory instead of recomputing it. `workers`
+and `async` are left out (outputs do not depend on them), and runs that
+train or update a model are never cached.
+
+Layout (default OUTPUT_FOLDER/cellsite_cache, or CELL_SITE_CACHE_DIR):
+
+    <key>.json     {"key", "output_dir", "response", "bytes", "created"}; the file's mtime is the last hit
+
+Outputs stay where the run wrote them (OUTPUT_FOLDER/<output_dir>); an entry
+only points at them. Entries older than `ttl_s` are dropped on read and on
+eviction; once cached outputs exceed `max_bytes`, the least recently hit
+entries are evicted. Evicting an entry only stops it being served from the
+cache: the run's outputs, and the /download links to them, stay. Deleting
+them as well is a separate retention choice, off by default
+(CELL_SITE_CACHE_DELETE_OUTPUTS / `delete_outputs`).
+
+    cache = ResultCache.from_config(app.config)
+    key = cache.key_for(filepath, params, app.config)
+    response = cache.get(key)       # None on a miss
+    cache.put(key, outdir, response)
+    cache.stats()                   # hits / misses / stores / evictions / entries / bytes
+
+Hit counters are per process, like the model registry's.
+"""
+import hashlib, json, logging, os, shutil, threading, time
+
+from .cell_site_processing import file_sha256
+
+CACHE_VERSION = 1                 # bump when a pipeline change alters outputs for the same inputs
+UNCACHED_PARAMS = {"workers", "async"}
+
+
+def cacheable(params: dict) -> bool:
+    """Runs that train or update a model have side effects beyond their outputs."""
+    return not (params.get("train_path") or params.get("update_model"))
+
+
+def model_version(model_path: str):
+    """(absolute path, mtime_ns, size) of the model bundle, None without one."""
+    if not model_path or not os.path.exists(model_path):
+        return None
+    st = os.stat(model_path)
+    return [os.path.abspath(model_path), st.st_mtime_ns, st.st_size]
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+class ResultCache:
+    def __init__(self, root: str, output_root: str, max_bytes: int, ttl_s: float, delete_outputs: bool = False):
+        self.root, self.output_root = root, output_root
+        self.max_bytes, self.ttl_s = int(max_bytes), float(ttl_s)
+        self.delete_outputs = bool(delete_outputs)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        output_root = config.get('OUTPUT_FOLDER', '.')
+        root = config.get('CELL_SITE_CACHE_DIR') or os.path.join(output_root, 'cellsite_cache')
+        return cls(root, output_root, int(config.get('CELL_SITE_CACHE_MB', 2048)) * 1024**2,
+                   float(config.get('CELL_SITE_CACHE_TTL_H', 72)) * 3600,
+                   delete_outputs=bool(config.get('CELL_SITE_CACHE_DELETE_OUTPUTS', False)))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_s > 0
+
+    def key_for(self, filepath: str, params: dict, config) -> str:
+        """SHA-256 over the upload's bytes, the output-shaping params and settings, and the model version."""
+        effective = {k: v for k, v in params.items() if k not in UNCACHED_PARAMS}
+        effective["ta_factors"] = config.get('CELL_SITE_TA_FACTORS') or ""
+        if params.get("method") == "ml":
+            effective["model_version"] = model_version(params.get("model_path"))
+        h = hashlib.sha256(f"cellsite-cache-v{CACHE_VERSION}".encode())
+        h.update(file_sha256(filepath).encode())
+        h.update(json.dumps(effective, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def _read(self, path: str):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key: str):
+        """The cached response for `key` (its last-hit time refreshed), or None when absent, expired or
+        its output directory is gone."""
+        path = self._path(key)
+        entry = self._read(path)
+        alive = (entry is not None and time.time() - entry["created"] <= self.ttl_s
+                 and os.path.isdir(os.path.join(self.output_root, entry["output_dir"])))
+        with self._lock:
+            if not alive:
+                self.misses += 1
+                if entry is not None:
+                    self._drop(path, entry)
+                return None
+            self.hits += 1
+        os.utime(path)
+        return entry["response"]
+
+    def put(self, key: str, outdir: str, response: dict):
+        """Record a finished run's response and output directory under `key`, then evict."""
+        entry = {"key": key, "output_dir": os.path.basename(outdir), "response": response,
+                 "bytes": _dir_bytes(outdir), "created": time.time()}
+        tmp = self._path(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self.stores += 1
+        self.evict()
+
+    def _entries(self):
+        """(path, entry, last hit) of every readable entry, least recently hit first."""
+        out = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                path = os.path.join(self.root, name)
+                entry = self._read(path)
+                if entry is not None:
+                    try:
+                        out.append((path, entry, os.path.getmtime(path)))
+                    except OSError:
+                        pass
+        return sorted(out, key=lambda e: e[2])
+
+    def _drop(self, path: str, entry: dict):
+        """Remove the index entry; the run's output directory too only with `delete_outputs`."""
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        if self.delete_outputs:
+            shutil.rmtree(os.path.join(self.output_root, entry["output_dir"]), ignore_errors=True)
+        self.evictions += 1
+
+    def evict(self):
+        """Drop expired entries, then the least recently hit ones while the total exceeds max_bytes
+        (the most recent entry is always kept)."""
+        entries = self._entries()
+        now = time.time()
+        with self._lock:
+            live = []
+            for path, entry, last in entries:
+                if now - entry["created"] > self.ttl_s:
+                    self._drop(path, entry)
+                else:
+                    live.append((path, entry))
+            total = sum(e["bytes"] for _, e in live)
+            while len(live) > 1 and total > self.max_bytes:
+                path, entry = live.pop(0)
+                total -= entry["bytes"]
+                self._drop(path, entry)
+                logging.info(f"Result cache: evicted {entry['output_dir']}")
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "evictions": self.evictions,
+                    "hit_rate": round(self.hits / total, 4) if total else None,
+                    "entries": len(entries), "bytes": int(sum(e["bytes"] for _, e, _ in entries)),
+                    "max_bytes": self.max_bytes, "ttl_s": self.ttl_s, "delete_outputs": self.delete_outputs}
@@ -1,37 +1,114 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, send_file, current_app, url_for
 from werkzeug.utils import secure_filename
+import multiprocessing
 import os
+import shutil
 import time
 import traceback
 from .services import CellSiteService
+from .model_registry import registry as model_registry, process_memory
+from . import cell_site_processing as site
+from . import jobs
+from .result_cache import ResultCache
 
 cell_site_bp = Blueprint('cell_site', __name__)
 service = CellSiteService()
 
+@cell_site_bp.record_once
+def init_model_registry(state):
+    """Size the process-wide model cache and warm it with CELL_SITE_PRELOAD_MODELS (as served: the
+    memory-mapped sidecars with CELL_SITE_MMAP_MODELS)."""
+    cfg = state.app.config
+    model_registry.configure(max_bytes=int(cfg.get('CELL_SITE_MODEL_CACHE_MB', 2048)) * 1024**2)
+    paths = [p.strip() for p in (cfg.get('CELL_SITE_PRELOAD_MODELS') or '').split(',') if p.strip()]
+    if paths:
+        mmap = bool(cfg.get('CELL_SITE_MMAP_MODELS', False))
+        loaded = model_registry.preload(paths, load=lambda p: site.load_serving_bundle(p, mmap=mmap))
+        state.app.logger.info(f"Preloaded {len(loaded)}/{len(paths)} cell-site model bundle(s)")
+
+@cell_site_bp.record_once
+def init_result_cache(state):
+    """Result cache of finished runs (CELL_SITE_CACHE_MB / CELL_SITE_CACHE_TTL_H, 0 disables it; outputs are kept
+    on eviction unless CELL_SITE_CACHE_DELETE_OUTPUTS)."""
+    state.app.extensions['cell_site_cache'] = ResultCache.from_config(state.app.config)
+
+@cell_site_bp.record_once
+def init_job_queue(state):
+    """Open the job queue (Redis with REDIS_URL, else SQLite) and start CELL_SITE_JOB_WORKERS runner threads."""
+    cfg = state.app.config
+    store = jobs.store_from_config(cfg)
+    state.app.extensions['cell_site_jobs'] = store
+    workers = int(cfg.get('CELL_SITE_JOB_WORKERS', 1))
+    # job processes re-import the app module under spawn (before parent_process() is set, but after
+    # their name is); only the serving process runs runners
+    if workers > 0 and multiprocessing.current_process().name == 'MainProcess':
+        state.app.extensions['cell_site_job_runner'] = jobs.JobRunner(store, workers=workers).start()
+        state.app.logger.info(f"Cell-site job queue: {workers} runner(s) on {store.spec[0]}")
+
 @cell_site_bp.route('/health', methods=['GET'])
 def health():
     return jsonify({
         'status': 'healthy',
         'tool': 'Cell Site Locator',
         'version': '1.0.0',
-        'endpoints': ['/upload', '/download/<output_dir>/<filename>']
+        'endpoints': ['/upload', '/sweep', '/jobs/<job_id>', '/jobs/<job_id>/cancel', '/download/<output_dir>/<filename>', '/metrics'],
+        'model_cache': model_registry.stats(),
+        'process_memory': process_memory()
     })
 
+@cell_site_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({'model_cache': model_registry.stats(), 'process_memory': process_memory(),
+                    'jobs': current_app.extensions['cell_site_jobs'].counts(),
+                    'result_cache': current_app.extensions['cell_site_cache'].stats()})
+
 @cell_site_bp.route('/upload', methods=['POST'])
 def upload_file():
-    """Upload and process cell site data"""
+    """Upload and process cell site data (or rerun an earlier upload by its `input_id`)"""
+    return start_run()
+
+@cell_site_bp.route('/sweep', methods=['POST'])
+def sweep():
+    """Upload (or `input_id`) plus a NO-ML parameter `grid`, e.g. bin_size=1,3,5;min_samples=20,30 or its JSON:
+    every configuration is run in one pass and its outputs tagged (see run_noml_sweep)"""
+    if request.form.get('method', 'noml') != 'noml':
+        return jsonify({'error': 'Sweeps are NO-ML only'}), 400
+    try:
+        grid = site.parse_sweep_grid(request.form.get('grid'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid grid: {e}', 'sweepable': list(site.SWEEP_PARAMS)}), 400
+    n_configs = len(site.sweep_configs(grid, {p: None for p in site.SWEEP_PARAMS}))
+    max_configs = int(current_app.config.get('CELL_SITE_SWEEP_MAX_CONFIGS', 50))
+    if n_configs > max_configs:
+        return jsonify({'error': f'Grid has {n_configs} configurations (max {max_configs})'}), 400
+    return start_run({'sweep': grid})
+
+def start_run(extra_params=None):
+    """Validate the upload form and run it inside the request, or queue it (CELL_SITE_ASYNC / form `async`)"""
     try:
-        if 'file' not in request.files:
+        # A previous response's input_id stands in for the file: the run starts from its standardized frame
+        input_id = request.form.get('input_id')
+        input_path = service.reusable_input(input_id, current_app.config) if input_id else None
+        if input_id and input_path is None:
+            return jsonify({'error': 'Unknown or expired input_id', 'input_id': input_id}), 404
+        
+        file = request.files.get('file')
+        if input_path is None and file is None:
             return jsonify({'error': 'No file provided'}), 400
         
-        file = request.files['file']
-        if file.filename == '':
+        if input_path is None and file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if not service.allowed_file(file.filename):
+        if input_path is None and not service.allowed_file(file.filename):
             return jsonify({
                 'error': 'Invalid file type',
-                'allowed': ['csv', 'xlsx', 'xls']
+                'allowed': sorted(service.ALLOWED_EXTENSIONS)
+            }), 400
+        
+        if request.form.get('output_format') and request.form['output_format'].lower() not in service.OUTPUT_FORMATS:
+            return jsonify({
+                'error': 'Invalid output format',
+                'allowed': sorted(service.OUTPUT_FORMATS)
             }), 400
         
         # Extract parameters
@@ -43,20 +120,68 @@ def upload_file():
             'use_ta': request.form.get('use_ta', 'false').lower() == 'true',
             'make_map': request.form.get('make_map', 'false').lower() == 'true',
             'model_path': request.form.get('model_path'),
-            'train_path': request.form.get('train_path')
+            'train_path': request.form.get('train_path'),
+            'update_model': request.form.get('update_model', 'false').lower() == 'true',
+            'incremental': request.form.get('incremental', 'false').lower() == 'true',
+            'chunksize': int(request.form.get('chunksize', current_app.config.get('CELL_SITE_CHUNKSIZE', 0))),
+            'output_format': request.form.get('output_format', current_app.config.get('CELL_SITE_OUTPUT_FORMAT', 'csv')).lower(),
+            'workers': int(request.form.get('workers', current_app.config.get('CELL_SITE_WORKERS', 1))),
+            'grid_m': float(request.form.get('grid_m', current_app.config.get('CELL_SITE_GRID_M', 0))),
+            'max_samples_per_sector': int(request.form.get('max_samples_per_sector', current_app.config.get('CELL_SITE_MAX_SAMPLES_PER_SECTOR', 0)))
         }
+        if input_path:
+            params['input_id'] = input_id
+        params.update(extra_params or {})
         
-        current_app.logger.info(f"Processing file: {file.filename} with method: {params['method']}")
+        current_app.logger.info(f"Processing file: {os.path.basename(input_path) if input_path else file.filename} with method: {params['method']}")
         
-        # Process file
-        result = service.process_file(file, params)
+        if request.form.get('async', str(current_app.config.get('CELL_SITE_ASYNC', True))).lower() != 'true':
+            # Process file inside the request
+            result = service.process_file(file, params, input_path=input_path)
+            return jsonify(result), 200
         
-        return jsonify(result), 200
+        # Queue the file; a job runner processes it (see jobs.py)
+        job_id = jobs.new_job_id()
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], f'cellsite_{job_id}')
+        filepath = input_path or service.save_upload(file, upload_dir)
+        cache_key, hit = service.lookup_cache(current_app.extensions['cell_site_cache'], filepath, params, current_app.config)
+        if hit is not None:
+            if not input_path:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            return jsonify(hit), 200
+        outdir = os.path.join(current_app.config['OUTPUT_FOLDER'], f'cellsite_{job_id}')
+        jobs.submit(current_app.extensions['cell_site_jobs'], filepath, params, outdir,
+                    jobs.job_settings(current_app.config), job_id=job_id, cache_key=cache_key)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': url_for('cell_site.job_status', job_id=job_id),
+            'cancel_url': url_for('cell_site.cancel_job', job_id=job_id)
+        }), 202
         
     except Exception as e:
         current_app.logger.error(f"Upload error: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'error': str(e), 'type': type(e).__name__}), 500
 
+@cell_site_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status, progress, and (once done) the result file list of a queued upload"""
+    job = current_app.extensions['cell_site_jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(jobs.job_view(job)), 200
+
+@cell_site_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job (a running one is stopped by its runner within a second or so)"""
+    job = jobs.cancel(current_app.extensions['cell_site_jobs'], job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in jobs.FINAL_STATES and not job['cancel']:
+        return jsonify({'error': f"Job already {job['status']}", **jobs.job_view(job)}), 409
+    return jsonify(jobs.job_view(job)), 202 if job['status'] == 'running' else 200
+
 @cell_site_bp.route('/download/<output_dir>/<filename>', methods=['GET'])
 def download_file(output_dir, filename):
     """Download generated files"""
@@ -1,28 +1,43 @@
 from flask import current_app
 from werkzeug.utils import secure_filename
+import logging
 import os
+import shutil
 import time
 
 # Import the renamed module (avoid conflict with Python's built-in 'site')
 from . import cell_site_processing as site
+from . import result_cache
 
 class CellSiteService:
     
-    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'parquet', 'pq', 'feather', 'arrow'}
+    OUTPUT_FORMATS = set(site.OUTPUT_FORMATS)
     
     def allowed_file(self, filename):
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in self.ALLOWED_EXTENSIONS
     
-    def process_file(self, file, params):
-        """Process uploaded cell site file"""
+    def process_file(self, file, params, input_path=None):
+        """Process uploaded cell site file (or, with `input_path`, a reused standardized input)"""
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        if input_path:
+            filepath = input_path
+        else:
+            # Save uploaded file
+            filename = secure_filename(file.filename)
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            file.save(filepath)
+            
+            current_app.logger.info(f"File saved: {filepath}")
         
-        current_app.logger.info(f"File saved: {filepath}")
+        # Same bytes + parameters as a cached run: answer from its outputs
+        cache = current_app.extensions.get('cell_site_cache')
+        cache_key, hit = self.lookup_cache(cache, filepath, params, current_app.config)
+        if hit is not None:
+            if not input_path:
+                os.remove(filepath)
+            return hit
         
         # Create output directory
         timestamp = str(int(time.time()))
@@ -30,16 +45,73 @@ class CellSiteService:
             current_app.config['OUTPUT_FOLDER'],
             f'cellsite_{timestamp}'
         )
+        return self.run(filepath, params, outdir, current_app.config, current_app.logger, cache=cache, cache_key=cache_key)
+    
+    def lookup_cache(self, cache, filepath, params, config):
+        """(cache key, cached response or None) for a saved upload; the key is None when the cache is off
+        or the run is not cacheable (see result_cache.py)."""
+        if cache is None or not cache.enabled or not result_cache.cacheable(params):
+            return None, None
+        key = cache.key_for(filepath, params, config)
+        hit = cache.get(key)
+        return key, (None if hit is None else {**hit, 'cache': 'hit'})
+    
+    def input_cache_dir(self, config):
+        """Directory of standardized inputs (CELL_SITE_INPUT_CACHE_DIR, default OUTPUT_FOLDER/cellsite_inputs),
+        None when CELL_SITE_INPUT_CACHE_MB is 0."""
+        if float(config.get('CELL_SITE_INPUT_CACHE_MB', 4096)) <= 0:
+            return None
+        return config.get('CELL_SITE_INPUT_CACHE_DIR') or os.path.join(config.get('OUTPUT_FOLDER', '.'), 'cellsite_inputs')
+    
+    def reusable_input(self, input_id, config):
+        """Standardized artifact of an earlier upload's `input_id`, None if unknown or evicted"""
+        return site.find_standardized(self.input_cache_dir(config), input_id)
+    
+    def save_upload(self, file, upload_dir):
+        """Save an uploaded file into its own directory (one per queued job, so names never collide)"""
+        os.makedirs(upload_dir, exist_ok=True)
+        filepath = os.path.join(upload_dir, secure_filename(file.filename))
+        file.save(filepath)
+        return filepath
+    
+    def run(self, filepath, params, outdir, config, logger=None, cleanup_dir=False, log_handler=None, cache=None, cache_key=None):
+        """Run the pipeline on a saved upload and build the response. Needs no request context: `config`
+        is any mapping with the CELL_SITE_* settings, so background jobs (see jobs.py) call it directly.
+        `log_handler` also receives the run's log (job progress). With `cache_key`, the response is stored
+        in `cache`. The upload is removed afterwards (its whole directory with `cleanup_dir`)."""
+        logger = logger or logging.getLogger(__name__)
         os.makedirs(outdir, exist_ok=True)
         
-        current_app.logger.info(f"Output directory: {outdir}")
+        logger.info(f"Output directory: {outdir}")
         
         # Setup logger from cell_site_processing.py
         site.setup_logger(outdir, tag=params['method'])
+        if log_handler is not None:
+            logging.getLogger().addHandler(log_handler)
         
         # Process based on method
         try:
-            if params['method'] == 'noml':
+            if params.get('sweep'):
+                results = site.run_noml_sweep(
+                    input_path=filepath,
+                    outdir=outdir,
+                    grid=params['sweep'],
+                    min_samples=params.get('min_samples', 30),
+                    bin_size=params.get('bin_size', 5),
+                    soft_spacing=params.get('soft_spacing', False),
+                    use_ta=params.get('use_ta', False),
+                    make_map=params.get('make_map', False),
+                    chunksize=params.get('chunksize') or None,
+                    spill_dir=config.get('CELL_SITE_SPILL_DIR'),
+                    output_format=params.get('output_format', 'csv'),
+                    workers=params.get('workers', 1),
+                    ta_factors=config.get('CELL_SITE_TA_FACTORS'),
+                    grid_m=params.get('grid_m') or None,
+                    max_samples_per_sector=params.get('max_samples_per_sector') or None,
+                    input_cache=self.input_cache_dir(config),
+                    input_cache_mb=float(config.get('CELL_SITE_INPUT_CACHE_MB', 4096))
+                )
+            elif params['method'] == 'noml':
                 results = site.run_noml(
                     input_path=filepath,
                     outdir=outdir,
@@ -48,43 +120,81 @@ class CellSiteService:
                     soft_spacing=params.get('soft_spacing', False),
                     use_ta=params.get('use_ta', False),
                     make_map=params.get('make_map', False),
-                    merge_sites=params.get('soft_spacing', False)
+                    merge_sites=params.get('soft_spacing', False),
+                    chunksize=params.get('chunksize') or None,
+                    spill_dir=config.get('CELL_SITE_SPILL_DIR'),
+                    output_format=params.get('output_format', 'csv'),
+                    workers=params.get('workers', 1),
+                    ta_factors=config.get('CELL_SITE_TA_FACTORS'),
+                    grid_m=params.get('grid_m') or None,
+                    max_samples_per_sector=params.get('max_samples_per_sector') or None,
+                    input_cache=self.input_cache_dir(config),
+                    input_cache_mb=float(config.get('CELL_SITE_INPUT_CACHE_MB', 4096))
                 )
             else:  # ML method
                 results = site.run_ml(
                     train_path=params.get('train_path'),
                     model_path=params.get('model_path'),
+                    update_model=params.get('update_model', False),
+                    incremental=params.get('incremental', False),
+                    cv_mode=config.get('CELL_SITE_CV_MODE', 'auto'),
+                    cv_max_rows=config.get('CELL_SITE_CV_MAX_ROWS', 50000),
+                    mmap_model=bool(config.get('CELL_SITE_MMAP_MODELS', False)),
                     input_path=filepath,
                     outdir=outdir,
                     min_samples=params.get('min_samples', 30),
                     bin_size=params.get('bin_size', 5),
                     soft_spacing=params.get('soft_spacing', False),
-                    make_map=params.get('make_map', False)
+                    make_map=params.get('make_map', False),
+                    chunksize=params.get('chunksize') or None,
+                    spill_dir=config.get('CELL_SITE_SPILL_DIR'),
+                    output_format=params.get('output_format', 'csv'),
+                    workers=params.get('workers', 1),
+                    grid_m=params.get('grid_m') or None,
+                    max_samples_per_sector=params.get('max_samples_per_sector') or None,
+                    input_cache=self.input_cache_dir(config),
+                    input_cache_mb=float(config.get('CELL_SITE_INPUT_CACHE_MB', 4096))
                 )
             
             # Local storage - convert results to relative paths
             relative_results = {}
             for key, path in results.items():
-                if path and os.path.exists(path):
+                if isinstance(path, str) and os.path.exists(path):
                     relative_results[key] = os.path.basename(path)
             
-            return {
+            response = {
                 'success': True,
                 'results': relative_results,
                 'output_dir': os.path.basename(outdir),
                 'message': 'File processed successfully',
                 'storage': 'local'
             }
+            # run reports (spatial guard counters, grid aggregation and sample cap stats) and the
+            # standardized input's id (reusable as the upload's `input_id`) pass through as-is
+            for key in ('guards', 'aggregation', 'sampling', 'input_id'):
+                if results.get(key) is not None:
+                    response[key] = results[key]
+            if 'configs' in results:
+                # sweep: per configuration, its parameters, guards (or error) and output files
+                response['sweep'] = [{
+                    **{k: v for k, v in cfg.items() if k in site.SWEEP_PARAMS or k in ('guards', 'error')},
+                    'results': {k: os.path.basename(v) for k, v in cfg.items() if k in ('no_ta', 'soft', 'ta', 'map') and v}
+                } for cfg in results['configs']]
+            if cache is not None and cache_key:
+                cache.put(cache_key, outdir, response)
+                response = {**response, 'cache': 'miss'}
+            return response
         
         except Exception as e:
-            current_app.logger.error(f"Processing error: {str(e)}", exc_info=True)
+            logger.error(f"Processing error: {str(e)}", exc_info=True)
             raise
         
         finally:
-            # Cleanup uploaded file
-            if os.path.exists(filepath):
+            # Cleanup uploaded file (a reused input is the shared cached artifact: keep it)
+            target = os.path.dirname(filepath) if cleanup_dir else filepath
+            if not params.get('input_id') and os.path.exists(target):
                 try:
-                    os.remove(filepath)
-                    current_app.logger.info(f"Cleaned up: {filepath}")
+                    shutil.rmtree(target) if cleanup_dir else os.remove(target)
+                    logger.info(f"Cleaned up: {target}")
                 except Exception as e:
-                    current_app.logger.warning(f"Cleanup failed: {e}")
\ No newline at end of file
+                    logger.warning(f"Cleanup failed: {e}")
\ No newline at end of file
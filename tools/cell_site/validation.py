@@ -0,0 +1,86 @@
+"""
+Validation for the distance-model training path.
+
+Modes (`train_or_update_model(cv_mode=...)`, `--cv-mode`, CELL_SITE_CV_MODE):
+
+- kfold      K-fold CV, folds trained concurrently on threads with a bounded
+             number of estimator threads each (fold threads x tree threads <= cores)
+- subsample  the same K-fold CV on a random subset of at most `max_rows` rows
+- oob        no extra fits; the final forest is fitted with oob_score and
+             scored on its out-of-bag predictions
+- none       skip validation
+- auto       kfold up to `max_rows` rows, oob above
+
+Every mode returns a JSON-able summary that goes into the bundle meta:
+mode, mae_m / rmse_m over all held-out predictions, wall time and, for the
+K-fold modes, one entry per fold with its sizes, fit time and metrics.
+"""
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+VALIDATION_MODES = ("auto", "kfold", "subsample", "oob", "none")
+
+
+def resolve_mode(mode: str, n_rows: int, max_rows: int) -> str:
+    mode = (mode or "auto").lower()
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"Unknown validation mode {mode!r}; expected one of {VALIDATION_MODES}")
+    if mode == "auto":
+        return "kfold" if n_rows <= max_rows else "oob"
+    return mode
+
+
+def n_splits_for(n_rows: int) -> int:
+    return min(5, max(2, int(n_rows / 500)))
+
+
+def _errors(y_true, y_pred) -> dict:
+    ok = np.isfinite(y_pred)
+    err = y_pred[ok] - y_true[ok]
+    if not len(err):
+        return {"mae_m": float("nan"), "rmse_m": float("nan")}
+    return {"mae_m": float(np.mean(np.abs(err))), "rmse_m": float(np.sqrt(np.mean(err**2)))}
+
+
+def cross_validate(make_model, X, y, max_rows: int = None, parallel_folds: int = None, seed: int = 42) -> dict:
+    """K-fold CV of `make_model(n_jobs)` on (X, y), optionally on a subsample of `max_rows` rows.
+    Metrics are pooled over the out-of-fold predictions of every fold."""
+    from sklearn.model_selection import KFold
+    t0 = time.perf_counter()
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mode = "kfold"
+    if max_rows and len(X) > max_rows:
+        keep = np.sort(np.random.default_rng(seed).choice(len(X), int(max_rows), replace=False))
+        X, y, mode = X[keep], y[keep], "subsample"
+    n_splits = n_splits_for(len(X))
+    folds = list(KFold(n_splits=n_splits, shuffle=True, random_state=seed).split(X))
+    n_cpu = os.cpu_count() or 1
+    parallel = max(1, min(parallel_folds or n_cpu, len(folds), n_cpu))
+    per_fold_jobs = max(1, n_cpu // parallel)
+    oof = np.full(len(y), np.nan)
+
+    def run(i):
+        tr_idx, va_idx = folds[i]
+        t = time.perf_counter()
+        model = make_model(per_fold_jobs)
+        model.fit(X[tr_idx], y[tr_idx])
+        fit_s = time.perf_counter() - t
+        pred = model.predict(X[va_idx])
+        oof[va_idx] = pred
+        return {"fold": i, "n_train": int(len(tr_idx)), "n_valid": int(len(va_idx)), "fit_s": round(fit_s, 3),
+                "predict_s": round(time.perf_counter() - t - fit_s, 3), **_errors(y[va_idx], pred)}
+
+    with ThreadPoolExecutor(max_workers=parallel) as ex:
+        per_fold = list(ex.map(run, range(len(folds))))
+    return {"mode": mode, "n_rows": int(len(y)), "n_splits": n_splits, "parallel_folds": parallel,
+            "threads_per_fold": per_fold_jobs, **_errors(y, oof), "wall_s": round(time.perf_counter() - t0, 3),
+            "folds": per_fold}
+
+
+def oob_validation(model, y, fit_s: float = None) -> dict:
+    """Score a forest fitted with oob_score=True on its out-of-bag predictions (rows never out of bag are skipped)."""
+    pred = np.asarray(model.oob_prediction_, dtype=float).ravel()
+    return {"mode": "oob", "n_rows": int(len(pred)), "n_scored": int(np.isfinite(pred).sum()),
+            **_errors(np.asarray(y, dtype=float), pred), "wall_s": round(fit_s, 3) if fit_s is not None else None}